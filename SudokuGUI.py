@@ -1,35 +1,458 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-from sudokutools import valid, find_empty, generate_board, solve
-from astar import empty_cells_cand, update_candidates
-import heapq
+from sudokutools import generate_board, solve, solve_DLX
+from replay import Trace, TracingAStarSearch, TracingBacktrackSearch, UNDO
 from copy import deepcopy
-from sys import exit
+from functools import lru_cache
+from time import perf_counter
+import json
+import os
 import pygame
+import queue
+import threading
 import time
 import random
 
-pygame.init()
+# Seconds the instant (DLX) solve may take before it gives up
+SOLVE_TIMEOUT = 5.0
+
+WINDOW_SIZE = (820, 590)
+
+# The main loop sleeps until an event arrives and never draws more than FPS frames a second
+FPS = 60
+
+# Area below the grid with the wrong count and the time
+STATUS_RECT = pygame.Rect(0, 542, 540, 48)
+# Area below the help panel with the state of the solving animation, and its seek bar
+ANIMATION_RECT = pygame.Rect(550, 480, 260, 100)
+PROGRESS_RECT = pygame.Rect(562, 548, 236, 16)
+
+# Steps per second of the solving animation, from step by step to as fast as it can be followed
+SPEEDS = (1, 4, 16, 60, 250, 1000, 5000)
+DEFAULT_SPEED = 2
+# Seconds of each frame spent searching while fast-forwarding to the end of an animation
+FAST_FORWARD_SLICE = 0.012
+
+# Puzzles the background producer keeps ready, each with its solution
+PUZZLE_QUEUE_SIZE = 4
+
+# Input of a headless run without a script, as frame numbers at FPS frames a second: a guess in a cell, a hint,
+# an A* solve that is sped up and finished, a replay of it that is seeked and stepped, a restart and a
+# backtracking solve that is paused, stepped and cancelled
+DEFAULT_SCRIPT = [
+    {"frame": 10, "click": [90, 90]},
+    {"frame": 15, "key": "5"},
+    {"frame": 20, "key": "return"},
+    {"frame": 30, "key": "h"},
+    {"frame": 40, "key": "space"},
+    {"frame": 100, "key": "="},
+    {"frame": 160, "key": "f"},
+    {"frame": 200, "key": "t"},
+    {"frame": 230, "key": "page down"},
+    {"frame": 240, "key": "p"},
+    {"frame": 245, "key": "left"},
+    {"frame": 250, "key": "n"},
+    {"frame": 260, "click": [680, 556]},
+    {"frame": 270, "key": "escape"},
+    {"frame": 280, "key": "r"},
+    {"frame": 290, "key": "d"},
+    {"frame": 350, "key": "="},
+    {"frame": 355, "key": "="},
+    {"frame": 420, "key": "p"},
+    {"frame": 425, "key": "b"},
+    {"frame": 430, "key": "home"},
+    {"frame": 440, "key": "escape"},
+    {"frame": 450, "key": "x"},
+]
+
+# Event types that count as input for the events to frame latency
+INPUT_EVENTS = (pygame.KEYDOWN, pygame.MOUSEBUTTONUP)
+
+
+def init_headless():
+    """
+    Starts pygame with the SDL dummy video driver, so the game renders to an offscreen surface
+    without a display, for example on a build machine.
+    """
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    if pygame.display.get_init():
+        pygame.display.quit()  # the driver is only picked when the display starts
+    pygame.init()
+
+
+class InputScript:
+    def __init__(self, steps, frames=None):
+        """
+        Initializes scripted input, posted to the event queue by the main loop instead of waiting for the user.
+
+        Args:
+            steps (list[dict]): The events, each {"frame": n} with {"key": name} for a key press, named as in
+                pygame.key.key_code, or {"click": [x, y]} for a mouse click.
+            frames (int|None): The frame at which the window is closed, by default the frame after the last event.
+
+        Attributes:
+            steps (list[dict]): The events that are not posted yet, in frame order.
+            frames (int): The frame at which the window is closed.
+        """
+        self.steps = sorted(steps, key=lambda step: step["frame"])
+        self.frames = frames if frames is not None else (self.steps[-1]["frame"] + 1 if self.steps else 1)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a script from a JSON file holding the list of events, or {"steps": [...], "frames": n}.
+        """
+        with open(path) as script:
+            data = json.load(script)
+        if isinstance(data, list):
+            return cls(data)
+        return cls(data["steps"], data.get("frames"))
+
+    def post(self, frame):
+        """
+        Posts the events due at a frame, stamped with the time they were posted, and a QUIT event once the script is over.
+
+        Args:
+            frame (int): The number of the frame that is about to be handled.
+        """
+        while self.steps and self.steps[0]["frame"] <= frame:
+            step = self.steps.pop(0)
+            if "key" in step:
+                event = pygame.event.Event(pygame.KEYDOWN, key=pygame.key.key_code(step["key"]), mod=0, unicode="",
+                                           posted=perf_counter())
+            else:
+                event = pygame.event.Event(pygame.MOUSEBUTTONUP, pos=tuple(step["click"]), button=1,
+                                           posted=perf_counter())
+            pygame.event.post(event)
+        if frame >= self.frames:
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+
+class RenderTimings:
+    def __init__(self):
+        """
+        Collects the time spent rendering, per section, to compare the rendering path between versions.
+
+        Attributes:
+            samples (dict[str, list[float]]): Seconds per sample of each section: "frame" for the work of a whole
+                frame, "redraw" for Board.redraw, "tiles" for the cells drawn in a frame, "help_panel" for each time
+                the help panel is drawn, and "latency" from the input events of a frame to its display update.
+        """
+        self.samples = {}
+
+    def add(self, section, seconds):
+        self.samples.setdefault(section, []).append(seconds)
+
+    def summary(self):
+        """
+        Returns the count, mean, median, 95th and 99th percentile and maximum of each section, in milliseconds.
+        """
+        summary = {}
+        for section, samples in self.samples.items():
+            ordered = sorted(samples)
+            count = len(ordered)
+
+            def percentile(p):
+                return ordered[min(count - 1, int(p / 100 * count))] * 1000
+
+            summary[section] = {
+                "count": count,
+                "mean": sum(ordered) / count * 1000,
+                "p50": percentile(50),
+                "p95": percentile(95),
+                "p99": percentile(99),
+                "max": ordered[-1] * 1000,
+            }
+        return summary
+
+    def report(self):
+        """
+        Prints the summary as a table.
+        """
+        print("-" * 78)
+        print(f"{'Section':<12} | {'Samples':>8} | {'Mean':>8} | {'p50':>8} | {'p95':>8} | {'p99':>8} | {'Max':>8}")
+        print("-" * 78)
+        for section, row in self.summary().items():
+            print(f"{section:<12} | {row['count']:>8} | {row['mean']:>6.3f}ms | {row['p50']:>6.3f}ms | "
+                  f"{row['p95']:>6.3f}ms | {row['p99']:>6.3f}ms | {row['max']:>6.3f}ms")
+
+
+def solve_steps(board, engine, trace=None):
+    """
+    Solves a copy of the board, yielding every placement and every placement taken back as it happens.
+
+    Args:
+        board (list[list[int]]): A 9x9 sudoku board, it is not modified.
+        engine (str): "astar" to branch on the cell with the fewest candidates, "backtracking" to fill the cells in order.
+        trace (replay.Trace|None): A trace the steps are recorded into as well, so they can be shown again.
+
+    Yields:
+        tuple[int, int, int]: (replay.PLACE, replay.UNDO or replay.PROPAGATE, cell index, number).
+
+    Returns:
+        bool: True if the board was solved, False if it is unsolvable.
+    """
+    trace = Trace() if trace is None else trace
+    if engine == "astar":
+        search = TracingAStarSearch(board, trace=trace)
+    else:
+        search = TracingBacktrackSearch(board, trace=trace)
+    shown = 0
+    while True:
+        result = search.run(1)
+        while shown < len(trace):
+            yield trace.event(shown)
+            shown += 1
+        if result is not None:
+            return result
+
+
+class Animation:
+    def __init__(self, board, engine=None, trace=None):
+        """
+        Initializes a solving animation, which the main loop advances a few steps every frame.
+
+        The solve is recorded into a trace while it runs ahead of what is shown, so the animation
+        can be stepped back, seeked and replayed later without solving again.
+
+        Args:
+            board (list[list[int]]): The board before the animation.
+            engine (str|None): "astar" or "backtracking" to solve the board, see solve_steps.
+            trace (replay.Trace|None): A recorded solve to play back instead, from its own starting board.
+
+        Attributes:
+            engine (str|None): The solver that is shown, None when playing back a trace.
+            trace (replay.Trace): The steps recorded so far.
+            steps (Generator|None): The solve that is still recording, None once it is finished.
+            position (int): The number of steps shown.
+            snapshot (list[list[int]]): The board before the animation, to put back if it is cancelled.
+            speed (int): The index of the current speed in SPEEDS.
+            paused (bool): Whether the animation waits for single steps.
+            fast_forward (bool): Whether the animation runs to the end, only showing one frame now and then.
+            budget (float): The steps owed to the animation by the time that passed, shown as soon as they are whole.
+            finished (bool): Whether every step was shown.
+        """
+        self.engine = engine
+        if trace is None:
+            self.trace = Trace()
+            self.steps = solve_steps(board, engine, self.trace)
+        else:
+            self.trace = trace
+            self.steps = None
+        self.position = 0
+        self.snapshot = deepcopy(board)
+        self.speed = DEFAULT_SPEED
+        self.paused = False
+        self.fast_forward = False
+        self.budget = 0.0
+        self.finished = False
+
+    def record(self, count):
+        """
+        Lets the solve run ahead by a number of steps, recording them without showing them.
+        """
+        for _ in range(count):
+            if next(self.steps, None) is None:
+                self.steps = None
+                return
+
+    def advance(self, view, seconds):
+        """
+        Shows the steps that are due after some time passed. However many there are, the window is only
+        drawn once per frame, so a fast animation skips frames instead of slowing the search down.
+
+        Args:
+            view (Board): The board the steps are shown on.
+            seconds (float): The time since the last frame.
+
+        Returns:
+            bool: True once the animation is finished.
+        """
+        if self.fast_forward:
+            # search at full speed for a slice of the frame, then show where it got to
+            deadline = time.perf_counter() + FAST_FORWARD_SLICE
+            while self.steps is not None and time.perf_counter() < deadline:
+                self.record(256)
+            self.seek(view, len(self.trace))
+            self.finished = self.steps is None
+        elif not self.paused:
+            # a long frame does not make up for all the steps it missed at once
+            self.budget = min(self.budget + SPEEDS[self.speed] * seconds, SPEEDS[self.speed] * 0.1 + 1)
+            count = int(self.budget)
+            self.budget -= count
+            self.take(view, count)
+        return self.finished
+
+    def take(self, view, count):
+        """
+        Shows the next steps, recording them first if the solve has not got that far.
+
+        Args:
+            view (Board): The board the steps are shown on.
+            count (int): The number of steps to show.
+        """
+        if self.steps is not None and self.position + count > len(self.trace):
+            self.record(self.position + count - len(self.trace))
+        stop = min(self.position + count, len(self.trace))
+        for n in range(self.position, stop):
+            view.showStep(self.trace.event(n))
+        self.position = stop
+        if self.steps is None and self.position == len(self.trace):
+            self.finished = True
+
+    def back(self, view, count=1):
+        """
+        Takes back the last steps shown, by showing their opposites.
+
+        Args:
+            view (Board): The board the steps are shown on.
+            count (int): The number of steps to take back.
+        """
+        stop = max(self.position - count, 0)
+        for n in range(self.position - 1, stop - 1, -1):
+            view.showStep(self.trace.event(n), back=True)
+        self.position = stop
+        self.finished = False
+
+    def seek(self, view, step):
+        """
+        Jumps to the board after a number of steps, rebuilt from the nearest keyframe of the trace.
+
+        Args:
+            view (Board): The board the steps are shown on.
+            step (int): The number of steps, beyond what was recorded the solve runs ahead first.
+        """
+        if self.steps is not None and step > len(self.trace):
+            self.record(step - len(self.trace))
+        step = min(max(step, 0), len(self.trace))
+        view.showCells(self.trace.board_at(step), self.trace.event(step - 1) if step else None)
+        self.position = step
+        self.finished = self.steps is None and step == len(self.trace)
+
+    def progress(self):
+        """
+        Returns how far the animation got, as a fraction of the steps recorded.
+        """
+        return self.position / len(self.trace) if len(self.trace) else 0.0
+
+    def faster(self, change):
+        """
+        Changes the speed of the animation by a number of levels.
+        """
+        self.speed = min(max(self.speed + change, 0), len(SPEEDS) - 1)
+
+    def describe(self):
+        """
+        Returns a short text about the animation for the animation panel.
+        """
+        name = {"astar": "A*", "backtracking": "Backtracking", None: "Replay"}[self.engine]
+        if self.fast_forward:
+            return f"{name}: finishing"
+        if self.paused:
+            return f"{name}: paused"
+        return f"{name}: {SPEEDS[self.speed]} steps/s"
+
+
+@lru_cache(maxsize=None)
+def get_font(name, size):
+    """
+    Returns a system font, each (name, size) is only looked up once since SysFont searches the installed fonts.
+    """
+    return pygame.font.SysFont(name, size)
+
+
+@lru_cache(maxsize=256)
+def render_text(name, size, text, color):
+    """
+    Returns the rendered surface of a text. Digits and labels are rendered once and then reused every frame.
+
+    Args:
+        name (str): The name of the system font.
+        size (int): The size of the font.
+        text (str): The text to render.
+        color (tuple[int, int, int]): The RGB color value of the text.
+
+    Returns:
+        pygame.Surface: The rendered text.
+    """
+    return get_font(name, size).render(text, True, color)
+
+
+class PuzzleProducer:
+    def __init__(self, size=PUZZLE_QUEUE_SIZE, removed_cells=45, seed=None):
+        """
+        Starts a background thread that keeps a few puzzles ready with their solutions,
+        so starting or restarting a game never waits for the generator.
+
+        Args:
+            size (int): The number of puzzles kept ready.
+            removed_cells (int): The number of cells cleared in each puzzle.
+            seed (int|None): Seed for the same puzzles in the same order on every run, None for random ones.
+
+        Attributes:
+            puzzles (queue.Queue): The (puzzle, solution) pairs that are ready.
+            thread (threading.Thread): The thread generating them, it waits while the queue is full.
+        """
+        self.removed_cells = removed_cells
+        self.rng = None if seed is None else random.Random(seed)
+        self.puzzles = queue.Queue(maxsize=size)
+        self.thread = threading.Thread(target=self.produce, name="PuzzleProducer", daemon=True)
+        self.thread.start()
+
+    def produce(self):
+        """
+        Generates and solves puzzles for as long as the game runs.
+        """
+        while True:
+            try:
+                board = generate_board(self.removed_cells, seed=self.rng)
+            except ValueError:
+                continue  # no unique puzzle within the attempts, try new grids
+            solution = deepcopy(board)
+            solve(solution)
+            self.puzzles.put((board, solution))
+
+    def ready(self):
+        """
+        Returns True if a puzzle can be taken without waiting.
+        """
+        return not self.puzzles.empty()
+
+    def get(self):
+        """
+        Returns the next (puzzle, solution) pair, only waiting if none is ready yet.
+        """
+        return self.puzzles.get()
 
 
 class Board:
-    def __init__(self, window):
+    def __init__(self, window, puzzle=None, timings=None):
         """
         Initializes a Board object.
 
         Args:
             window: The Pygame window object.
+            puzzle (tuple[list[list[int]], list[list[int]]]|None): A puzzle and its solution, as made by a
+                PuzzleProducer. None generates and solves a new one here.
+            timings (RenderTimings|None): Collects the time spent drawing the cells and the help panel.
         """
-        # Generate a new Sudoku board and create a solved version of it.
-        self.board = generate_board()
-        self.solvedBoard = deepcopy(self.board)
-        solve(self.solvedBoard)
+        if puzzle is None:
+            # Generate a new Sudoku board and create a solved version of it.
+            self.board = generate_board()
+            self.solvedBoard = deepcopy(self.board)
+            solve(self.solvedBoard)
+        else:
+            self.board, self.solvedBoard = puzzle
         # Create a 2D list of Tile objects to represent the Sudoku board.
         self.tiles = [
             [Tile(self.board[i][j], window, i * 60, j * 60) for j in range(9)]
             for i in range(9)
         ]
         self.window = window
+        # The solving animation that is running, if any, and the trace of the last solve it finished
+        self.animation = None
+        self.lastTrace = None
         
         # Dictionary of available user inputs for the help panel
         self.user_inputs = {
@@ -40,49 +463,43 @@ class Board:
             "R": "Restart game",
             "Space": "Solve (A*)",
             "D": "Solve (backtracking)",
-            "Esc": "Exit game"
+            "X": "Solve (DLX)",
+            "P / N / B": "Pause / Step / Back",
+            "+ / -": "Solving speed",
+            "F": "Finish solving",
+            "T": "Replay last solve",
+            "Esc": "Stop solving / Exit"
         }
 
-    def draw_board(self):
+        self.timings = timings
+
+        # The grid lines and the help panel never change, they are drawn once onto a background surface
+        self.background = pygame.Surface(window.get_size())
+        self.background.fill((255, 255, 255))
+        self.draw_board(self.background)
+        start = perf_counter()
+        self.draw_help_panel(self.background)
+        if timings is not None:
+            timings.add("help_panel", perf_counter() - start)
+        # What was last drawn in each cell and in the status area, None until the first frame
+        self.drawn = None
+
+    def draw_board(self, surface):
         """
-        Draws the Sudoku board on the Pygame window.
+        Draws the grid lines of the Sudoku board.
+
+        Args:
+            surface (pygame.Surface): The surface to draw on, the background of the window.
         """
         for i in range(9):
             for j in range(9):
-                # Draw vertical lines every three columns.
-                if j % 3 == 0 and j != 0:
-                    pygame.draw.line(
-                        self.window,
-                        (0, 0, 0),
-                        (j // 3 * 180, 0),
-                        (j // 3 * 180, 540),
-                        4,
-                    )
-                # Draw horizontal lines every three rows.
-                if i % 3 == 0 and i != 0:
-                    pygame.draw.line(
-                        self.window,
-                        (0, 0, 0),
-                        (0, i // 3 * 180),
-                        (540, i // 3 * 180),
-                        4,
-                    )
-                # Draw the Tile object on the board.
-                self.tiles[i][j].draw((0, 0, 0), 1)
-
-                # Display the Tile value if it is not 0 (empty).
-                if self.tiles[i][j].value != 0:
-                    self.tiles[i][j].display(
-                        self.tiles[i][j].value, (21 + j * 60, 16 + i * 60), (0, 0, 0)
-                    )
-        # Draw a horizontal line at the bottom of the board.
-        pygame.draw.line(
-            self.window,
-            (0, 0, 0),
-            (0, (i + 1) // 3 * 180),
-            (540, (i + 1) // 3 * 180),
-            4,
-        )
+                # Draw the thin border of every tile.
+                pygame.draw.rect(surface, (0, 0, 0), self.tiles[i][j].rect, 1)
+        for k in range(1, 4):
+            # Draw vertical and horizontal lines every three columns and rows, and one at the bottom of the board.
+            if k != 3:
+                pygame.draw.line(surface, (0, 0, 0), (k * 180, 0), (k * 180, 540), 4)
+            pygame.draw.line(surface, (0, 0, 0), (0, k * 180), (540, k * 180), 4)
 
     def deselect(self, tile):
         """
@@ -104,155 +521,286 @@ class Board:
         Redraws the Sudoku board on the game window, highlighting selected, correct, and incorrect tiles, displaying the
         current wrong count and time, and rendering the current keys (potential values) for each tile.
 
+        Only the cells and the status area that changed since the last frame are drawn and sent to the display.
+
         Args:
             keys (dict): A dictionary containing tuples of (x, y) coordinates as keys and potential values as values.
             wrong (int): The current wrong count.
             time (int): The current time elapsed.
 
         Returns:
-            None
+            list[pygame.Rect]: The areas of the window that were updated.
         """
-        self.window.fill((255, 255, 255))  # fill the window with white
-        self.draw_board()  # draw the Sudoku board
-        for i in range(9):
-            for j in range(9):
-                if self.tiles[j][i].selected:
-                    # highlight selected tiles in green
-                    self.tiles[j][i].draw((50, 205, 50), 4)
-                elif self.tiles[i][j].correct:
-                    # highlight correct tiles in dark green
-                    self.tiles[i][j].draw((34, 139, 34), 4)
-                elif self.tiles[i][j].incorrect:
-                    # highlight incorrect tiles in red
-                    self.tiles[i][j].draw((255, 0, 0), 4)
-
-        if len(keys) != 0:
-            for value in keys:
-                # display the potential values for each tile
-                self.tiles[value[0]][value[1]].display(
-                    keys[value],
-                    (21 + value[0] * 60, 16 + value[1] * 60),
-                    (128, 128, 128),
-                )
+        rects = []
+        if self.drawn is None:
+            # first frame, put up the background with the grid and the help panel
+            self.window.blit(self.background, (0, 0))
+            self.drawn = {}
+            rects.append(self.window.get_rect())
+
+        start = perf_counter()
+        for x in range(9):
+            for y in range(9):
+                state = self.cell_state(x, y, keys)
+                if self.drawn.get((x, y)) != state:
+                    self.drawn[(x, y)] = state
+                    rects.append(self.draw_cell(x, y, state))
+        if self.timings is not None:
+            self.timings.add("tiles", perf_counter() - start)
+
+        if self.drawn.get("status") != (wrong, time):
+            self.drawn["status"] = (wrong, time)
+            rects.append(self.draw_status(wrong, time))
+
+        animation = self.animation_state()
+        if self.drawn.get("animation") != animation:
+            self.drawn["animation"] = animation
+            rects.append(self.draw_animation(animation))
+
+        if rects:
+            pygame.display.update(rects)  # update only the changed areas of the game window
+        return rects
+
+    def invalidate(self):
+        """
+        Makes the next redraw draw the whole window again, for when its contents were lost.
+        """
+        self.drawn = None
+
+    def cell_state(self, x, y, keys):
+        """
+        Returns what a cell of the window shows, so that a cell is only drawn again when it changes.
 
+        Args:
+            x (int): The column of the cell.
+            y (int): The row of the cell.
+            keys (dict): A dictionary containing tuples of (x, y) coordinates as keys and potential values as values.
+
+        Returns:
+            tuple: The value of the cell, its potential value and the color of its highlight.
+        """
+        tile = self.tiles[y][x]
+        if self.tiles[x][y].selected:
+            border = (50, 205, 50)  # highlight selected tiles in green
+        elif tile.correct:
+            border = (34, 139, 34)  # highlight correct tiles in dark green
+        elif tile.incorrect:
+            border = (255, 0, 0)  # highlight incorrect tiles in red
+        else:
+            border = None
+        return tile.value, keys.get((x, y)), border
+
+    def draw_cell(self, x, y, state):
+        """
+        Draws a cell of the window over its part of the background.
+
+        Args:
+            x (int): The column of the cell.
+            y (int): The row of the cell.
+            state (tuple): The cell as returned by cell_state.
+
+        Returns:
+            pygame.Rect: The area of the cell.
+        """
+        value, key, border = state
+        rect = pygame.Rect(x * 60, y * 60, 60, 60)
+        self.window.set_clip(rect)
+        self.window.blit(self.background, rect, rect)
+        tile = self.tiles[y][x]
+        if value != 0:
+            tile.display(value, (21 + x * 60, 16 + y * 60), (0, 0, 0))
+        elif key is not None:
+            # display the potential value of the tile
+            tile.display(key, (21 + x * 60, 16 + y * 60), (128, 128, 128))
+        if border is not None:
+            pygame.draw.rect(self.window, border, rect, 4)
+        self.window.set_clip(None)
+        return rect
+
+    def draw_status(self, wrong, time):
+        """
+        Draws the wrong count and the time elapsed below the board.
+
+        Args:
+            wrong (int): The current wrong count.
+            time (int): The current time elapsed.
+
+        Returns:
+            pygame.Rect: The area of the status.
+        """
+        self.window.set_clip(STATUS_RECT)
+        self.window.blit(self.background, STATUS_RECT, STATUS_RECT)
         if wrong > 0:
             # display the current wrong count as an "X" icon and a number
-            font = pygame.font.SysFont("Bauhaus 93", 30)
-            text = font.render("X", True, (255, 0, 0))
-            self.window.blit(text, (10, 554))
-
-            font = pygame.font.SysFont("Bahnschrift", 40)
-            text = font.render(str(wrong), True, (0, 0, 0))
-            self.window.blit(text, (32, 542))
+            self.window.blit(render_text("Bauhaus 93", 30, "X", (255, 0, 0)), (10, 554))
+            self.window.blit(render_text("Bahnschrift", 40, str(wrong), (0, 0, 0)), (32, 542))
 
         # display the current time elapsed as a number
-        font = pygame.font.SysFont("Bahnschrift", 40)
-        text = font.render(str(time), True, (0, 0, 0))
-        self.window.blit(text, (388, 542))
-        
-        # Draw the help panel on the side
-        self.draw_help_panel()
-        
-        pygame.display.flip()  # update the game window
+        self.window.blit(render_text("Bahnschrift", 40, str(time), (0, 0, 0)), (388, 542))
+        self.window.set_clip(None)
+        return STATUS_RECT
 
-    def visualSolve_A(self, wrong, time):
-        """ Shows the visual solve for our A* algorithm
-        
-        Just helps visualize the algorithm and the path it takes to solve 
-        
-        A lot of what was used here is recycled from the provided repo """
-
-        # Initialize candidates and priority queue
-        cell_cand = empty_cells_cand(self.board)
-        if not cell_cand:
-            return True  # Board is solved
-
-        priority_queue = [(len(candidates), (i, j), candidates) for (i, j), candidates in cell_cand.items()]
-        heapq.heapify(priority_queue)
-
-        while priority_queue:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    exit()
-
-            dont_use, (i, j), candidates = heapq.heappop(priority_queue)
-
-            for num in candidates:
-                if valid(self.board, (i, j), num):
-                # Place the number and update the board visually
-                    self.board[i][j] = num
-                    self.tiles[i][j].value = num
-                    self.tiles[i][j].correct = True
-                    pygame.time.delay(63)
-                    self.redraw({}, wrong, time)
-
-                # Update candidates and recurse
-                    update_candidates(cell_cand, self.board, (i, j), num, add=True)
-                    if self.visualSolve_A(wrong, time):
-                        return True
-
-                # Backtrack
-                    self.board[i][j] = 0
-                    self.tiles[i][j].value = 0
-                    self.tiles[i][j].incorrect = True
-                    self.tiles[i][j].correct = False
-                    pygame.time.delay(63)
-                    self.redraw({}, wrong, time)
-                    update_candidates(cell_cand, self.board, (i, j), num, add=False)
+    def animation_state(self):
+        """
+        Returns what the animation panel shows, None if no animation is running.
+
+        Returns:
+            tuple|None: The description of the animation, its step, its number of recorded steps, whether it is
+            still recording and the width of the seek bar that is filled.
+        """
+        animation = self.animation
+        if animation is None:
+            return None
+        filled = int(animation.progress() * (PROGRESS_RECT.width - 4))
+        return animation.describe(), animation.position, len(animation.trace), animation.steps is not None, filled
 
+    def draw_animation(self, state):
+        """
+        Draws the panel with the state of the solving animation and its seek bar below the help panel.
+
+        Args:
+            state (tuple|None): The panel as returned by animation_state, None to clear it.
+
+        Returns:
+            pygame.Rect: The area of the panel.
+        """
+        self.window.blit(self.background, ANIMATION_RECT, ANIMATION_RECT)
+        if state is not None:
+            description, position, recorded, recording, filled = state
+            pygame.draw.rect(self.window, (240, 240, 240), ANIMATION_RECT)
+            pygame.draw.rect(self.window, (0, 0, 0), ANIMATION_RECT, 2)
+            self.window.blit(render_text("Bahnschrift", 20, description, (0, 0, 150)), (ANIMATION_RECT.x + 12, ANIMATION_RECT.y + 10))
+            steps = f"Step {position:,} of {recorded:,}{'+' if recording else ''}"
+            self.window.blit(get_font("Bahnschrift", 16).render(steps, True, (0, 0, 0)), (ANIMATION_RECT.x + 12, ANIMATION_RECT.y + 40))
+            # seek bar, clicking it jumps to that step
+            pygame.draw.rect(self.window, (255, 255, 255), PROGRESS_RECT)
+            pygame.draw.rect(self.window, (50, 205, 50), (PROGRESS_RECT.x + 2, PROGRESS_RECT.y + 2, filled, PROGRESS_RECT.height - 4))
+            pygame.draw.rect(self.window, (0, 0, 0), PROGRESS_RECT, 1)
+        return ANIMATION_RECT
+
+    def visualSolve(self, engine):
+        """
+        Starts a solving animation, which the main loop then advances frame by frame through animate.
+
+        Args:
+            engine (str): "astar" for the A* solver, "backtracking" for the backtracking solver.
+        """
+        self.animation = Animation(self.board, engine)
+
+    def replay(self, trace=None):
+        """
+        Plays a recorded solve back from its starting board, without solving again.
+
+        Args:
+            trace (replay.Trace|None): The solve to play back, by default the last one shown on this board.
+
+        Returns:
+            bool: True if there was a solve to play back.
+        """
+        trace = self.lastTrace if trace is None else trace
+        if trace is None:
             return False
+        self.animation = Animation(self.board, trace=trace)
+        self.showCells(trace.start())
+        return True
 
-        return False
+    def animate(self, seconds):
+        """
+        Advances the solving animation by the steps that are due after some time passed,
+        and resets the tile highlights once it is finished.
+
+        Args:
+            seconds (float): The time since the last frame.
 
-    def visualSolve(self, wrong, time):
+        Returns:
+            bool: True while the animation is still running.
+        """
+        if self.animation.advance(self, seconds):
+            self.lastTrace = self.animation.trace
+            self.stopAnimation()
+            return False
+        return True
+
+    def showStep(self, step, back=False):
         """
-        Recursively solves the Sudoku board visually, highlighting correct and incorrect tiles as it fills them in.
+        Shows a single step of the solving animation, highlighting placed tiles as correct and
+        tiles taken back as incorrect.
 
         Args:
-            wrong (int): The current wrong count.
-            time (int): The current time elapsed.
+            step (tuple[int, int, int]): (replay.PLACE, replay.UNDO or replay.PROPAGATE, cell index, number).
+            back (bool): Whether to take the step back instead, which shows its opposite without a highlight.
+        """
+        kind, idx, num = step
+        i, j = divmod(idx, 9)
+        tile = self.tiles[i][j]
+        if back:
+            # the opposite of a placement clears the cell and the opposite of an undo fills it again
+            self.board[i][j] = tile.value = num if kind == UNDO else 0
+            tile.correct = tile.incorrect = False
+        elif kind != UNDO:
+            self.board[i][j] = num
+            tile.value = num
+            tile.correct = True
+        else:
+            self.board[i][j] = 0
+            tile.value = 0
+            tile.incorrect = True
+            tile.correct = False
+
+    def showCells(self, cells, step=None):
+        """
+        Shows a whole board at once, after a seek, highlighting only the cell of the last step.
+
+        Args:
+            cells (list[int]): The 81 cell values in row-major order.
+            step (tuple[int, int, int]|None): The step that led to the board, None for no highlight.
+        """
+        for i in range(9):
+            for j in range(9):
+                self.board[i][j] = self.tiles[i][j].value = cells[i * 9 + j]
+                self.tiles[i][j].correct = False
+                self.tiles[i][j].incorrect = False
+        if step is not None:
+            kind, idx, num = step
+            tile = self.tiles[idx // 9][idx % 9]
+            tile.incorrect = kind == UNDO
+            tile.correct = kind != UNDO
+
+    def stopAnimation(self, cancel=False):
+        """
+        Ends the solving animation and resets all tile correctness.
+
+        Args:
+            cancel (bool): Whether to put the board back as it was before the animation.
+        """
+        snapshot = self.animation.snapshot
+        self.animation = None
+        for i in range(9):
+            for j in range(9):
+                if cancel:
+                    self.board[i][j] = snapshot[i][j]
+                    self.tiles[i][j].value = snapshot[i][j]
+                self.tiles[i][j].correct = False
+                self.tiles[i][j].incorrect = False
+
+    def dlxSolve(self):
+        """
+        Solves the Sudoku board at once with the Dancing Links solver and fills in every tile.
+
+        Gives up after SOLVE_TIMEOUT seconds so the window never hangs.
 
         Returns:
             bool: True if the board is successfully solved, False otherwise.
         """
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                exit()  # exit the game if the user clicks the close button
-
-        empty = find_empty(self.board)
-        if not empty:
-            return True  # the board is solved if there are no empty tiles left
-
-        for nums in range(9):
-            if valid(self.board, (empty[0], empty[1]), nums + 1):
-
-                # Count number of missing specific numbers
-                # Could have Values stored for each number to get path cost
-                # Find candidates for each missing cell
-                # Calculate total cost to start at lowest cost
-
-                
-                # fill in the current empty tile with a valid number
-                self.board[empty[0]][empty[1]] = nums + 1
-                self.tiles[empty[0]][empty[1]].value = nums + 1
-                self.tiles[empty[0]][empty[1]].correct = True
-                pygame.time.delay(63)  # delay to slow down the solving animation
-                self.redraw(
-                    {}, wrong, time
-                )  # redraw the game window with the updated board
-
-                if self.visualSolve(wrong, time):
-                    return True  # recursively solve the rest of the board if the current move is valid
-
-                # if the current move is not valid, reset the tile and highlight it as incorrect
-                self.board[empty[0]][empty[1]] = 0
-                self.tiles[empty[0]][empty[1]].value = 0
-                self.tiles[empty[0]][empty[1]].incorrect = True
-                self.tiles[empty[0]][empty[1]].correct = False
-                pygame.time.delay(63)  # delay to slow down the solving animation
-                self.redraw(
-                    {}, wrong, time
-                )  # redraw the game window with the updated board
+        solution = deepcopy(self.board)
+        if not solve_DLX(solution, deadline=time.perf_counter() + SOLVE_TIMEOUT):
+            return False
+
+        for i in range(9):
+            for j in range(9):
+                self.board[i][j] = solution[i][j]
+                self.tiles[i][j].value = solution[i][j]
+        return True
 
     def hint(self, keys):
         """
@@ -277,30 +825,32 @@ class Board:
             elif self.board == self.solvedBoard:
                 return False  # the board is already solved, so no hint can be provided.
 
-    def draw_help_panel(self):
+    def draw_help_panel(self, surface):
         """
         Draws a panel that shows available user inputs.
+
+        Args:
+            surface (pygame.Surface): The surface to draw on, the background of the window.
         """
         panel_x = 550
         panel_y = 20
         panel_width = 260
-        panel_height = 300
+        panel_height = 450
         
         # Draw panel background
         panel_rect = pygame.Rect(panel_x, panel_y, panel_width, panel_height)
-        pygame.draw.rect(self.window, (240, 240, 240), panel_rect)
-        pygame.draw.rect(self.window, (0, 0, 0), panel_rect, 2)
+        pygame.draw.rect(surface, (240, 240, 240), panel_rect)
+        pygame.draw.rect(surface, (0, 0, 0), panel_rect, 2)
         
         # Draw title
-        title_font = pygame.font.SysFont("Bahnschrift", 24)
-        title_text = title_font.render("Available Controls", True, (0, 0, 0))
+        title_text = render_text("Bahnschrift", 24, "Available Controls", (0, 0, 0))
         title_width = title_text.get_width()
         title_x = panel_x + (panel_width - title_width) // 2  # Center the title
-        self.window.blit(title_text, (title_x, panel_y + 10))
+        surface.blit(title_text, (title_x, panel_y + 10))
         
         # Draw divider line
         pygame.draw.line(
-            self.window,
+            surface,
             (0, 0, 0),
             (panel_x + 10, panel_y + 40),
             (panel_x + panel_width - 10, panel_y + 40),
@@ -308,23 +858,23 @@ class Board:
         )
         
         # Draw controls list
-        font = pygame.font.SysFont("Bahnschrift", 16)
+        font = get_font("Bahnschrift", 16)
         y_offset = panel_y + 60
         key_column_width = 96
         
         for key, description in self.user_inputs.items():
             # Draw key with background highlight
             key_bg_rect = pygame.Rect(panel_x + 15, y_offset - 2, key_column_width - 10, 22)
-            pygame.draw.rect(self.window, (220, 230, 255), key_bg_rect)
-            pygame.draw.rect(self.window, (180, 190, 220), key_bg_rect, 1)
+            pygame.draw.rect(surface, (220, 230, 255), key_bg_rect)
+            pygame.draw.rect(surface, (180, 190, 220), key_bg_rect, 1)
             
             # Draw key text
             key_text = font.render(key, True, (0, 0, 150))
-            self.window.blit(key_text, (panel_x + 20, y_offset))
+            surface.blit(key_text, (panel_x + 20, y_offset))
             
             # Draw description
             desc_text = font.render(description, True, (0, 0, 0))
-            self.window.blit(desc_text, (panel_x + key_column_width + 15, y_offset))
+            surface.blit(desc_text, (panel_x + key_column_width + 15, y_offset))
             
             y_offset += 30
 
@@ -394,9 +944,7 @@ class Tile:
             None.
         """
 
-        font = pygame.font.SysFont("lato", 45)
-        text = font.render(str(value), True, color)
-        self.window.blit(text, position)
+        self.window.blit(render_text("lato", 45, str(value), color), position)
 
     def clicked(self, mousePos):
         """
@@ -414,46 +962,118 @@ class Tile:
         return self.selected
 
 
-def main():
+def main(script=None, timings=None, seed=None):
+    """
+    Runs the game until the window is closed or escape is pressed.
+
+    Args:
+        script (InputScript|None): Input to play instead of waiting for the user. The loop then runs
+            as fast as it can on a fixed clock of FPS frames a second, so a run takes the same steps every time.
+        timings (RenderTimings|None): Collects the time spent on each frame, in redraw, drawing the cells and the
+            help panel, and from the input events of a frame to its display update.
+        seed (int|None): Seed for the same puzzles and hints on every run, None for random ones.
+    """
     # Set up the pygame window
-    screen = pygame.display.set_mode((820, 590))
+    screen = pygame.display.set_mode(WINDOW_SIZE)
     screen.fill((255, 255, 255))
     pygame.display.set_caption("Sudoku Solver AI")
     icon = pygame.image.load("assets/thumbnail.png")
     pygame.display.set_icon(icon)
 
-    # Display "Generating Random Grid" text while generating a random grid
-    font = pygame.font.SysFont("Bahnschrift", 40)
-    text = font.render("Generating", True, (0, 0, 0))
-    screen.blit(text, (175, 245))
-
-    font = pygame.font.SysFont("Bahnschrift", 40)
-    text = font.render("Random Grid", True, (0, 0, 0))
-    screen.blit(text, (156, 290))
+    # Display "Generating Random Grid" text while the first random grid is generated in the background
+    screen.blit(render_text("Bahnschrift", 40, "Generating", (0, 0, 0)), (175, 245))
+    screen.blit(render_text("Bahnschrift", 40, "Random Grid", (0, 0, 0)), (156, 290))
     pygame.display.flip()
 
+    if seed is not None:
+        random.seed(seed)
+    producer = PuzzleProducer(seed=seed)
+    clock = pygame.time.Clock()
+    while not producer.ready():
+        # Keep the window responsive until the first puzzle is ready
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return
+        clock.tick(FPS)
+
     # Initialize variables
     wrong = 0
-    board = Board(screen)
+    board = Board(screen, producer.get(), timings)
     selected = (-1, -1)
     keyDict = {}
     startTime = time.time()
 
+    seconds = 0.0
+    frame = 0
+
     # Loop until the user escapes
     while True:
+        if script is not None:
+            # Scripted input never waits, every frame advances the clock by the same amount
+            script.post(frame)
+            frame += 1
+            events = pygame.event.get()
+        elif board.animation is None:
+            # Sleep until an event arrives or the time shown needs to tick over to the next second
+            elapsed = time.time() - startTime
+            events = [pygame.event.wait(int((1 - elapsed % 1) * 1000) + 1)] + pygame.event.get()
+        else:
+            events = pygame.event.get()
+        frameStart = perf_counter()
+        inputs = [getattr(event, "posted", frameStart) for event in events if event.type in INPUT_EVENTS]
+
         # Get elapsed time and format it to display in the window
         elapsed = time.time() - startTime
         passedTime = time.strftime("%H:%M:%S", time.gmtime(elapsed))
 
         # Handle events
-        for event in pygame.event.get():
+        for event in events:
             elapsed = time.time() - startTime
             passedTime = time.strftime("%H:%M:%S", time.gmtime(elapsed))
             if event.type == pygame.QUIT:
-                exit()
+                return
+            elif event.type == pygame.VIDEOEXPOSE:
+                board.invalidate()  # the window contents were lost, draw all of it again
+            elif event.type == pygame.KEYDOWN and board.animation is not None:
+                # While solving, only the animation controls and restart are handled
+                animation = board.animation
+                if event.key == pygame.K_ESCAPE:
+                    board.stopAnimation(cancel=True)
+                elif event.key == pygame.K_p:
+                    animation.paused = not animation.paused
+                elif event.key in (pygame.K_n, pygame.K_RIGHT) and animation.paused:
+                    animation.take(board, 1)
+                elif event.key in (pygame.K_b, pygame.K_LEFT) and animation.paused:
+                    animation.back(board, 1)
+                elif event.key == pygame.K_HOME:
+                    animation.seek(board, 0)
+                elif event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                    # jump a tenth of the steps recorded so far
+                    jump = max(len(animation.trace) // 10, 1)
+                    animation.seek(board, animation.position + (jump if event.key == pygame.K_PAGEDOWN else -jump))
+                elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS, pygame.K_UP):
+                    animation.faster(1)
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS, pygame.K_DOWN):
+                    animation.faster(-1)
+                elif event.key in (pygame.K_f, pygame.K_END):
+                    animation.fast_forward = True
+                elif event.key == pygame.K_r:
+                    board = Board(screen, producer.get(), timings)
+                    selected = (-1, -1)
+                    keyDict = {}
+                    wrong = 0
+                    startTime = time.time()
+            elif event.type == pygame.MOUSEBUTTONUP and board.animation is not None:
+                # Clicking the seek bar jumps to that point of the steps recorded so far
+                mousePos = event.pos
+                if PROGRESS_RECT.collidepoint(mousePos):
+                    fraction = (mousePos[0] - PROGRESS_RECT.x) / PROGRESS_RECT.width
+                    board.animation.seek(board, round(fraction * len(board.animation.trace)))
+            elif board.animation is not None:
+                continue  # the board cannot be edited while solving
             elif event.type == pygame.MOUSEBUTTONUP:
                 # Check if a Tile is clicked
-                mousePos = pygame.mouse.get_pos()
+                mousePos = event.pos
                 for i in range(9):
                     for j in range(9):
                         if board.tiles[i][j].clicked(mousePos):
@@ -515,7 +1135,7 @@ def main():
 
                 # Handle restart key
                 if event.key == pygame.K_r:
-                    board = Board(screen)
+                    board = Board(screen, producer.get(), timings)
                     selected = (-1, -1)
                     keyDict = {}
                     wrong = 0
@@ -523,7 +1143,7 @@ def main():
 
                 # Handle escape key
                 if event.key == pygame.K_ESCAPE:
-                    exit()  # Exit the program immediately when escape is pressed
+                    return  # Exit the program immediately when escape is pressed
 
                 # Space key triggers visual solving with A* algorithm
                 if event.key == pygame.K_SPACE:
@@ -533,14 +1153,8 @@ def main():
                             board.tiles[i][j].selected = False
                     keyDict = {}
 
-                    # Solve the sudoku visually and reset all tile correctness
-                    elapsed = time.time() - startTime
-                    passedTime = time.strftime("%H:%M:%S", time.gmtime(elapsed))
-                    board.visualSolve_A(wrong, passedTime)
-                    for i in range(9):
-                        for j in range(9):
-                            board.tiles[i][j].correct = False
-                            board.tiles[i][j].incorrect = False
+                    # Solve the sudoku visually, the main loop shows the steps as it goes
+                    board.visualSolve("astar")
 
                 # D key triggers visual solving with backtracking algorithm
                 if event.key == pygame.K_d:
@@ -550,16 +1164,68 @@ def main():
                             board.tiles[i][j].selected = False
                     keyDict = {}
 
-                    # Solve the sudoku visually and reset all tile correctness
-                    elapsed = time.time() - startTime
-                    passedTime = time.strftime("%H:%M:%S", time.gmtime(elapsed))
-                    board.visualSolve(wrong, passedTime)
+                    # Solve the sudoku visually, the main loop shows the steps as it goes
+                    board.visualSolve("backtracking")
+
+                # T key plays the last solve back from its recording
+                if event.key == pygame.K_t:
                     for i in range(9):
                         for j in range(9):
-                            board.tiles[i][j].correct = False
-                            board.tiles[i][j].incorrect = False
+                            board.tiles[i][j].selected = False
+                    keyDict = {}
+                    board.replay()
 
-        board.redraw(keyDict, wrong, passedTime)
+                # X key solves with the Dancing Links algorithm (no animation, it is an exact cover search)
+                if event.key == pygame.K_x:
+                    # Deselect all tiles and clear keyDict
+                    for i in range(9):
+                        for j in range(9):
+                            board.tiles[i][j].selected = False
+                    keyDict = {}
+                    board.dlxSolve()
+
+        if board.animation is not None:
+            # Show the solving steps that are due, the tile highlights are reset once it finishes
+            board.animate(seconds)
 
-main()
-pygame.quit()
\ No newline at end of file
+        redrawStart = perf_counter()
+        board.redraw(keyDict, wrong, passedTime)
+        if timings is not None:
+            end = perf_counter()
+            timings.add("redraw", end - redrawStart)
+            timings.add("frame", end - frameStart)
+            if inputs:
+                timings.add("latency", end - min(inputs))
+
+        if script is not None:
+            seconds = 1 / FPS
+        else:
+            seconds = clock.tick(FPS) / 1000
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Play Sudoku, or render the game headless with scripted input.")
+    parser.add_argument("--headless", action="store_true",
+                        help="render offscreen with the SDL dummy driver and report the render timings")
+    parser.add_argument("--script", help="JSON file of input events, by default a short session of every feature")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the same puzzles and hints on every run")
+    parser.add_argument("--json", help="also write the render timings to this file")
+    args = parser.parse_args()
+
+    if args.headless:
+        init_headless()
+        script = InputScript.load(args.script) if args.script else InputScript(DEFAULT_SCRIPT)
+        timings = RenderTimings()
+        start = perf_counter()
+        main(script, timings, args.seed)
+        print(f"{script.frames} frames in {perf_counter() - start:.2f}s")
+        timings.report()
+        if args.json:
+            with open(args.json, "w") as out:
+                json.dump(timings.summary(), out, indent=2)
+    else:
+        pygame.init()
+        main(InputScript.load(args.script) if args.script else None, seed=args.seed)
+    pygame.quit()
\ No newline at end of file
@@ -1,27 +1,41 @@
 from sudokutools import valid
+from bitboard import BitBoard, DIGITS, PEERS, POPCOUNT
+
+# The cells sharing a row, column, or box with each cell, keyed by coordinates
+PEER_CELLS = {
+    (idx // 9, idx % 9): tuple((peer // 9, peer % 9) for peer in PEERS[idx]) for idx in range(81)
+}
 
 def empty_cells_cand(board):
 
     """
     Function used to find all empty cells and create a dictionary that sets keys as the coordiantes
     and values are the possible candidates for that specific cell.
+
+    For a BitBoard the values are 9-bit candidate masks (bit num - 1 set if num is a candidate),
+    and cells without any candidate are kept with a mask of 0 so dead ends are found right away.
     """
 
     # Dictionary for empty cells
     cell_cand = {}
 
+    if isinstance(board, BitBoard):
+        # Candidates come straight from the row, column and box occupancy masks
+        cells = board.cells
+        for idx in range(81):
+            if cells[idx] == 0:
+                cell_cand[(idx // 9, idx % 9)] = board.candidates(idx // 9, idx % 9)
+        return cell_cand
+
+    # Build the occupancy masks once instead of scanning the board for every number
+    masks = BitBoard(board)
+
     # Get all empty cells and candidates
     for i in range(9):
         for j in range(9):
             if board[i][j] == 0:
-                # Initialize a list to store candidates
-                candidates = []
-
-                # Uses valid function to check for valid candidates
-                for num in range(1, 10):
-                    if valid(board, (i, j), num):
-                        # If it is a valid number, appends it to the candidates list
-                        candidates.append(num)
+                # Initialize a list of candidates from the free bits of the cell
+                candidates = list(DIGITS[masks.candidates(i, j)])
 
                 if candidates:
                     # Creates the key for the dictionary as the cooridnates of empty cell and the value are possible candidates
@@ -29,42 +43,185 @@ def empty_cells_cand(board):
 
     return cell_cand
 
-def update_candidates(cell_cand, board, coordinates_cell, num, add=True):
+def update_candidates(cell_cand, board, coordinates_cell, num, add=True, index=None, trail=None):
     """
     Function used to update dictionary once a cell has been solved
     Also updates all possible candidates as a way to dyanmically update what the next best choice for solving would be
+
+    When an MRVIndex is passed (BitBoard only) it is kept in step with the candidate counts
+    When a Trail is passed every removed candidate is recorded, and undoing (add=False) puts
+    back exactly what the matching placement took away instead of recomputing it
     """
 
+    if isinstance(board, BitBoard):
+        update_candidate_masks(cell_cand, board, coordinates_cell, num, add, index, trail)
+        return
+
     if add:
+        if trail is not None:
+            trail.mark()
         # Deletes specific empty cell once solved
         if coordinates_cell in cell_cand:
+            if trail is not None:
+                trail.record(coordinates_cell, cell_cand[coordinates_cell])
             del cell_cand[coordinates_cell]
+
+        # Update candidates for other cells in the same row, column, and box
+        for cell in PEER_CELLS[coordinates_cell]:
+            if cell in cell_cand and num in cell_cand[cell]:
+                if trail is not None:
+                    trail.record(cell, cell_cand[cell][:])
+                cell_cand[cell].remove(num)
+    elif trail is not None:
+        # Restores everything recorded since the placement
+        trail.undo(cell_cand, index)
     else:
         # Redoes the candidates
 
         # Initializes a list for candidates
         candidates = []
-        for num in range(1, 10):
-            if valid(board, coordinates_cell, num):
+        for candidate in range(1, 10):
+            if valid(board, coordinates_cell, candidate):
                 # Appending candidates to candidates list
-                candidates.append(num)
+                candidates.append(candidate)
         if candidates:
             # Uses coordinates_cell as key to value for candidates
             cell_cand[coordinates_cell] = candidates
 
-    # Update candidates for other cells in the same row, column, and box
-    row, col = coordinates_cell
-    for i in range(9):
-        # Update row
-        if (row, i) in cell_cand and num in cell_cand[(row, i)]:
-            cell_cand[(row, i)].remove(num)
-        # Update column
-        if (i, col) in cell_cand and num in cell_cand[(i, col)]:
-            cell_cand[(i, col)].remove(num)
-
-    start_i, start_j = row - row % 3, col - col % 3
-    for i in range(3):
-        for j in range(3):
-            cell = (start_i + i, start_j + j)
-            if cell in cell_cand and num in cell_cand[cell]:
-                cell_cand[cell].remove(num)
\ No newline at end of file
+        # Hands num back to the cells in the same row, column, and box that can take it again
+        for cell in PEER_CELLS[coordinates_cell]:
+            if cell in cell_cand and num not in cell_cand[cell] and valid(board, cell, num):
+                cell_cand[cell].append(num)
+                cell_cand[cell].sort()
+
+
+class Trail:
+    """
+    Undo log for the candidate dictionary used while searching
+
+    Every change is stored as the cell and its value before the change (None if the cell
+    was not in the dictionary), and mark() remembers where a placement started. undo()
+    rolls back to the last mark in O(changes) as the search backtracks
+    """
+
+    def __init__(self):
+        self.changes = []
+        self.marks = []
+
+    def __len__(self):
+        return len(self.changes)
+
+    def mark(self):
+        # Starts a new group of changes that is undone together
+        self.marks.append(len(self.changes))
+
+    def record(self, cell, old):
+        # Remembers the value of a cell before it is changed
+        self.changes.append((cell, old))
+
+    def undo(self, cell_cand, index=None):
+        # Puts back every change made since the last mark, newest first
+        start = self.marks.pop()
+        changes = self.changes
+        while len(changes) > start:
+            cell, old = changes.pop()
+            if old is None:
+                cell_cand.pop(cell, None)
+                if index is not None:
+                    index.discard(cell)
+            else:
+                cell_cand[cell] = old
+                if index is not None:
+                    index.update(cell, POPCOUNT[old])
+
+
+class MRVIndex:
+    """
+    Persistent minimum remaining values index over the candidate masks of empty cells
+
+    Cells are kept in buckets keyed by their number of candidates, so the next cell to
+    branch on is found by looking at no more than 10 buckets instead of rebuilding a heap
+    """
+
+    def __init__(self, cell_cand):
+        # One bucket per possible candidate count (0 to 9)
+        self.buckets = [set() for _ in range(10)]
+        self.counts = {}
+        for cell, candidates in cell_cand.items():
+            self.add(cell, POPCOUNT[candidates])
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, cell, count):
+        # Stores a cell under its candidate count
+        self.counts[cell] = count
+        self.buckets[count].add(cell)
+
+    def discard(self, cell):
+        # Removes a cell once it has been filled
+        count = self.counts.pop(cell, None)
+        if count is not None:
+            self.buckets[count].discard(cell)
+
+    def update(self, cell, count):
+        # Moves a cell to another bucket when its candidates shrink or grow
+        old = self.counts.get(cell)
+        if old != count:
+            if old is not None:
+                self.buckets[old].discard(cell)
+            self.counts[cell] = count
+            self.buckets[count].add(cell)
+
+    def best(self):
+        # Returns (count, cell) for the lowest cell with the fewest candidates, or None if the index is empty.
+        # Ties go to the lowest cell like the heap it replaced, so both branch on the same cells
+        for count, bucket in enumerate(self.buckets):
+            if bucket:
+                return count, min(bucket)
+        return None
+
+
+def update_candidate_masks(cell_cand, board, coordinates_cell, num, add=True, index=None, trail=None):
+    """
+    Same as update_candidates but for the candidate masks built from a BitBoard
+
+    Placing clears the bit of num from every peer. Undoing pops the trail when there is one,
+    otherwise the cell and its peers are rebuilt from the occupancy masks
+    """
+
+    if add:
+        if trail is not None:
+            trail.mark()
+        # Deletes specific empty cell once solved
+        if coordinates_cell in cell_cand:
+            if trail is not None:
+                trail.record(coordinates_cell, cell_cand[coordinates_cell])
+            del cell_cand[coordinates_cell]
+        if index is not None:
+            index.discard(coordinates_cell)
+
+        mask = 1 << (num - 1)
+        get = cell_cand.get
+        for cell in PEER_CELLS[coordinates_cell]:
+            old = get(cell, 0)
+            if old & mask:
+                if trail is not None:
+                    trail.record(cell, old)
+                cell_cand[cell] = old & ~mask
+                if index is not None:
+                    index.update(cell, POPCOUNT[old & ~mask])
+    elif trail is not None:
+        # Restores everything recorded since the placement
+        trail.undo(cell_cand, index)
+    else:
+        # Cell is empty again, so its candidates and the ones of its peers come from the board
+        row, col = coordinates_cell
+        cell_cand[coordinates_cell] = board.candidates(row, col)
+        if index is not None:
+            index.add(coordinates_cell, POPCOUNT[cell_cand[coordinates_cell]])
+        for cell in PEER_CELLS[coordinates_cell]:
+            if cell in cell_cand:
+                cell_cand[cell] = board.candidates(*cell)
+                if index is not None:
+                    index.update(cell, POPCOUNT[cell_cand[cell]])
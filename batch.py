@@ -0,0 +1,183 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Batch solving of many boards across a pool of worker processes.
+
+Boards travel to and from the workers in a compact wire format: 81 bytes per board
+(one byte per cell, 0 for empty) concatenated per chunk, and one status byte plus 81
+bytes per result on the way back, instead of pickled nested lists.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from search import AStarSearch, BacktrackSearch, LimitReached, BUDGET_EXCEEDED, CANCELLED, SOLVED, TIMEOUT, UNSOLVABLE
+from propagation import Propagator
+import dlx
+
+# Result status of a board, the position in this tuple is its status byte on the wire
+STATUSES = (SOLVED, UNSOLVABLE, TIMEOUT, BUDGET_EXCEEDED, CANCELLED)
+
+
+def encode_board(board):
+    """
+    Encodes a board in the wire format.
+
+    Args:
+        board (list[list[int]]): A 9x9 sudoku board represented as a list of lists of integers.
+
+    Returns:
+        bytes: The 81 cell values in row-major order.
+    """
+
+    return bytes(num for row in board for num in row)
+
+
+def decode_board(data):
+    """
+    Decodes a board from the wire format.
+
+    Args:
+        data (bytes): The 81 cell values in row-major order.
+
+    Returns:
+        list[list[int]]: A 9x9 sudoku board represented as a list of lists of integers.
+    """
+
+    return [list(data[i * 9:i * 9 + 9]) for i in range(9)]
+
+
+def _run_search(search, data, deadline, max_nodes):
+    # Runs a resumable search until it finishes or a limit stops it. An unsolved board comes back
+    # as it was sent, like with Dancing Links, never partly searched
+    status = search.run_limited(max_nodes, deadline)
+    return status, bytes(search.board.cells) if status == SOLVED else data
+
+
+def _solve_backtracking(data, deadline, max_nodes):
+    return _run_search(BacktrackSearch(decode_board(data)), data, deadline, max_nodes)
+
+
+def _solve_astar(data, deadline, max_nodes):
+    return _run_search(AStarSearch(decode_board(data), propagator=Propagator()), data, deadline, max_nodes)
+
+
+def _solve_dlx(data, deadline, max_nodes):
+    try:
+        solution = next(dlx.solutions(decode_board(data), deadline, max_nodes), None)
+    except LimitReached as stopped:
+        return stopped.status, data
+    if solution is None:
+        return UNSOLVABLE, data
+    return SOLVED, bytes(solution)
+
+
+# Solvers available by name, taking (wire board, deadline, node budget) and returning (status, wire board)
+BACKENDS = {
+    "backtracking": _solve_backtracking,
+    "astar": _solve_astar,
+    "dlx": _solve_dlx,
+}
+
+
+def _solve_one(algorithm, data, timeout, max_nodes):
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    if isinstance(algorithm, str):
+        return BACKENDS[algorithm](data, deadline, max_nodes)
+
+    # Any other solving function with the (board) -> bool in-place contract, without limits
+    board = decode_board(data)
+    if algorithm(board):
+        return SOLVED, encode_board(board)
+    return UNSOLVABLE, data
+
+
+def _solve_chunk(algorithm, blob, timeout, max_nodes=None):
+    # Worker entry point: solves every board of a chunk and packs the results
+    out = bytearray()
+    for offset in range(0, len(blob), 81):
+        status, data = _solve_one(algorithm, blob[offset:offset + 81], timeout, max_nodes)
+        out.append(STATUSES.index(status))
+        out += data
+    return bytes(out)
+
+
+def _unpack(start, blob):
+    # Turns a packed chunk of results back into (index, status, board) tuples
+    results = []
+    for n, offset in enumerate(range(0, len(blob), 82)):
+        results.append((start + n, STATUSES[blob[offset]], decode_board(blob[offset + 1:offset + 82])))
+    return results
+
+
+def _chunks(boards, chunksize):
+    # Packs the boards in chunks of (index of the first board, wire blob)
+    blob = bytearray()
+    start = count = 0
+    for board in boards:
+        blob += encode_board(board)
+        count += 1
+        if count - start == chunksize:
+            yield start, bytes(blob)
+            blob = bytearray()
+            start = count
+    if blob:
+        yield start, bytes(blob)
+
+
+def solve_many(boards, algorithm="dlx", workers=None, chunksize=16, ordered=True, timeout=None, max_nodes=None):
+    """
+    Solves many boards, spreading them across a pool of worker processes.
+
+    Args:
+        boards (Iterable[list[list[int]]]): The boards to solve, read lazily. The boards are not modified.
+        algorithm (str|callable): A name from BACKENDS ("backtracking", "astar" or "dlx"), or a module level
+            solving function with the (board) -> bool in-place contract.
+        workers (int|None): The number of worker processes, None for one per core, 0 to solve in this process.
+        chunksize (int): The number of boards sent to a worker at once.
+        ordered (bool): Yield the results in the order of the boards if True, otherwise as they complete.
+        timeout (float|None): Seconds allowed per board. Only the named backends can be stopped, so the
+            timeout is ignored for other solving functions.
+        max_nodes (int|None): Placements (rows for Dancing Links) allowed per board, ignored like the timeout.
+
+    Yields:
+        tuple[int, str, list[list[int]]]: The index of the board, its status (SOLVED, UNSOLVABLE, TIMEOUT or
+        BUDGET_EXCEEDED) and the solved board, or the original board if it was not solved, with every backend.
+    """
+
+    if workers == 0:
+        for start, blob in _chunks(boards, chunksize):
+            yield from _unpack(start, _solve_chunk(algorithm, blob, timeout, max_nodes))
+        return
+
+    workers = workers or os.cpu_count() or 1
+    # Only a few chunks per worker are in flight, so the boards can be a long lazy stream
+    window = workers * 4
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = _chunks(boards, chunksize)
+        pending = deque()
+        exhausted = False
+
+        while True:
+            while not exhausted and len(pending) < window:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                start, blob = chunk
+                pending.append((start, pool.submit(_solve_chunk, algorithm, blob, timeout, max_nodes)))
+
+            if not pending:
+                return
+
+            if ordered:
+                start, future = pending.popleft()
+                yield from _unpack(start, future.result())
+            else:
+                done, not_done = wait([future for start, future in pending], return_when=FIRST_COMPLETED)
+                for start, future in [entry for entry in pending if entry[1] in done]:
+                    pending.remove((start, future))
+                    yield from _unpack(start, future.result())
@@ -0,0 +1,502 @@
+import gc
+import heapq
+import importlib.util
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import time
+import astar
+from bitboard import BitBoard, DIGITS, POPCOUNT
+from corpus import parse_line
+from grid import generate_grid, solve_grid
+from propagation import Propagator
+from search import AStarSearch
+from sudokutools import generate_board, solve, solve_A, valid
+
+## Benchmark Parameters ##
+# Seed used to generate the random puzzles, so every run uses the same boards
+SEED = 481
+# Number of random puzzles per number of removed cells
+NUM_PUZZLES = 20
+# Numbers of removed cells used for the random puzzles
+REMOVED_CELLS = (45, 55, 60, 64)
+
+# Well known hard puzzles in the 81 character format (0 for empty cells)
+HARD_PUZZLES = [
+    "800000000003600000070090200050007000000045700000100030001000068008500010090000400",
+    "000000010400000000020000000000050407008000300001090000300400200050100000000806000",
+    "000000012000000003002300400001800005060070800000009000008500000900040500470006000",
+]
+
+# Puzzles with the minimum of 17 clues, each with a unique solution
+SEVENTEEN_CLUE_PUZZLES = [
+    "000000010400000000020000000000050407008000300001090000300400200050100000000806000",
+    "000000010400000000020000000000050604008000300001090000300400200050100000000807000",
+    "000000012000035000000600070700000300000400800100000000000120000080000040050000600",
+    "000000012003600000000007000410020000000500300700000600280000040000300500000000000",
+    "000000012008030000000000040120500000000004700060000000507000300000620000000100000",
+    "000000013000030080070000000000206000030000900000010000600500204000400700100000000",
+    "000000013000200000000000080000760200008000400010000000200000750600340000000008000",
+    "000000013000500070000802000000400900107000000000000200890000050040000600000010000",
+]
+
+# Box sizes of the grid scaling benchmark (9x9, 16x16 and 25x25 boards)...
+GRID_BOXES = (3, 4, 5)
+# ...and the shares of their cells removed. Random puzzles past about half of the cells
+# removed get very hard on the larger grids, where the search hits GRID_NODE_BUDGET
+GRID_REMOVED = (0.3, 0.4, 0.5)
+GRID_PUZZLES = 5
+GRID_NODE_BUDGET = 20000
+
+## Regression Suite Parameters ##
+# Seeded corpora from easy to 17 clues, as the number of removed cells of generated puzzles or fixed puzzle lines,
+# and larger grids as (box size, removed cells)
+CORPORA = {
+    "easy": 30,
+    "medium": 45,
+    "hard": 55,
+    "17-clue": SEVENTEEN_CLUE_PUZZLES,
+    "16x16": (4, 100),
+    "25x25": (5, 250),
+}
+# Number of generated puzzles per corpus
+CORPUS_SIZE = 10
+# Timed samples per benchmark, after the warmup samples
+NUM_SAMPLES = 7
+NUM_WARMUP = 1
+# A benchmark regresses when its median is this much slower than the baseline...
+THRESHOLD = 0.10
+# ...and a one-sided Mann-Whitney U test puts the chance of that being noise below this
+ALPHA = 0.01
+
+
+def seeded_boards(removed_cells: int, num_puzzles: int, seed: int = SEED) -> list[list[list[int]]]:
+    # Generates the same puzzles on every run from a generator of their own, the global random state is left alone
+    # Past MAX_UNIQUE_REMOVED removed cells generate_board makes non-unique puzzles
+    rng = random.Random(seed + removed_cells)
+    return [generate_board(removed_cells, seed=rng) for _ in range(num_puzzles)]
+
+
+def heap_solve_A(board: BitBoard, cell_cand=None) -> bool:
+    # solve_A as it was before the MRVIndex: a heap of every remaining cell is rebuilt on each call
+    if cell_cand is None:
+        cell_cand = astar.empty_cells_cand(board)
+
+    if not cell_cand:
+        return True
+
+    priority_queue = [(POPCOUNT[candidates], (i, j), candidates) for (i, j), candidates in cell_cand.items()]
+    heapq.heapify(priority_queue)
+
+    dont_use, (i, j), candidates = heapq.heappop(priority_queue)
+    for num in DIGITS[candidates]:
+        if board.valid((i, j), num):
+            board.place(i, j, num)
+            astar.update_candidates(cell_cand, board, (i, j), num, add=True)
+            if heap_solve_A(board, cell_cand):
+                return True
+            board.remove(i, j)
+            astar.update_candidates(cell_cand, board, (i, j), num, add=False)
+    return False
+
+
+def count_nodes(solving_function, board: list[list[int]]):
+    # Counts placements (search nodes) of heap_solve_A by wrapping astar.update_candidates, returns
+    # (nodes, seconds, solved). The engines in search.py import update_candidates by name, so they are
+    # counted by their own node counter instead, see count_engine_nodes
+    original = astar.update_candidates
+    nodes = 0
+
+    def counting_update(cell_cand, board, coordinates_cell, num, add=True, **kwargs):
+        nonlocal nodes
+        if add:
+            nodes += 1
+        original(cell_cand, board, coordinates_cell, num, add, **kwargs)
+
+    astar.update_candidates = counting_update
+    try:
+        start = time.perf_counter()
+        solved = solving_function(BitBoard(board))
+        seconds = time.perf_counter() - start
+    finally:
+        astar.update_candidates = original
+    return nodes, seconds, solved
+
+
+def count_engine_nodes(board: list[list[int]]):
+    # Solves with the AStarSearch engine, propagation off, and reads its placements from Search.nodes,
+    # returns (nodes, seconds, solved) like count_nodes
+    start = time.perf_counter()
+    search = AStarSearch([row[:] for row in board], propagator=Propagator(rules=()))
+    solved = search.run()
+    seconds = time.perf_counter() - start
+    return search.nodes, seconds, solved
+
+
+def compare_mrv(boards: list[list[list[int]]]):
+    # Runs the heap rebuild solver and the MRVIndex solver on the same boards and totals their effort
+    # Propagation is turned off so only the cell selection differs
+    totals = {}
+    for name, counter in (("heap rebuild", lambda board: count_nodes(heap_solve_A, board)),
+                          ("MRV index", count_engine_nodes)):
+        nodes, seconds, solved = 0, 0.0, 0
+        for board in boards:
+            n, s, ok = counter(board)
+            nodes += n
+            seconds += s
+            solved += bool(ok)
+        totals[name] = {"nodes": nodes, "seconds": seconds, "solved": solved}
+    return totals
+
+
+# Propagation rule sets compared by compare_propagation, from none to all of them
+RULE_SETS = {
+    "none": (),
+    "naked": ("naked_singles",),
+    "naked+hidden": ("naked_singles", "hidden_singles"),
+    "all": ("naked_singles", "hidden_singles", "box_line_reduction"),
+}
+
+
+def compare_propagation(boards: list[list[list[int]]]):
+    # Solves the boards with each rule set and totals the search nodes, and the cells placed and
+    # candidates eliminated by each rule
+    totals = {}
+    for name, rules in RULE_SETS.items():
+        propagator = Propagator(rules)
+        nodes, seconds = 0, 0.0
+        for board in boards:
+            start = time.perf_counter()
+            search = AStarSearch(board, propagator=propagator)
+            search.run()
+            seconds += time.perf_counter() - start
+            nodes += search.nodes
+        totals[name] = {"nodes": nodes, "seconds": seconds, "cells": propagator.cells,
+                        "eliminations": propagator.eliminations}
+    return totals
+
+
+def regression_corpus(name: str, seed: int = SEED) -> list[list[list[int]]]:
+    # The puzzles of one corpus of CORPORA, generated from a seed of their own
+    spec = CORPORA[name]
+    if isinstance(spec, tuple):
+        box, removed = spec
+        rng = random.Random(seed * 1000 + box * 100 + removed)
+        return [generate_grid(box, removed, seed=rng) for _ in range(CORPUS_SIZE)]
+    if isinstance(spec, int):
+        rng = random.Random(seed * 1000 + spec)
+        return [generate_board(spec, seed=rng) for _ in range(CORPUS_SIZE)]
+    return [parse_line(line) for line in spec]
+
+
+def _bench_valid(boards):
+    # Every number in every empty cell, on the list boards valid is called with outside the engines
+    checks = [(board, (i, j)) for board in boards for i in range(9) for j in range(9) if board[i][j] == 0]
+
+    def run():
+        for board, pos in checks:
+            for num in range(1, 10):
+                valid(board, pos, num)
+    return run
+
+
+def _bench_empty_cells_cand(boards):
+    bitboards = [BitBoard(board) for board in boards]
+
+    def run():
+        for bitboard in bitboards:
+            astar.empty_cells_cand(bitboard)
+    return run
+
+
+def _bench_update_candidates(boards):
+    # Places the lowest candidate of every empty cell and takes it back through the trail,
+    # which leaves the candidates as they were so every sample does the same work
+    states = []
+    for board in boards:
+        bitboard = BitBoard(board)
+        cell_cand = astar.empty_cells_cand(bitboard)
+        moves = [(cell, DIGITS[mask][0]) for cell, mask in cell_cand.items() if mask]
+        states.append((bitboard, cell_cand, astar.MRVIndex(cell_cand), astar.Trail(), moves))
+
+    def run():
+        update = astar.update_candidates
+        for bitboard, cell_cand, index, trail, moves in states:
+            for cell, num in moves:
+                bitboard.place(cell[0], cell[1], num)
+                update(cell_cand, bitboard, cell, num, add=True, index=index, trail=trail)
+                bitboard.remove(cell[0], cell[1])
+                update(cell_cand, bitboard, cell, num, add=False, index=index, trail=trail)
+    return run
+
+
+def _bench_solver(solving_function):
+    # Solves fresh copies of the boards, made before the sample so copying is not timed
+    def bench(boards):
+        copies = []
+
+        def run():
+            for board in copies.pop():
+                solving_function(board)
+
+        def prepare():
+            copies.append([[row[:] for row in board] for board in boards])
+        run.prepare = prepare
+        return run
+    return bench
+
+
+def _bench_generate_board(boards):
+    # Generates as many puzzles as the corpus has, with as many removed cells, from fixed seeds
+    removed = [sum(row.count(0) for row in board) for board in boards]
+
+    def run():
+        for n, count in enumerate(removed):
+            generate_board(count, seed=SEED + n)
+    return run
+
+
+def _bench_render(boards):
+    # Renders each puzzle headless the way the game does: a new Board with its help panel, a full
+    # redraw, then one cell filled in and redrawn at a time until it is solved
+    import pygame
+    import SudokuGUI
+
+    SudokuGUI.init_headless()
+    screen = pygame.display.set_mode(SudokuGUI.WINDOW_SIZE)
+    solutions = []
+    for board in boards:
+        solution = [row[:] for row in board]
+        solve_A(solution)
+        solutions.append(solution)
+    copies = []
+
+    def run():
+        for puzzle, solution in copies.pop():
+            gui = SudokuGUI.Board(screen, (puzzle, solution))
+            gui.redraw({}, 0, "00:00:00")
+            for i in range(9):
+                for j in range(9):
+                    if not puzzle[i][j]:
+                        gui.tiles[i][j].value = solution[i][j]
+                        gui.redraw({}, 0, "00:00:00")
+
+    def prepare():
+        copies.append([([row[:] for row in board], solution) for board, solution in zip(boards, solutions)])
+    run.prepare = prepare
+    return run
+
+
+# Benchmarks of the regression suite with the corpora they run on. Plain backtracking is left
+# out of the 17-clue corpus, where a single puzzle can take it from seconds to minutes
+BENCHMARKS = {
+    "valid": (_bench_valid, ("easy", "medium", "hard", "17-clue")),
+    "empty_cells_cand": (_bench_empty_cells_cand, ("easy", "medium", "hard", "17-clue")),
+    "update_candidates": (_bench_update_candidates, ("easy", "medium", "hard", "17-clue")),
+    "solve": (_bench_solver(solve), ("easy", "medium", "hard")),
+    "solve_A": (_bench_solver(solve_A), ("easy", "medium", "hard", "17-clue")),
+    "generate_board": (_bench_generate_board, ("easy", "medium", "hard")),
+    "solve_grid": (_bench_solver(solve_grid), ("medium", "hard", "16x16", "25x25")),
+}
+# Rendering needs pygame, which the solvers do not
+if importlib.util.find_spec("pygame") is not None:
+    BENCHMARKS["render"] = (_bench_render, ("easy", "hard"))
+
+
+def sample(run, samples: int = NUM_SAMPLES, warmup: int = NUM_WARMUP) -> list[float]:
+    # Times warmup + samples calls of run with perf_counter_ns and the garbage collector paused,
+    # returns the timed samples in seconds
+    prepare = getattr(run, "prepare", None)
+    times = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for n in range(warmup + samples):
+            if prepare is not None:
+                prepare()
+            start = time.perf_counter_ns()
+            run()
+            elapsed = time.perf_counter_ns() - start
+            if n >= warmup:
+                times.append(elapsed / 1e9)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return times
+
+
+def run_suite(selected: str = "", samples: int = NUM_SAMPLES, warmup: int = NUM_WARMUP, verbose: bool = True) -> dict:
+    # Runs every benchmark whose "function/corpus" name contains selected, returns a JSON ready result
+    corpora = {}
+    results = {}
+    for function, (factory, corpus_names) in BENCHMARKS.items():
+        for corpus_name in corpus_names:
+            name = f"{function}/{corpus_name}"
+            if selected not in name:
+                continue
+            if corpus_name not in corpora:
+                corpora[corpus_name] = regression_corpus(corpus_name)
+            times = sample(factory(corpora[corpus_name]), samples, warmup)
+            median = statistics.median(times)
+            results[name] = {
+                "times": times,
+                "median": median,
+                "min": min(times),
+                "mean": statistics.mean(times),
+                "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+            }
+            if verbose:
+                print(f"{name:<32} {median * 1000:>10.3f} ms")
+
+    return {
+        "meta": {
+            "python": sys.version.split()[0],
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": SEED,
+            "corpus_size": CORPUS_SIZE,
+        },
+        "benchmarks": results,
+    }
+
+
+def mann_whitney_greater(current: list[float], baseline: list[float]) -> float:
+    # One-sided p-value of the Mann-Whitney U test (normal approximation) that current is slower than baseline
+    wins = sum(1.0 if x > y else 0.5 if x == y else 0.0 for x in current for y in baseline)
+    n1, n2 = len(current), len(baseline)
+    mean = n1 * n2 / 2
+    sd = math.sqrt(n1 * n2 * (n1 + n2 + 1) / 12)
+    if not sd:
+        return 1.0
+    z = (wins - mean - 0.5) / sd
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare_results(current: dict, baseline: dict, threshold: float = THRESHOLD, alpha: float = ALPHA) -> list[dict]:
+    # Compares every benchmark found in both results, a regression is slower than the threshold and significant
+    rows = []
+    for name, result in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            continue
+        change = result["median"] / base["median"] - 1
+        p_value = mann_whitney_greater(result["times"], base["times"])
+        rows.append({
+            "name": name,
+            "baseline": base["median"],
+            "current": result["median"],
+            "change": change,
+            "p_value": p_value,
+            "regression": change > threshold and p_value < alpha,
+        })
+    return rows
+
+
+def compare_grid_sizes(boxes: tuple = GRID_BOXES, removed: tuple = GRID_REMOVED, num_puzzles: int = GRID_PUZZLES,
+                       seed: int = SEED):
+    # Solves seeded random puzzles of every grid size and share of removed cells with solve_grid,
+    # returns the totals per (size, share)
+    totals = {}
+    for box in boxes:
+        size = box * box
+        for share in removed:
+            count = int(size * size * share)
+            rng = random.Random(seed * 1000 + box * 100 + count)
+            nodes, seconds, solved = 0, 0.0, 0
+            for _ in range(num_puzzles):
+                result = solve_grid(generate_grid(box, count, seed=rng), max_nodes=GRID_NODE_BUDGET)
+                nodes += result.nodes
+                seconds += result.seconds
+                solved += bool(result)
+            totals[(size, share)] = {"nodes": nodes, "seconds": seconds, "solved": solved}
+    return totals
+
+
+def print_scaling():
+    print(f"\nScaling benchmark: solve_grid time by grid size")
+    print("-" * 80)
+    print(f"{'Grid':<8} | {'Removed':>8} | {'Nodes':>10} | {'Time':>10} | {'ms/puzzle':>10} | {'Solved':>8}")
+    print("-" * 80)
+    for (size, share), result in compare_grid_sizes().items():
+        per_puzzle = result["seconds"] / GRID_PUZZLES * 1000
+        print(f"{f'{size}x{size}':<8} | {share:>8.0%} | {result['nodes']:>10} | {result['seconds']:>9.4f}s | "
+              f"{per_puzzle:>10.2f} | {result['solved']:>4}/{GRID_PUZZLES}")
+
+
+def print_tables():
+    groups = [(f"{removed} removed", seeded_boards(removed, NUM_PUZZLES)) for removed in REMOVED_CELLS]
+    groups.append(("hard", [parse_line(line) for line in HARD_PUZZLES]))
+
+    print(f"\nNode count benchmark: cell selection in solve_A")
+    print("-" * 86)
+    print(f"{'Puzzles':<12} | {'Selector':<14} | {'Nodes':>10} | {'Time':>10} | {'us/node':>10} | {'Solved':>8}")
+    print("-" * 86)
+    for label, boards in groups:
+        for name, result in compare_mrv(boards).items():
+            per_node = result["seconds"] / result["nodes"] * 1e6 if result["nodes"] else 0.0
+            print(f"{label:<12} | {name:<14} | {result['nodes']:>10} | {result['seconds']:>9.4f}s | {per_node:>10.2f} | {result['solved']:>4}/{len(boards)}")
+
+    print(f"\nNode count benchmark: propagation before and between branching in solve_A")
+    print("-" * 100)
+    print(f"{'Puzzles':<12} | {'Rules':<14} | {'Nodes':>10} | {'Time':>10} | Cells placed (candidates eliminated) by rule")
+    print("-" * 100)
+    for label, boards in groups:
+        for name, result in compare_propagation(boards).items():
+            eliminations = result["eliminations"]
+            resolved = ", ".join(f"{rule}={count}" + (f" ({eliminations[rule]})" if eliminations[rule] else "")
+                                 for rule, count in result["cells"].items())
+            print(f"{label:<12} | {name:<14} | {result['nodes']:>10} | {result['seconds']:>9.4f}s | {resolved}")
+
+    print_scaling()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Solver benchmarks. Without a command, prints the node count tables.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("tables", help="print the node count tables")
+    commands.add_parser("scaling", help="print the solve time by grid size table")
+    regress = commands.add_parser("run", help="run the regression suite")
+    regress.add_argument("--filter", default="", help="only run benchmarks whose function/corpus name contains this")
+    regress.add_argument("--samples", type=int, default=NUM_SAMPLES)
+    regress.add_argument("--warmup", type=int, default=NUM_WARMUP)
+    regress.add_argument("--save", help="write the results to this JSON baseline file")
+    regress.add_argument("--baseline", help="compare against this JSON baseline file, exit with 1 on a regression")
+    regress.add_argument("--threshold", type=float, default=THRESHOLD, help="relative slowdown of the median allowed")
+    regress.add_argument("--alpha", type=float, default=ALPHA, help="significance level of the Mann-Whitney U test")
+    args = parser.parse_args()
+
+    if args.command == "scaling":
+        print_scaling()
+        sys.exit(0)
+    if args.command != "run":
+        print_tables()
+        sys.exit(0)
+
+    results = run_suite(args.filter, args.samples, args.warmup)
+    if args.save:
+        with open(args.save, "w") as out:
+            json.dump(results, out, indent=2)
+        print(f"Saved {len(results['benchmarks'])} benchmarks to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as base:
+            rows = compare_results(results, json.load(base), args.threshold, args.alpha)
+        print(f"\nCompared with {args.baseline} (threshold {args.threshold:.0%}, alpha {args.alpha})")
+        print("-" * 90)
+        print(f"{'Benchmark':<32} | {'Baseline':>11} | {'Current':>11} | {'Change':>8} | {'p':>7} | Status")
+        print("-" * 90)
+        for row in rows:
+            status = "REGRESSION" if row["regression"] else "ok"
+            print(f"{row['name']:<32} | {row['baseline'] * 1000:>9.3f}ms | {row['current'] * 1000:>9.3f}ms | "
+                  f"{row['change']:>+7.1%} | {row['p_value']:>7.4f} | {status}")
+        regressions = [row["name"] for row in rows if row["regression"]]
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nNo regressions")
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Compact bitmask-backed sudoku board used by the solvers in sudokutools.
+
+Every row, column and 3x3 box keeps a 9-bit occupancy mask where bit ``num - 1``
+is set once ``num`` has been placed in that unit. The masks are kept up to date on
+every place and remove, so checking whether a number fits in a cell, or which
+numbers are still possible there, is a couple of bitwise operations instead of a
+scan over the row, column and box.
+"""
+
+# Mask with all nine candidate bits set
+ALL_DIGITS = 0x1FF
+
+# Lookup tables from a flat cell index (0-80) to its row, column and box
+ROW_OF = tuple(idx // 9 for idx in range(81))
+COL_OF = tuple(idx % 9 for idx in range(81))
+BOX_OF = tuple((idx // 27) * 3 + (idx % 9) // 3 for idx in range(81))
+
+
+def _peers(idx):
+    row, col, box = ROW_OF[idx], COL_OF[idx], BOX_OF[idx]
+    return tuple(
+        other for other in range(81)
+        if other != idx and (ROW_OF[other] == row or COL_OF[other] == col or BOX_OF[other] == box)
+    )
+
+
+# The 20 cells that share a row, column or box with each cell
+PEERS = tuple(_peers(idx) for idx in range(81))
+
+# Number of set bits and the digits contained in every possible 9-bit mask
+POPCOUNT = tuple(bin(mask).count("1") for mask in range(512))
+DIGITS = tuple(tuple(num for num in range(1, 10) if mask >> (num - 1) & 1) for mask in range(512))
+
+
+def bit(num):
+    """
+    Returns the candidate mask bit for a number.
+
+    Args:
+        num (int): A number between 1 and 9.
+
+    Returns:
+        int: The mask with only the bit for num set.
+    """
+
+    return 1 << (num - 1)
+
+
+class BitBoard:
+    __slots__ = ("cells", "rows", "cols", "boxes")
+
+    def __init__(self, board=None):
+        """
+        Initializes a BitBoard, optionally from a list based board.
+
+        Args:
+            board (list[list[int]]|None): A 9x9 sudoku board represented as a list of lists of integers.
+
+        Attributes:
+            cells (list[int]): The 81 cell values in row-major order, 0 for empty cells.
+            rows (list[int]): The occupancy mask of each row.
+            cols (list[int]): The occupancy mask of each column.
+            boxes (list[int]): The occupancy mask of each 3x3 box.
+        """
+
+        self.cells = [0] * 81
+        self.rows = [0] * 9
+        self.cols = [0] * 9
+        self.boxes = [0] * 9
+
+        if board is not None:
+            for i in range(9):
+                for j in range(9):
+                    if board[i][j] != 0:
+                        self.place(i, j, board[i][j])
+
+    def place(self, i, j, num):
+        """
+        Places a number in an empty cell and marks it in the row, column and box masks.
+
+        Args:
+            i (int): The row index of the cell.
+            j (int): The column index of the cell.
+            num (int): The number to place.
+        """
+
+        mask = 1 << (num - 1)
+        self.cells[i * 9 + j] = num
+        self.rows[i] |= mask
+        self.cols[j] |= mask
+        self.boxes[(i // 3) * 3 + j // 3] |= mask
+
+    def remove(self, i, j):
+        """
+        Clears a cell and frees its number in the row, column and box masks.
+
+        Args:
+            i (int): The row index of the cell.
+            j (int): The column index of the cell.
+
+        Returns:
+            int: The number that was removed, 0 if the cell was already empty.
+        """
+
+        num = self.cells[i * 9 + j]
+        if num:
+            mask = ~(1 << (num - 1))
+            self.cells[i * 9 + j] = 0
+            self.rows[i] &= mask
+            self.cols[j] &= mask
+            self.boxes[(i // 3) * 3 + j // 3] &= mask
+        return num
+
+    def get(self, i, j):
+        """
+        Returns the number in a cell, 0 if it is empty.
+        """
+
+        return self.cells[i * 9 + j]
+
+    def candidates(self, i, j):
+        """
+        Returns the mask of numbers that do not clash with the row, column or box of a cell.
+
+        Args:
+            i (int): The row index of the cell.
+            j (int): The column index of the cell.
+
+        Returns:
+            int: A 9-bit mask where bit num - 1 is set if num can be placed in the cell.
+        """
+
+        return ALL_DIGITS & ~(self.rows[i] | self.cols[j] | self.boxes[(i // 3) * 3 + j // 3])
+
+    def valid(self, pos, num):
+        """
+        Checks whether a number is valid in a cell, with the same meaning as sudokutools.valid.
+
+        Args:
+            pos (tuple[int, int]): The position of the cell as a tuple of row and column indices.
+            num (int): The number to check.
+
+        Returns:
+            bool: True if the number is valid in the cell, False otherwise.
+        """
+
+        i, j = pos
+        return not (self.rows[i] | self.cols[j] | self.boxes[(i // 3) * 3 + j // 3]) >> (num - 1) & 1
+
+    def find_empty(self):
+        """
+        Returns the position of the first empty cell in row-major order, or None if the board is full.
+        """
+
+        try:
+            idx = self.cells.index(0)
+        except ValueError:
+            return None
+        return (idx // 9, idx % 9)
+
+    def copy(self):
+        """
+        Returns an independent copy of the board.
+        """
+
+        other = BitBoard.__new__(BitBoard)
+        other.cells = self.cells[:]
+        other.rows = self.rows[:]
+        other.cols = self.cols[:]
+        other.boxes = self.boxes[:]
+        return other
+
+    def to_list(self):
+        """
+        Returns the board as a new list of lists of integers.
+        """
+
+        cells = self.cells
+        return [cells[i * 9:i * 9 + 9] for i in range(9)]
+
+    def write_to(self, board):
+        """
+        Copies the cell values back into an existing list based board in place.
+
+        Args:
+            board (list[list[int]]): A 9x9 sudoku board represented as a list of lists of integers.
+        """
+
+        cells = self.cells
+        for i in range(9):
+            board[i][:] = cells[i * 9:i * 9 + 9]
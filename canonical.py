@@ -0,0 +1,249 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Canonical forms of sudoku puzzles and a solution cache keyed on them.
+
+Relabeling the digits, permuting the rows inside each band, permuting the columns
+inside each stack and transposing the board all turn a puzzle into an equivalent one
+whose solution is the same solution moved the same way. canonical_form picks one
+representative of every such family, so the equivalent puzzles share a cache entry.
+
+Trying every row and column order (216 * 216 * 2) is far too slow, so rows and columns
+are first sorted by keys that none of these transformations change (clue counts per
+stack or band, how often their digits appear on the whole board, ...). Only rows or
+columns with equal keys are tried in every order, and the lexicographically smallest
+board, with digits numbered in order of first appearance, is the canonical form.
+"""
+
+import itertools
+from collections import OrderedDict
+from bitboard import BitBoard
+from search import SOLVED, UNSOLVABLE, SolveResult
+
+# Largest number of row and column orders tried for one orientation. Past it only the
+# first orders are tried, the key stays correct but an equivalent puzzle might get another one
+MAX_ORDERS = 1024
+
+
+def _flat(board):
+    if isinstance(board, BitBoard):
+        return board.cells[:]
+    return [num for row in board for num in row]
+
+
+def _transpose(cells):
+    return [cells[j * 9 + i] for i in range(9) for j in range(9)]
+
+
+def _line_keys(cells, digit_counts):
+    # Keys of the 9 rows of cells that do not change under the symmetries (stack counts, digit frequencies)
+    keys = []
+    for i in range(9):
+        row = cells[i * 9:i * 9 + 9]
+        keys.append((
+            tuple(3 - row[s * 3:s * 3 + 3].count(0) for s in range(3)),
+            tuple(sorted(digit_counts[num] for num in row if num)),
+        ))
+    return keys
+
+
+def _refine(cells, row_keys, col_keys):
+    # Adds to every row key the keys of the columns its clues are in, stack by stack
+    refined = []
+    for i in range(9):
+        refined.append((row_keys[i], tuple(
+            tuple(sorted(col_keys[j] for j in range(s * 3, s * 3 + 3) if cells[i * 9 + j])) for s in range(3)
+        )))
+    return refined
+
+
+def _orders(keys):
+    # Every order of the 9 lines that keeps the bands in place and sorts each band by key,
+    # trying the lines of a band with equal keys in every order
+    per_band = []
+    for band in range(0, 9, 3):
+        lines = sorted(range(band, band + 3), key=lambda line: keys[line])
+        groups = [list(group) for key, group in itertools.groupby(lines, key=lambda line: keys[line])]
+        per_band.append([
+            [line for perm in perms for line in perm]
+            for perms in itertools.product(*(itertools.permutations(group) for group in groups))
+        ])
+    for bands in itertools.product(*per_band):
+        yield bands[0] + bands[1] + bands[2]
+
+
+def _relabel(cells):
+    # Numbers the digits in order of first appearance, returns the board and the labels (digit -> label)
+    labels = [0] * 10
+    next_label = 1
+    out = []
+    for num in cells:
+        if num:
+            if not labels[num]:
+                labels[num] = next_label
+                next_label += 1
+            out.append(labels[num])
+        else:
+            out.append(0)
+    return out, labels
+
+
+def canonical_form(board):
+    """
+    Finds the canonical form of a puzzle and the transformation that leads to it.
+
+    Args:
+        board (list[list[int]]|BitBoard): A 9x9 sudoku board.
+
+    Returns:
+        tuple[bytes, tuple[tuple[int, ...], tuple[int, ...]]]: The 81 cells of the canonical form, and the
+        transformation as (positions, labels): canonical cell k holds labels[num] where num is the number
+        in cell positions[k] of the board.
+    """
+
+    cells = _flat(board)
+    digit_counts = [cells.count(num) for num in range(10)]
+
+    best = None
+    for transposed in (False, True):
+        grid = _transpose(cells) if transposed else cells
+        across = _transpose(grid)
+        row_keys = _line_keys(grid, digit_counts)
+        col_keys = _line_keys(across, digit_counts)
+        row_keys, col_keys = _refine(grid, row_keys, col_keys), _refine(across, col_keys, row_keys)
+
+        row_orders = _orders(row_keys)
+        col_orders = list(itertools.islice(_orders(col_keys), MAX_ORDERS))
+        budget = MAX_ORDERS
+        for rows in row_orders:
+            for cols in col_orders:
+                order = [r * 9 + c for r in rows for c in cols]
+                candidate, labels = _relabel([grid[idx] for idx in order])
+                if best is None or candidate < best[0]:
+                    positions = [(idx % 9) * 9 + idx // 9 for idx in order] if transposed else order
+                    best = (candidate, positions, labels)
+                budget -= 1
+                if not budget:
+                    break
+            if not budget:
+                break
+
+    candidate, positions, labels = best
+    # Digits missing from the clues get the labels that are left, so labels is a bijection
+    free = iter(label for label in range(1, 10) if label not in labels)
+    labels = [labels[num] or (next(free) if num else 0) for num in range(10)]
+    return bytes(candidate), (tuple(positions), tuple(labels))
+
+
+def to_canonical(board, transform):
+    """
+    Moves a board (usually a solution) into the canonical orientation of a transformation.
+
+    Returns:
+        list[int]: The 81 cells in canonical order and labels.
+    """
+
+    positions, labels = transform
+    cells = _flat(board)
+    return [labels[cells[idx]] for idx in positions]
+
+
+def from_canonical(cells, transform):
+    """
+    Moves canonical cells back into the orientation and digits of the board the transformation came from.
+
+    Args:
+        cells (Sequence[int]): The 81 cells in canonical order and labels.
+        transform (tuple[tuple[int, ...], tuple[int, ...]]): The transformation returned by canonical_form.
+
+    Returns:
+        list[int]: The 81 cells of the board in row-major order.
+    """
+
+    positions, labels = transform
+    digits = [0] * 10
+    for num, label in enumerate(labels):
+        digits[label] = num
+    out = [0] * 81
+    for k, idx in enumerate(positions):
+        out[idx] = digits[cells[k]]
+    return out
+
+
+class SolutionCache:
+    def __init__(self, maxsize=1024):
+        """
+        Initializes an LRU cache of solutions keyed on the canonical form of their puzzle.
+
+        Args:
+            maxsize (int): The number of puzzles kept, the least recently used one is dropped past it.
+
+        Attributes:
+            hits (int): The number of puzzles answered from the cache.
+            misses (int): The number of puzzles that had to be solved.
+        """
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def info(self):
+        """
+        Returns the hit and miss counters with the current and maximum size.
+        """
+
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def solve(self, board, solving_function):
+        """
+        Solves a board in place, from the cache when an equivalent puzzle was solved before.
+
+        Only solved and unsolvable puzzles are cached, a search stopped by a limit is tried again next time.
+
+        Args:
+            board (list[list[int]]|BitBoard): A 9x9 sudoku board.
+            solving_function (callable): The in-place solver used on a miss, returning a search.SolveResult or a bool.
+
+        Returns:
+            search.SolveResult: The result of the solver on a miss, a solved or unsolvable result without nodes on a hit.
+        """
+
+        key, transform = canonical_form(board)
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            solution = self._entries[key]
+            result = SolveResult(UNSOLVABLE if solution is None else SOLVED)
+        else:
+            self.misses += 1
+            copy = board.copy() if isinstance(board, BitBoard) else [row[:] for row in board]
+            result = solving_function(copy)
+            if not isinstance(result, SolveResult):
+                result = SolveResult(SOLVED if result else UNSOLVABLE)
+            if result.status not in (SOLVED, UNSOLVABLE):
+                return result
+            solution = bytes(to_canonical(copy, transform)) if result else None
+            self._entries[key] = solution
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        if solution is None:
+            return result
+
+        # Fill the board in place
+        for idx, num in enumerate(from_canonical(solution, transform)):
+            if isinstance(board, BitBoard):
+                if not board.cells[idx]:
+                    board.place(idx // 9, idx % 9, num)
+            else:
+                board[idx // 9][idx % 9] = num
+        return result
@@ -0,0 +1,499 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Persistent puzzle corpus in a compact binary file, read through a memory map.
+
+The file is an 8 byte header followed by fixed size records, one per puzzle:
+
+    41 bytes  the 81 cells packed two per byte (high nibble first, 0 for empty)
+     1 byte   the number of clues
+     4 bytes  the difficulty score as a little endian float
+     8 bytes  a BLAKE2b hash of the solution, all zero if the puzzle has no known solution
+
+Records never move, so puzzle n is always at the same offset and can be read straight
+from the map without parsing the rest of the file, and appending never rewrites
+anything that is already on disk. A partial record at the end, left by an append that
+was interrupted, is cut off before the file is read or appended to.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+
+MAGIC = b"SDKC"
+VERSION = 1
+
+# Magic, version and record size
+HEADER = struct.Struct("<4sHH")
+# Packed cells, clue count, difficulty score and solution hash
+RECORD = struct.Struct("<41sBf8s")
+
+# Offsets of the fields inside a record
+CLUES_OFFSET = 41
+DIFFICULTY_OFFSET = 42
+HASH_OFFSET = 46
+
+# Hash stored for puzzles whose solution is unknown
+UNKNOWN_HASH = bytes(8)
+
+# A packed byte written in hex is its two cell values as digits, so packing and unpacking
+# go through bytes.hex, bytes.fromhex and these translation tables instead of a Python loop
+_TO_ASCII = bytes.maketrans(bytes(range(10)), b"0123456789")
+_FROM_ASCII = bytes.maketrans(b"0123456789", bytes(range(10)))
+
+
+def pack_cells(cells):
+    """
+    Packs 81 cell values two per byte.
+
+    Args:
+        cells (Sequence[int]): The 81 cell values in row-major order.
+
+    Returns:
+        bytes: The 41 packed bytes, the low nibble of the last one is unused.
+    """
+
+    return bytes.fromhex((bytes(cells) + b"\0").translate(_TO_ASCII).decode())
+
+
+def unpack_cells(data):
+    """
+    Unpacks the 81 cell values of a packed puzzle.
+
+    Args:
+        data (bytes|memoryview): The 41 packed bytes.
+
+    Returns:
+        list[int]: The 81 cell values in row-major order.
+    """
+
+    return list(data.hex()[:81].encode().translate(_FROM_ASCII))
+
+
+def solution_hash(cells):
+    """
+    Hashes a solution so puzzles can be grouped or checked by their solution without storing it.
+
+    Args:
+        cells (Sequence[int]): The 81 cell values of the solution in row-major order.
+
+    Returns:
+        bytes: An 8 byte BLAKE2b digest.
+    """
+
+    return hashlib.blake2b(bytes(cells), digest_size=8).digest()
+
+
+def _trim(corpus):
+    # Cuts a partial record off the end of a corpus file opened for writing, returns the number of whole records
+    size = os.fstat(corpus.fileno()).st_size
+    if size < HEADER.size:
+        raise ValueError(f"{corpus.name} is shorter than a corpus header ({size} of {HEADER.size} bytes)")
+    count, partial = divmod(size - HEADER.size, RECORD.size)
+    if partial:
+        corpus.truncate(HEADER.size + count * RECORD.size)
+    return count
+
+
+def parse_line(line):
+    """
+    Parses a puzzle in the common 81 character format, '0' or '.' for empty cells.
+
+    Args:
+        line (str): The puzzle line, surrounding whitespace is ignored.
+
+    Returns:
+        list[list[int]]: A 9x9 sudoku board represented as a list of lists of integers.
+
+    Raises:
+        ValueError: If the line does not hold exactly 81 cells.
+    """
+
+    line = line.strip()
+    if len(line) != 81:
+        raise ValueError(f"A puzzle line needs 81 cells, got {len(line)}")
+    values = [0 if ch in ".0" else int(ch) for ch in line]
+    return [values[i * 9:i * 9 + 9] for i in range(9)]
+
+
+def format_line(board):
+    """
+    Formats a board in the 81 character format, '0' for empty cells.
+
+    Args:
+        board (list[list[int]]): A 9x9 sudoku board represented as a list of lists of integers.
+
+    Returns:
+        str: The 81 cell values in row-major order.
+    """
+
+    return "".join(str(num) for row in board for num in row)
+
+
+class PuzzleCorpus:
+    def __init__(self, path):
+        """
+        Opens a corpus file, creating it if it does not exist. A partial record at the end of the file
+        is cut off, so every later read and append stays aligned on whole records.
+
+        Args:
+            path (str): The path of the corpus file.
+
+        Attributes:
+            path (str): The path of the corpus file.
+
+        Raises:
+            ValueError: If the file is shorter than a corpus header or is not a corpus file of this version.
+        """
+
+        self.path = path
+        self._file = None
+        self._map = None
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, "wb") as corpus:
+                corpus.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < HEADER.size:
+            self._file.close()
+            raise ValueError(f"{path} is shorter than a corpus header ({size} of {HEADER.size} bytes)")
+        magic, version, record_size = HEADER.unpack(self._file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self._file.close()
+            raise ValueError(f"{path} is not a version {VERSION} puzzle corpus")
+        if (size - HEADER.size) % RECORD.size:
+            with open(path, "r+b") as corpus:
+                _trim(corpus)
+        self._remap()
+
+    def _remap(self):
+        # Maps the whole file read-only, an empty corpus has nothing to map
+        self._release()
+        size = os.fstat(self._file.fileno()).st_size
+        self._count = (size - HEADER.size) // RECORD.size
+        if self._count:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _release(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Views handed out by raw or as_array still use the old map, it is freed with them
+                pass
+            self._map = None
+
+    def close(self):
+        self._release()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _offset(self, n):
+        if n < 0:
+            n += self._count
+        if not 0 <= n < self._count:
+            raise IndexError("puzzle index out of range")
+        return HEADER.size + n * RECORD.size
+
+    def raw(self, n):
+        """
+        Returns the record of a puzzle without copying it.
+
+        Args:
+            n (int): The index of the puzzle.
+
+        Returns:
+            memoryview: The RECORD.size bytes of the record, straight from the memory map.
+        """
+
+        offset = self._offset(n)
+        return memoryview(self._map)[offset:offset + RECORD.size]
+
+    def cells(self, n):
+        """
+        Returns the 81 cell values of a puzzle in row-major order.
+        """
+
+        offset = self._offset(n)
+        return unpack_cells(self._map[offset:offset + CLUES_OFFSET])
+
+    def board(self, n):
+        """
+        Returns a puzzle as a list based board.
+
+        Args:
+            n (int): The index of the puzzle.
+
+        Returns:
+            list[list[int]]: A 9x9 sudoku board represented as a list of lists of integers.
+        """
+
+        cells = self.cells(n)
+        return [cells[i * 9:i * 9 + 9] for i in range(9)]
+
+    def __getitem__(self, n):
+        return self.board(n)
+
+    def __iter__(self):
+        for n in range(self._count):
+            yield self.board(n)
+
+    def metadata(self, n):
+        """
+        Returns the metadata of a puzzle.
+
+        Args:
+            n (int): The index of the puzzle.
+
+        Returns:
+            tuple[int, float, bytes]: The clue count, the difficulty score and the solution hash.
+        """
+
+        packed, clues, difficulty, digest = RECORD.unpack_from(self._map, self._offset(n))
+        return clues, difficulty, digest
+
+    def clue_counts(self):
+        """
+        Returns the clue count of every puzzle, read as one strided slice of the map.
+
+        Returns:
+            bytes: The clue count of puzzle n at index n.
+        """
+
+        if not self._count:
+            return b""
+        return self._map[HEADER.size + CLUES_OFFSET::RECORD.size]
+
+    def indices(self, clues=None, min_difficulty=None, max_difficulty=None):
+        """
+        Finds the puzzles with a clue count and difficulty score.
+
+        Args:
+            clues (int|None): The clue count to keep, None for any.
+            min_difficulty (float|None): The lowest difficulty score to keep, None for no lower bound.
+            max_difficulty (float|None): The highest difficulty score to keep, None for no upper bound.
+
+        Returns:
+            list[int]: The indices of the matching puzzles, in file order.
+        """
+
+        if clues is None:
+            found = range(self._count)
+        else:
+            counts = self.clue_counts()
+            found = []
+            start = counts.find(clues)
+            while start != -1:
+                found.append(start)
+                start = counts.find(clues, start + 1)
+
+        if min_difficulty is None and max_difficulty is None:
+            return list(found)
+
+        low = float("-inf") if min_difficulty is None else min_difficulty
+        high = float("inf") if max_difficulty is None else max_difficulty
+        unpack = struct.Struct("<f").unpack_from
+        return [n for n in found if low <= unpack(self._map, self._offset(n) + DIFFICULTY_OFFSET)[0] <= high]
+
+    def as_array(self):
+        """
+        Views the records as a NumPy structured array without copying them (requires NumPy).
+
+        Returns:
+            np.ndarray: One record per puzzle with the fields "cells" (41 packed bytes), "clues",
+            "difficulty" and "hash".
+        """
+
+        import numpy as np
+
+        dtype = np.dtype([("cells", "u1", (41,)), ("clues", "u1"), ("difficulty", "<f4"), ("hash", "S8")])
+        if not self._count:
+            return np.zeros(0, dtype=dtype)
+        return np.frombuffer(self._map, dtype=dtype, count=self._count, offset=HEADER.size)
+
+    def append_many(self, boards, solutions=None, difficulties=None, solve=True, rate=False):
+        """
+        Appends puzzles to the end of the corpus in one write.
+
+        Args:
+            boards (Iterable[list[list[int]]]): The puzzles to append.
+            solutions (Iterable[list[list[int]]]|None): The solution of each puzzle, used for the solution hash.
+            difficulties (Iterable[float]|None): The difficulty score of each puzzle, by default its number of
+                empty cells, the difficulty measure of evaluation.py.
+            rate (bool): Whether to store the rating.rate score of the puzzles that have no given difficulty instead
+                of their number of empty cells. Unsolvable puzzles get -1. For long streams, rating.rate_many
+                spread across processes can compute the difficulties beforehand.
+            solve (bool): Whether to solve the puzzles that have no given solution (with Dancing Links) to
+                hash their solution. If False, or if a puzzle has no solution, UNKNOWN_HASH is stored.
+
+        Returns:
+            int: The number of puzzles appended.
+        """
+
+        import dlx
+        from rating import rate as rate_board
+
+        solutions = iter(solutions) if solutions is not None else None
+        difficulties = iter(difficulties) if difficulties is not None else None
+
+        out = bytearray()
+        count = 0
+        for board in boards:
+            cells = [num for row in board for num in row]
+            clues = 81 - cells.count(0)
+
+            solution = next(solutions) if solutions is not None else None
+            if solution is not None:
+                digest = solution_hash([num for row in solution for num in row])
+            elif solve:
+                search = dlx.solutions(board)
+                found = next(search, None)
+                search.close()
+                digest = UNKNOWN_HASH if found is None else solution_hash(found)
+            else:
+                digest = UNKNOWN_HASH
+
+            if difficulties is not None:
+                difficulty = next(difficulties)
+            elif rate:
+                score = rate_board(board).score
+                difficulty = -1.0 if score is None else score
+            else:
+                difficulty = 81 - clues
+            out += RECORD.pack(pack_cells(cells), clues, difficulty, digest)
+            count += 1
+
+        if count:
+            with open(self.path, "r+b") as corpus:
+                # Another writer may have left a partial record since the file was opened
+                corpus.seek(HEADER.size + _trim(corpus) * RECORD.size)
+                corpus.write(out)
+            self._remap()
+        return count
+
+    def import_text(self, lines, **kwargs):
+        """
+        Appends puzzles from 81 character lines, skipping blank lines and lines starting with '#'.
+
+        Args:
+            lines (Iterable[str]|str): The lines, or the path of a text file holding them.
+            **kwargs: Passed on to append_many.
+
+        Returns:
+            int: The number of puzzles appended.
+        """
+
+        if isinstance(lines, str):
+            with open(lines) as text:
+                return self.import_text(text, **kwargs)
+        boards = (parse_line(line) for line in lines if line.strip() and not line.startswith("#"))
+        return self.append_many(boards, **kwargs)
+
+    def export_text(self, path, indices=None):
+        """
+        Writes puzzles to a text file in the 81 character format, one per line.
+
+        Args:
+            path (str): The path of the text file.
+            indices (Iterable[int]|None): The puzzles to write, None for all of them.
+
+        Returns:
+            int: The number of puzzles written.
+        """
+
+        count = 0
+        with open(path, "w") as text:
+            for n in range(self._count) if indices is None else indices:
+                text.write("".join(map(str, self.cells(n))) + "\n")
+                count += 1
+        return count
+
+
+def build_corpus(path, removed_cells, num_puzzles, seed=481, unique=None, rate=False):
+    """
+    Appends seeded random puzzles to a corpus, with the solution hash of each one.
+
+    Args:
+        path (str): The path of the corpus file.
+        removed_cells (Iterable[int]): The numbers of removed cells to generate puzzles for.
+        num_puzzles (int): The number of puzzles per number of removed cells.
+        seed (int): The seed of the generator, so the same corpus can be built again.
+        unique (bool|None): Whether the puzzles must have exactly one solution, None for unique ones up to
+            sudokutools.MAX_UNIQUE_REMOVED removed cells.
+        rate (bool): Whether to store rating scores as the difficulty instead of the number of empty cells.
+
+    Returns:
+        PuzzleCorpus: The opened corpus.
+    """
+
+    import random
+    from sudokutools import generate_board, solve_DLX
+
+    rng = random.Random(seed)
+    corpus = PuzzleCorpus(path)
+    for removed in removed_cells:
+        boards = [generate_board(removed, unique=unique, seed=rng) for _ in range(num_puzzles)]
+        solutions = []
+        for board in boards:
+            solution = [row[:] for row in board]
+            solve_DLX(solution)
+            solutions.append(solution)
+        corpus.append_many(boards, solutions, rate=rate)
+    return corpus
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build, import and export puzzle corpus files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="append seeded random puzzles")
+    build.add_argument("corpus")
+    build.add_argument("--removed", type=int, nargs="+", default=[45, 50, 55])
+    build.add_argument("--count", type=int, default=100, help="puzzles per number of removed cells")
+    build.add_argument("--seed", type=int, default=481)
+    build.add_argument("--rate", action="store_true", help="store rating scores as the difficulty")
+
+    text_in = commands.add_parser("import", help="append puzzles from an 81 character text file")
+    text_in.add_argument("text")
+    text_in.add_argument("corpus")
+    text_in.add_argument("--rate", action="store_true", help="store rating scores as the difficulty")
+
+    text_out = commands.add_parser("export", help="write the puzzles to an 81 character text file")
+    text_out.add_argument("corpus")
+    text_out.add_argument("text")
+
+    info = commands.add_parser("info", help="show the number of puzzles per clue count")
+    info.add_argument("corpus")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        with build_corpus(args.corpus, args.removed, args.count, args.seed, rate=args.rate) as corpus:
+            print(f"{args.corpus}: {len(corpus)} puzzles")
+    elif args.command == "import":
+        with PuzzleCorpus(args.corpus) as corpus:
+            print(f"Imported {corpus.import_text(args.text, rate=args.rate)} puzzles, {len(corpus)} in {args.corpus}")
+    elif args.command == "export":
+        with PuzzleCorpus(args.corpus) as corpus:
+            print(f"Exported {corpus.export_text(args.text)} puzzles to {args.text}")
+    else:
+        with PuzzleCorpus(args.corpus) as corpus:
+            counts = corpus.clue_counts()
+            print(f"{args.corpus}: {len(corpus)} puzzles")
+            for clues in sorted(set(counts)):
+                print(f"{clues:>3} clues: {counts.count(clues)}")
@@ -0,0 +1,270 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Exact cover solver for sudoku using Knuth's Dancing Links (Algorithm X).
+
+Sudoku is written as an exact cover problem with 729 rows (every number in every cell)
+and 324 columns (every cell, and every number in every row, column and box, must be
+covered exactly once). The linked matrix is stored in flat lists, built once per
+process and restored to its original state after every search, so later puzzles reuse
+it without paying the setup cost again.
+"""
+
+import threading
+from bitboard import BitBoard
+from search import BUDGET_EXCEEDED, LimitReached, check_limits
+
+# Number of constraint columns, the root header comes right after them
+NUM_COLUMNS = 324
+
+
+class DancingLinks:
+    def __init__(self):
+        """
+        Builds the sudoku cover matrix.
+
+        Attributes:
+            L, R, U, D (list[int]): Left, right, up and down links of every node.
+            C (list[int]): The column header of every node.
+            S (list[int]): The number of rows still linked in every column.
+            first (list[int]): The first node of each of the 729 rows.
+            row_of (list[int]): The matrix row of every node, row = cell index * 9 + number - 1.
+            root (int): The root header linking the uncovered columns.
+        """
+
+        self.root = root = NUM_COLUMNS
+        size = NUM_COLUMNS + 1 + 729 * 4
+        self.L = L = list(range(size))
+        self.R = R = list(range(size))
+        self.U = U = list(range(size))
+        self.D = D = list(range(size))
+        self.C = C = list(range(size))
+        self.S = S = [0] * (NUM_COLUMNS + 1)
+        self.first = []
+        self.row_of = [-1] * size
+
+        # Column headers in a circular list around the root
+        for col in range(NUM_COLUMNS + 1):
+            L[col] = col - 1 if col else root
+            R[col] = col + 1 if col < root else 0
+
+        node = NUM_COLUMNS + 1
+        for idx in range(81):
+            i, j = idx // 9, idx % 9
+            box = (i // 3) * 3 + j // 3
+            for d in range(9):
+                columns = (idx, 81 + i * 9 + d, 162 + j * 9 + d, 243 + box * 9 + d)
+                self.first.append(node)
+                for k, col in enumerate(columns):
+                    n = node + k
+                    # Link into the bottom of the column
+                    C[n] = col
+                    U[n] = U[col]
+                    D[n] = col
+                    D[U[col]] = n
+                    U[col] = n
+                    S[col] += 1
+                    # Link into the row
+                    L[n] = node + (k - 1) % 4
+                    R[n] = node + (k + 1) % 4
+                    self.row_of[n] = idx * 9 + d
+                node += 4
+
+        self.lock = threading.Lock()
+
+    def cover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        L[R[c]] = L[c]
+        R[L[c]] = R[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                U[D[j]] = U[j]
+                D[U[j]] = D[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                U[D[j]] = j
+                D[U[j]] = j
+                j = L[j]
+            i = U[i]
+        L[R[c]] = c
+        R[L[c]] = c
+
+    def select(self, i):
+        # Covers the other columns of a row whose own column is already covered
+        R, C = self.R, self.C
+        j = R[i]
+        while j != i:
+            self.cover(C[j])
+            j = R[j]
+
+    def deselect(self, i):
+        # Undoes select, in reverse order
+        L, C = self.L, self.C
+        j = L[i]
+        while j != i:
+            self.uncover(C[j])
+            j = L[j]
+
+    def solutions(self, board, deadline=None, max_nodes=None, cancel=None, stats=None):
+        """
+        Yields every solution of a board, restoring the matrix when the generator finishes or is closed.
+
+        Args:
+            board (list[list[int]]|BitBoard): A 9x9 sudoku board.
+            deadline (float|None): A time.perf_counter() value after which the search gives up.
+            max_nodes (int|None): The number of rows the search may select, None for no limit.
+            cancel (search.CancelToken|None): A token that stops the search once cancelled.
+            stats (instrumentation.SearchStats|None): Counters the rows selected by branching are added to as
+                nodes when the generator finishes or is closed. The givens are not counted.
+
+        Yields:
+            list[int]: The 81 cell values of a solution in row-major order.
+
+        Raises:
+            search.LimitReached: If the deadline passes, the node budget runs out or the token is cancelled
+                before the search is finished.
+        """
+
+        cells = board.cells[:] if isinstance(board, BitBoard) else [board[i][j] for i in range(9) for j in range(9)]
+
+        # Givens that clash with each other would cover a column twice
+        check = BitBoard()
+        for idx, num in enumerate(cells):
+            if num:
+                if not check.valid((idx // 9, idx % 9), num):
+                    return
+                check.place(idx // 9, idx % 9, num)
+
+        R, D, C, S = self.R, self.D, self.C, self.S
+        root = self.root
+        givens = []
+        stack = []
+        steps = 0
+        nodes = 0
+        checked = deadline is not None or cancel is not None
+        try:
+            # Givens are chosen rows before the search starts
+            for idx, num in enumerate(cells):
+                if num:
+                    i = self.first[idx * 9 + num - 1]
+                    self.cover(C[i])
+                    self.select(i)
+                    givens.append(i)
+
+            while True:
+                if checked and not steps & 1023:
+                    status = check_limits(deadline, cancel)
+                    if status is not None:
+                        raise LimitReached(status)
+                steps += 1
+
+                if R[root] == root:
+                    # Every column is covered
+                    solution = cells[:]
+                    for i in stack:
+                        row = self.row_of[i]
+                        solution[row // 9] = row % 9 + 1
+                    yield solution
+                else:
+                    # Branch on the column with the fewest rows
+                    c = R[root]
+                    best, size = c, S[c]
+                    while c != root and size > 1:
+                        if S[c] < size:
+                            best, size = c, S[c]
+                        c = R[c]
+                    if size:
+                        if nodes == max_nodes:
+                            raise LimitReached(BUDGET_EXCEEDED)
+                        nodes += 1
+                        self.cover(best)
+                        i = D[best]
+                        self.select(i)
+                        stack.append(i)
+                        continue
+
+                # Backtrack to the next row of the most recent column that has one
+                while stack:
+                    i = stack.pop()
+                    self.deselect(i)
+                    c = C[i]
+                    i = D[i]
+                    if i != c:
+                        if nodes == max_nodes:
+                            raise LimitReached(BUDGET_EXCEEDED)
+                        nodes += 1
+                        self.select(i)
+                        stack.append(i)
+                        break
+                    self.uncover(c)
+                else:
+                    return
+        finally:
+            if stats is not None:
+                stats.nodes += nodes
+            while stack:
+                i = stack.pop()
+                self.deselect(i)
+                self.uncover(C[i])
+            while givens:
+                i = givens.pop()
+                self.deselect(i)
+                self.uncover(C[i])
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def matrix():
+    """
+    Returns the cover matrix shared by this process, building it on first use.
+    """
+
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = DancingLinks()
+    return _shared
+
+
+def solutions(board, deadline=None, max_nodes=None, cancel=None, stats=None):
+    """
+    Yields the solutions of a board using the shared matrix, or a private one while the shared matrix is busy.
+
+    Args:
+        board (list[list[int]]|BitBoard): A 9x9 sudoku board.
+        deadline (float|None): A time.perf_counter() value after which the search gives up.
+        max_nodes (int|None): The number of rows the search may select, None for no limit.
+        cancel (search.CancelToken|None): A token that stops the search once cancelled.
+        stats (instrumentation.SearchStats|None): Counters the rows selected by branching are added to as nodes.
+
+    Yields:
+        list[int]: The 81 cell values of a solution in row-major order.
+
+    Raises:
+        search.LimitReached: If a limit stops the search before it is finished.
+    """
+
+    links = matrix()
+    if not links.lock.acquire(blocking=False):
+        # Another search (another thread or an unfinished generator) is using the shared matrix
+        links = DancingLinks()
+        links.lock.acquire()
+    try:
+        yield from links.solutions(board, deadline, max_nodes, cancel, stats)
+    finally:
+        links.lock.release()
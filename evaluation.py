@@ -1,9 +1,28 @@
-import copy
+import functools
+import gc
+import json
+import math
+import os
 import statistics
-import timeit
-from sudokutools import generate_board, solve, solve_A
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from corpus import PuzzleCorpus
+from instrumentation import SearchStats
+from rating import rate
+from sudokutools import generate_board, solve, solve_A, solve_DLX
 import typing
 
+# Solving functions that can be evaluated, with the label used in the results table
+# and whether the function takes a stats argument for the search counters
+ALGORITHMS = {
+    "backtracking": (solve, "Backtracking", True),
+    "astar": (solve_A, "A*", True),
+    "dlx": (solve_DLX, "DLX", False),
+}
+
+# Search counters added to every record, from one extra untimed instrumented solve
+STATS_FIELDS = ["nodes", "backtracks", "max_depth", "mean_branching", "updates"]
+
 ## Evaluation Parameters ##
 # Number of pieces removed from the board to create a puzzle, list of ints
 DIFFICULTY_RANGE = range(1, 65)  
@@ -11,162 +30,337 @@ DIFFICULTY_RANGE = range(1, 65)
 NUM_PUZZLES = 10 
 # Number for the best of n runs for each algorithm
 NUM_BEST_OF = 3  
+# Number of untimed warmup runs before the timed ones, the first of them also checks the result
+NUM_WARMUP = 1
+# Algorithms to compare, keys of ALGORITHMS
+SELECTED_ALGORITHMS = ["backtracking", "astar", "dlx"]
 
-def measure_solving_time(solving_function: typing.Callable, board: list[list], num_runs: int=NUM_BEST_OF):
-    # Create a copy of the board for verification
-    board_copy = copy.deepcopy(board)
-    
-    # First, check if the solver can solve the board
-    board_test = copy.deepcopy(board)
-    solved = solving_function(board_test)
-    
-    if not solved:
-        return board_copy, 0, False
-    
-    # Setup for timeit - need to create a copy each time since the board is modified
-    # during solving
-    def setup_timer():
-        return copy.deepcopy(board)
-    
-    # String used by timeit to run the solving function
-    timer_stmt = f"""
-board = _setup_timer()
-{solving_function.__name__}(board)
-"""
-    
+## Sweep Parameters ##
+# File every (difficulty, puzzle, algorithm) result is appended to as soon as it is measured
+RESULTS_FILE = "evaluation_results.jsonl"
+# Number of worker processes, None for one per core
+NUM_WORKERS = None
+# Seed for the puzzles, so a resumed sweep measures the same puzzles it started with
+SEED = 481
+# Whether to collect the search counters of the algorithms that support them
+COLLECT_STATS = True
+# Puzzle corpus file (see corpus.py) to read the puzzles from instead of generating them, None to generate
+CORPUS_FILE = None
+# Limits of every single solve, so one pathological puzzle cannot stall the evaluation, None for no limit
+SOLVE_TIMEOUT = None
+NODE_BUDGET = None
+
+def percentile(sorted_values: list[float], fraction: float):
+    # Nearest-rank percentile of an already sorted list
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def time_solver(solving_function: typing.Callable, board: list[list], repeat: int=NUM_BEST_OF, warmup: int=NUM_WARMUP,
+                timeout: typing.Optional[float]=SOLVE_TIMEOUT, max_nodes: typing.Optional[int]=NODE_BUDGET):
+    # Times warmup + repeat solves of the board with perf_counter_ns. Every run gets its own copy,
+    # built from a flat list of the cells before any timing starts, so copying is never timed.
+    # Whether the board is solvable comes from the runs themselves, there is no extra untimed solve.
+    # The limits are only passed on when set, so any (board) -> bool function can still be timed without them
+    runs = max(1, warmup + repeat)
+    cells = [num for row in board for num in row]
+    copies = [[cells[i * 9:i * 9 + 9] for i in range(9)] for _ in range(runs)]
+    timings = [0] * runs
+    clock = time.perf_counter_ns
+    limits = {} if max_nodes is None else {"max_nodes": max_nodes}
+
+    # Like timeit, keep the garbage collector from firing in the middle of a timed run
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    solved = True
     try:
-        # Create a timer with globals that include our setup function and solving function
-        timer = timeit.Timer(
-            stmt=timer_stmt, 
-            globals={
-                '_setup_timer': setup_timer, 
-                solving_function.__name__: solving_function
-            }
-        )
-        
-        # Run the timer multiple times and take the best result, to prevent outliers
-        times: list[float] = timer.repeat(repeat=num_runs, number=1)
-        best_time: float = min(times)
-        
-        # Return solved board, the best time in seconds, and whether the board was solved
-        return board_copy, best_time, True
+        for run in range(runs):
+            target = copies[run]
+            if timeout is not None:
+                limits["deadline"] = time.perf_counter() + timeout
+            start = clock()
+            result = solving_function(target, **limits)
+            timings[run] = clock() - start
+            if not result:
+                solved = False
+                break
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    if not solved:
+        # Unsolvable, or stopped by a limit (timeout, budget_exceeded) for solvers that return a status
+        status = getattr(result, "status", "unsolvable")
+        return {"solved": False, "status": status, "runs": 0, "min": 0.0, "median": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "variance": 0.0}
+
+    # Warmup runs are only used to check the result and warm up caches
+    timed = timings[runs - repeat:] if repeat > 0 else timings
+    times = sorted(ns / 1e9 for ns in timed)
+    return {
+        "solved": True,
+        "status": "solved",
+        "runs": len(times),
+        "min": times[0],
+        "median": statistics.median(times),
+        "p95": percentile(times, 0.95),
+        "p99": percentile(times, 0.99),
+        "mean": statistics.mean(times),
+        "variance": statistics.variance(times) if len(times) > 1 else 0.0,
+    }
+
+def measure_solving_time(solving_function: typing.Callable, board: list[list], num_runs: int=NUM_BEST_OF):
+    # Takes the best of num_runs timed solves, to prevent outliers
+    timing = time_solver(solving_function, board, repeat=num_runs)
     
-    except Exception as e:
-        print(f"Error during timing: {e}")
-        return board_copy, 0, False
-
-def compare_algorithms(num_puzzles: int, removed_cells: int):
-    backtracking_times = []
-    astar_times = []
-    backtracking_success = 0
-    astar_success = 0
+    # Return the board, the best time in seconds, and whether the board was solved
+    return board, timing["min"], timing["solved"]
+
+def search_stats(name: str, board: list[list]):
+    # Counts the search of one instrumented solve, done apart from the timed runs so the counting
+    # never slows them down. None for algorithms without counters or when COLLECT_STATS is off
+    solving_function, label, instrumented = ALGORITHMS[name]
+    if not (COLLECT_STATS and instrumented):
+        return None
+    stats = SearchStats()
+    limits = {} if NODE_BUDGET is None else {"max_nodes": NODE_BUDGET}
+    if SOLVE_TIMEOUT is not None:
+        limits["deadline"] = time.perf_counter() + SOLVE_TIMEOUT
+    solving_function([row[:] for row in board], stats=stats, **limits)
+    counters = stats.as_dict()
+    return {field: counters[field] for field in STATS_FIELDS}
+
+def corpus_boards(corpus: PuzzleCorpus, removed_cells: int, num_puzzles: int):
+    # The first num_puzzles puzzles of the corpus with removed_cells empty cells, fewer if the corpus runs out
+    return [corpus.board(n) for n in corpus.indices(clues=81 - removed_cells)[:num_puzzles]]
+
+def compare_algorithms(num_puzzles: int, removed_cells: int, algorithms: list[str]=SELECTED_ALGORITHMS,
+                       corpus: typing.Optional[PuzzleCorpus]=None):
+    # With a corpus every algorithm and every run is measured on the same stored puzzles
+    times = {name: [] for name in algorithms}
+    success = {name: 0 for name in algorithms}
+    counters = {name: [] for name in algorithms}
+
+    if corpus is not None:
+        boards = corpus_boards(corpus, removed_cells, num_puzzles)
+    else:
+        boards = (generate_board(removed_cells) for i in range(num_puzzles))
     
-    for i in range(num_puzzles):
-        board = generate_board(removed_cells)
-        
-        # Test backtracking algorithm
-        bt_board, bt_time, bt_solved = measure_solving_time(solve, copy.deepcopy(board))
-        if bt_solved:
-            backtracking_success += 1
-            backtracking_times.append(bt_time)
-            
-        # Test A* algorithm
-        astar_board, astar_time, astar_solved = measure_solving_time(solve_A, copy.deepcopy(board))
-        if astar_solved:
-            astar_success += 1
-            astar_times.append(astar_time)
+    for board in boards:
+        # Test every selected algorithm on the same puzzle
+        for name in algorithms:
+            solving_function = ALGORITHMS[name][0]
+            solved_board, solve_time, solved = measure_solving_time(solving_function, board)
+            if solved:
+                success[name] += 1
+                times[name].append(solve_time)
+            counted = search_stats(name, board)
+            if counted is not None:
+                counters[name].append(counted)
     
     # Calculate statistics
+    stats = {name: algorithm_stats(times[name], success[name], num_puzzles, counters[name]) for name in algorithms}
+    
+    return stats
+
+def algorithm_stats(times: list[float], success: int, num_puzzles: int, counters: list[dict]=()):
     # Most of these are unused for our analysis, but could be helpful if we come back to this project
     stats = {
-        "backtracking": {
-            "success_rate": backtracking_success / num_puzzles,
-            "avg_time": statistics.mean(backtracking_times) if backtracking_times else None,
-            "min_time": min(backtracking_times) if backtracking_times else None,
-            "max_time": max(backtracking_times) if backtracking_times else None,
-            "median_time": statistics.median(backtracking_times) if backtracking_times else None
-        },
-        "astar": {
-            "success_rate": astar_success / num_puzzles,
-            "avg_time": statistics.mean(astar_times) if astar_times else None,
-            "min_time": min(astar_times) if astar_times else None,
-            "max_time": max(astar_times) if astar_times else None,
-            "median_time": statistics.median(astar_times) if astar_times else None
-        }
+        "success_rate": success / num_puzzles,
+        "avg_time": statistics.mean(times) if times else None,
+        "min_time": min(times) if times else None,
+        "max_time": max(times) if times else None,
+        "median_time": statistics.median(times) if times else None,
+        "p95_time": percentile(sorted(times), 0.95) if times else None,
+        "p99_time": percentile(sorted(times), 0.99) if times else None,
+        "variance": statistics.variance(times) if len(times) > 1 else None
     }
-    
+
+    # The search counters averaged per puzzle (avg_nodes, avg_backtracks, ...), None when there are none
+    for field in STATS_FIELDS:
+        values = [counted[field] for counted in counters if counted.get(field) is not None]
+        stats["avg_" + field] = statistics.mean(values) if values else None
     return stats
 
+def puzzle_seed(difficulty: int, puzzle: int, seed: int=SEED):
+    # Every puzzle of a sweep gets its own seed, so it can be regenerated by any worker
+    return seed * 1_000_000 + difficulty * 1_000 + puzzle
+
+@functools.lru_cache(maxsize=16)
+def sweep_puzzle(difficulty: int, puzzle: int, seed: int=SEED):
+    # Generates and rates one puzzle of the sweep. Cached, so a worker timing several algorithms on it only builds it once
+    board = generate_board(difficulty, seed=puzzle_seed(difficulty, puzzle, seed))
+    return board, rate(board)
+
+def evaluate_puzzle(difficulty: int, puzzle: int, name: str, seed: int=SEED,
+                    board: typing.Optional[list[list]]=None, corpus: typing.Optional[str]=None):
+    # Worker task: times one algorithm on one puzzle of the sweep, generated unless it was read from a corpus
+    # Rated with the puzzle, so results can be grouped by how hard the puzzle is and not only by its empty cells
+    if board is None:
+        board, rating = sweep_puzzle(difficulty, puzzle, seed)
+    else:
+        rating = rate(board)
+    timing = time_solver(ALGORITHMS[name][0], board)
+    return {
+        "seed": seed,
+        "corpus": corpus,
+        "difficulty": difficulty,
+        "puzzle": puzzle,
+        "rating": rating.score,
+        "band": rating.band,
+        "algorithm": name,
+        "solved": timing["solved"],
+        "status": timing["status"],
+        "time": timing["min"],
+        "median": timing["median"],
+        "p95": timing["p95"],
+        "p99": timing["p99"],
+        "variance": timing["variance"],
+        "stats": search_stats(name, board),
+    }
+
+def load_results(path: str=RESULTS_FILE):
+    # Reads the records streamed so far, a line cut off by a crash is skipped
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path) as results:
+        for line in results:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+def run_sweep(difficulties: typing.Iterable[int], num_puzzles: int, algorithms: list[str]=SELECTED_ALGORITHMS,
+              path: str=RESULTS_FILE, workers: typing.Optional[int]=NUM_WORKERS, seed: int=SEED,
+              corpus_file: typing.Optional[str]=CORPUS_FILE):
+    # Runs every (difficulty, puzzle, algorithm) of the sweep on a worker pool and appends each result to path
+    # as it completes. Results already in path are kept, so an interrupted sweep picks up where it stopped.
+    # With a corpus file the puzzles are read from it instead of generated, and only results of that corpus are resumed
+    difficulties = list(difficulties)
+    corpus_name = os.path.basename(corpus_file) if corpus_file else None
+    records = [record for record in load_results(path) if record.get("seed") == seed and record.get("corpus") == corpus_name]
+    done = {(record["difficulty"], record["puzzle"], record["algorithm"]) for record in records}
+
+    corpus = PuzzleCorpus(corpus_file) if corpus_file else None
+    tasks = []
+    total = 0
+    for difficulty in difficulties:
+        boards = corpus_boards(corpus, difficulty, num_puzzles) if corpus is not None else [None] * num_puzzles
+        if len(boards) < num_puzzles:
+            print(f"{corpus_file} only has {len(boards)}/{num_puzzles} puzzles with {difficulty} removed cells")
+        total += len(boards) * len(algorithms)
+        for puzzle, board in enumerate(boards):
+            for name in algorithms:
+                if (difficulty, puzzle, name) not in done:
+                    tasks.append((difficulty, puzzle, name, board))
+    if corpus is not None:
+        corpus.close()
+
+    finished = total - len(tasks)
+    if finished:
+        print(f"Resuming from {path}: {finished}/{total} results already measured")
+    if not tasks:
+        return records
+
+    # Start on a fresh line if the last run was cut off halfway through writing one
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, "rb") as results:
+            results.seek(-1, os.SEEK_END)
+            partial = results.read(1) != b"\n"
+    else:
+        partial = False
+
+    with open(path, "a") as results, ProcessPoolExecutor(max_workers=workers) as pool:
+        if partial:
+            results.write("\n")
+        # Tasks of one puzzle are submitted together, so a worker often gets several and generates the puzzle once
+        futures = [pool.submit(evaluate_puzzle, difficulty, puzzle, name, seed, board, corpus_name)
+                   for difficulty, puzzle, name, board in tasks]
+        for future in as_completed(futures):
+            record = future.result()
+            results.write(json.dumps(record) + "\n")
+            results.flush()
+            records.append(record)
+
+            # Show completion percentage
+            finished += 1
+            print(f"Progress: {finished}/{total} results ({finished / total * 100:.1f}% complete)")
+
+    return records
+
+def summarize(records: list[dict], difficulties: typing.Iterable[int], num_puzzles: int, algorithms: list[str]=SELECTED_ALGORITHMS):
+    # Builds the same statistics as compare_algorithms for every difficulty from the streamed records
+    difficulty_results = {}
+    for difficulty in difficulties:
+        stats = {}
+        for name in algorithms:
+            measured = [r for r in records if r["difficulty"] == difficulty and r["algorithm"] == name and r["puzzle"] < num_puzzles]
+            times = [r["time"] for r in measured if r["solved"]]
+            counters = [r["stats"] for r in measured if r.get("stats")]
+            stats[name] = algorithm_stats(times, len(times), num_puzzles, counters)
+        difficulty_results[str(difficulty)] = stats
+    return difficulty_results
+
 if __name__ == "__main__":
     # Testing Parameters
     difficulty_levels = DIFFICULTY_RANGE
     puzzles_per_level = NUM_PUZZLES
     
-    difficulty_results = {}
-    
     # Print total number of iterations
-    total_puzzles = len(difficulty_levels) * puzzles_per_level
     print(f"\nEvaluating {len(difficulty_levels)} difficulty levels with {puzzles_per_level} puzzles each")
+    print(f"Streaming results to {RESULTS_FILE}")
 
-    # Keep track of the current puzzle for progress tracking
-    current_puzzle = 0
-    
-    for difficulty in difficulty_levels:
-        print(f"Testing difficulty {difficulty} [{current_puzzle}/{total_puzzles}]")
-        stats = compare_algorithms(num_puzzles=puzzles_per_level, removed_cells=difficulty)
-        difficulty_results[str(difficulty)] = stats
-        
-        # Update progress counter
-        current_puzzle += puzzles_per_level
-        
-        # Show completion percentage
-        completion = (current_puzzle / total_puzzles) * 100
-        print(f"Progress: {completion:.1f}% complete")
+    # Measure every puzzle in parallel, then build the table from all results on disk
+    records = run_sweep(difficulty_levels, puzzles_per_level)
+    difficulty_results = summarize(records, difficulty_levels, puzzles_per_level)
     
     # Print summary of difficulty impact
+    algorithms = SELECTED_ALGORITHMS
+    width = 13 + 48 * len(algorithms) + 30
     print(f"\nDifficulty Impact Summary with {puzzles_per_level} iterations:")
-    print("-" * 97)
+    print("-" * width)
     
     # Create a formatted table header
-    print(f"{'Difficulty':<10} | {'Backtracking':<30} | {'A*':<30} | {'Comparison'}")
-    print(f"{'':10} | {'Time':<15}{'Success':<15} | {'Time':<15}{'Success':<15} | ")
-    print("-" * 97)
+    header = f"{'Difficulty':<10} | "
+    subheader = f"{'':10} | "
+    for name in algorithms:
+        header += f"{ALGORITHMS[name][1]:<45} | "
+        subheader += f"{'Time':<15}{'Success':<15}{'Nodes':<15} | "
+    print(header + "Comparison")
+    print(subheader)
+    print("-" * width)
     
     # Make sure all difficulty levels are shown in order
     for difficulty in difficulty_levels:
         diff_str = str(difficulty)
         stats = difficulty_results[diff_str]
         
-        # Format Backtracking results
-        bt_time = stats['backtracking']['avg_time']
-        bt_success = stats['backtracking']['success_rate'] * 100  # Convert to percentage
-        bt_time_str = f"{bt_time:.5f}s" if bt_time is not None else "N/A"
-        bt_success_str = f"{bt_success:.1f}%" if bt_success > 0 else "0.0%"
-        
-        # Format A* results
-        astar_time = stats['astar']['avg_time']
-        astar_success = stats['astar']['success_rate'] * 100  # Convert to percentage
-        astar_time_str = f"{astar_time:.5f}s" if astar_time is not None else "N/A"
-        astar_success_str = f"{astar_success:.1f}%" if astar_success > 0 else "0.0%"
+        row = f"{difficulty:<10} | "
+        for name in algorithms:
+            # Format the results of each algorithm
+            avg_time = stats[name]['avg_time']
+            success = stats[name]['success_rate'] * 100  # Convert to percentage
+            time_str = f"{avg_time:.5f}s" if avg_time is not None else "N/A"
+            success_str = f"{success:.1f}%" if success > 0 else "0.0%"
+            avg_nodes = stats[name]['avg_nodes']
+            nodes_str = f"{avg_nodes:.1f}" if avg_nodes is not None else "N/A"
+            row += f"{time_str:<15}{success_str:<15}{nodes_str:<15} | "
     
-        # Calculate the difference in time for comparing both algorithms
-        if bt_time is not None and astar_time is not None:
+        # Compare the fastest algorithm against the next fastest one
+        timed = sorted((stats[name]['avg_time'], ALGORITHMS[name][1]) for name in algorithms if stats[name]['avg_time'] is not None)
+        if len(timed) >= 2:
+            (fast_time, fast_label), (slow_time, slow_label) = timed[0], timed[1]
 
             # Use a small epsilon to avoid division by zero errors
             # Calculate the speedup factor for comparison column
             epsilon = 1e-10
-            if abs(astar_time) < epsilon:
-                comparison = f"BT is much slower (A* took ~0s)"
-            elif abs(bt_time) < epsilon:
-                comparison = f"A* is much slower (BT took ~0s)"
+            if abs(fast_time) < epsilon:
+                comparison = f"{slow_label} is much slower ({fast_label} took ~0s)"
             else:
-                speedup = bt_time / astar_time
-                if speedup > 1:
-                    comparison = f"A* is {speedup:.2f}x faster"
-                else:
-                    comparison = f"BT is {1/speedup:.2f}x faster"
+                speedup = slow_time / fast_time
+                comparison = f"{fast_label} is {speedup:.2f}x faster than {slow_label}"
         else:
             comparison = "N/A"
             
         # Print each row of the table
-        print(f"{difficulty:<10} | {bt_time_str:<15}{bt_success_str:<15} | {astar_time_str:<15}{astar_success_str:<15} | {comparison}")
\ No newline at end of file
+        print(row + comparison)
@@ -0,0 +1,515 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Sudoku boards and solver of any size: a grid of N x N cells with boxes of k x k cells, N = k * k.
+
+bitboard.py and the solvers built on it are tuned for 9x9 boards, with lookup tables
+indexed by 9-bit masks. Here the occupancy and candidate masks are plain Python ints of
+N bits, so a 16x16 or 25x25 board works the same way, and the cell, row, column, box and
+peer tables are built once per box size.
+
+Naive backtracking is hopeless past 9x9, so GridSearch always branches on a cell with the
+fewest candidates and propagates naked and hidden singles after every placement, undoing
+everything through a trail as it backtracks.
+"""
+
+import math
+import time
+from functools import lru_cache
+from search import BUDGET_EXCEEDED, SOLVED, UNSOLVABLE, LimitReached, Search, SolveResult
+from sudokutools import _rng
+
+# Placements after which a uniqueness check of generate_grid gives up and keeps the cell
+UNIQUE_CHECK_NODES = 5000
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python before 3.10
+    def popcount(mask):
+        return bin(mask).count("1")
+
+
+class Geometry:
+    __slots__ = ("box", "size", "cells", "all_digits", "row_of", "col_of", "box_of", "peers", "units")
+
+    def __init__(self, box):
+        """
+        Initializes the lookup tables of a grid with boxes of box x box cells.
+
+        Attributes:
+            box (int): The width of a box, k.
+            size (int): The width of the grid and the largest number, N = k * k.
+            cells (int): The number of cells, N * N.
+            all_digits (int): The mask with all N candidate bits set.
+            row_of, col_of, box_of (tuple[int, ...]): The row, column and box of every flat cell index.
+            peers (tuple[tuple[int, ...], ...]): The cells sharing a row, column or box with every cell.
+            units (tuple[tuple[int, ...], ...]): The cells of every row, column and box.
+        """
+
+        size = box * box
+        self.box = box
+        self.size = size
+        self.cells = size * size
+        self.all_digits = (1 << size) - 1
+        self.row_of = tuple(idx // size for idx in range(self.cells))
+        self.col_of = tuple(idx % size for idx in range(self.cells))
+        self.box_of = tuple((idx // (size * box)) * box + (idx % size) // box for idx in range(self.cells))
+
+        rows = [tuple(range(i * size, i * size + size)) for i in range(size)]
+        cols = [tuple(range(j, self.cells, size)) for j in range(size)]
+        boxes = [tuple(idx for idx in range(self.cells) if self.box_of[idx] == b) for b in range(size)]
+        self.units = tuple(rows + cols + boxes)
+        self.peers = tuple(
+            tuple(sorted(set(rows[self.row_of[idx]] + cols[self.col_of[idx]] + boxes[self.box_of[idx]]) - {idx}))
+            for idx in range(self.cells)
+        )
+
+
+@lru_cache(maxsize=None)
+def geometry(box):
+    """
+    Returns the shared Geometry of a box size, built on first use.
+    """
+
+    return Geometry(box)
+
+
+def box_size(size):
+    """
+    Returns the box width k of a grid of width size = k * k.
+
+    Raises:
+        ValueError: If size is not a square number larger than 1.
+    """
+
+    box = math.isqrt(size)
+    if box < 2 or box * box != size:
+        raise ValueError(f"A grid of width {size} has no square boxes, expected 4, 9, 16, 25, ...")
+    return box
+
+
+class GridBoard:
+    __slots__ = ("geometry", "cells", "rows", "cols", "boxes")
+
+    def __init__(self, board=None, box=3):
+        """
+        Initializes a GridBoard, optionally from a list based board.
+
+        Args:
+            board (list[list[int]]|None): An N x N board represented as a list of lists of integers, 0 for empty cells.
+            box (int): The width of a box, only used for an empty board. A list based board sets it from its width.
+
+        Attributes:
+            geometry (Geometry): The lookup tables of the grid size.
+            cells (list[int]): The N * N cell values in row-major order, 0 for empty cells.
+            rows, cols, boxes (list[int]): The N-bit occupancy mask of each row, column and box.
+        """
+
+        if board is not None:
+            box = box_size(len(board))
+        geo = geometry(box)
+        self.geometry = geo
+        self.cells = [0] * geo.cells
+        self.rows = [0] * geo.size
+        self.cols = [0] * geo.size
+        self.boxes = [0] * geo.size
+
+        if board is not None:
+            for i in range(geo.size):
+                for j in range(geo.size):
+                    if board[i][j] != 0:
+                        self.place(i, j, board[i][j])
+
+    @property
+    def size(self):
+        return self.geometry.size
+
+    def place(self, i, j, num):
+        """
+        Places a number in an empty cell and marks it in the row, column and box masks.
+        """
+
+        geo = self.geometry
+        idx = i * geo.size + j
+        mask = 1 << (num - 1)
+        self.cells[idx] = num
+        self.rows[i] |= mask
+        self.cols[j] |= mask
+        self.boxes[geo.box_of[idx]] |= mask
+
+    def remove(self, i, j):
+        """
+        Clears a cell and frees its number in the row, column and box masks.
+
+        Returns:
+            int: The number that was removed, 0 if the cell was already empty.
+        """
+
+        geo = self.geometry
+        idx = i * geo.size + j
+        num = self.cells[idx]
+        if num:
+            mask = ~(1 << (num - 1))
+            self.cells[idx] = 0
+            self.rows[i] &= mask
+            self.cols[j] &= mask
+            self.boxes[geo.box_of[idx]] &= mask
+        return num
+
+    def get(self, i, j):
+        """
+        Returns the number in a cell, 0 if it is empty.
+        """
+
+        return self.cells[i * self.geometry.size + j]
+
+    def candidates(self, i, j):
+        """
+        Returns the N-bit mask of numbers that do not clash with the row, column or box of a cell.
+        """
+
+        geo = self.geometry
+        return geo.all_digits & ~(self.rows[i] | self.cols[j] | self.boxes[geo.box_of[i * geo.size + j]])
+
+    def valid(self, pos, num):
+        """
+        Checks whether a number is valid in a cell, with the same meaning as sudokutools.valid.
+        """
+
+        return bool(self.candidates(*pos) >> (num - 1) & 1)
+
+    def find_empty(self):
+        """
+        Returns the position of the first empty cell in row-major order, or None if the board is full.
+        """
+
+        try:
+            idx = self.cells.index(0)
+        except ValueError:
+            return None
+        return divmod(idx, self.geometry.size)
+
+    def copy(self):
+        """
+        Returns an independent copy of the board.
+        """
+
+        other = GridBoard.__new__(GridBoard)
+        other.geometry = self.geometry
+        other.cells = self.cells[:]
+        other.rows = self.rows[:]
+        other.cols = self.cols[:]
+        other.boxes = self.boxes[:]
+        return other
+
+    def to_list(self):
+        """
+        Returns the board as a new list of lists of integers.
+        """
+
+        size, cells = self.geometry.size, self.cells
+        return [cells[i * size:i * size + size] for i in range(size)]
+
+    def write_to(self, board):
+        """
+        Copies the cell values back into an existing list based board in place.
+        """
+
+        size, cells = self.geometry.size, self.cells
+        for i in range(size):
+            board[i][:] = cells[i * size:i * size + size]
+
+
+class GridSearch(Search):
+    """
+    MRV search with naked and hidden single propagation on a GridBoard.
+
+    The candidate masks live in a flat list next to buckets of the empty cells by candidate
+    count. Every change to them is recorded as (cell, old mask, placed), and the changes of a
+    branching placement and of everything it propagated are undone together. Only the units
+    whose candidates changed since the last hidden single pass are scanned again.
+    """
+
+    def __init__(self, board):
+        """
+        Initializes a search over a board of any size.
+
+        Args:
+            board (list[list[int]]|GridBoard): The board to solve. A GridBoard is solved in place, a list based
+                board is copied and only written back by write_to.
+        """
+
+        super().__init__(board if isinstance(board, GridBoard) else GridBoard(board))
+        geo = self.board.geometry
+        self.geometry = geo
+        cells = self.board.cells
+        self.cand = [0 if cells[idx] else self.board.candidates(geo.row_of[idx], geo.col_of[idx])
+                     for idx in range(geo.cells)]
+        self.counts = [-1] * geo.cells
+        self.buckets = [set() for _ in range(geo.size + 1)]
+        for idx in range(geo.cells):
+            if not cells[idx]:
+                self._move(idx, popcount(self.cand[idx]))
+        self.changes = []
+        self.marks = []
+        # Units to scan for hidden singles, as indices into geometry.units
+        self.dirty = set(range(len(geo.units)))
+
+        if not self.propagate():
+            self.solved = False
+
+    def _move(self, idx, count):
+        # Files a cell under its candidate count, -1 takes it out of the buckets once it is filled
+        old = self.counts[idx]
+        if old != count:
+            if old >= 0:
+                self.buckets[old].discard(idx)
+            self.counts[idx] = count
+            if count >= 0:
+                self.buckets[count].add(idx)
+
+    def assign(self, idx, num):
+        # Places a number and removes it from the candidates of the peers, False if a peer ran out of them
+        geo, cand, changes, dirty = self.geometry, self.cand, self.changes, self.dirty
+        size = geo.size
+        changes.append((idx, cand[idx], True))
+        self.board.place(geo.row_of[idx], geo.col_of[idx], num)
+        cand[idx] = 0
+        self._move(idx, -1)
+        # The other candidates of the cell are gone from its units too
+        dirty.add(geo.row_of[idx])
+        dirty.add(size + geo.col_of[idx])
+        dirty.add(2 * size + geo.box_of[idx])
+
+        ok = True
+        bit = 1 << (num - 1)
+        for peer in geo.peers[idx]:
+            old = cand[peer]
+            if old & bit:
+                changes.append((peer, old, False))
+                cand[peer] = new = old & ~bit
+                self._move(peer, popcount(new))
+                dirty.add(geo.row_of[peer])
+                dirty.add(size + geo.col_of[peer])
+                dirty.add(2 * size + geo.box_of[peer])
+                if not new:
+                    ok = False
+        return ok
+
+    def propagate(self):
+        """
+        Places naked singles, then hidden singles, until there are none left.
+
+        Returns:
+            bool: False if a cell or a number of some unit ran out of places.
+        """
+
+        geo, cand, buckets = self.geometry, self.cand, self.buckets
+        board = self.board
+        size, all_digits, units = geo.size, geo.all_digits, geo.units
+
+        while True:
+            if buckets[0]:
+                return False
+            if buckets[1]:
+                idx = next(iter(buckets[1]))
+                if not self.assign(idx, cand[idx].bit_length()):
+                    return False
+                continue
+            if not self.dirty:
+                return True
+
+            # No naked single left, place every number with a single place in the units that changed
+            scan, self.dirty = self.dirty, set()
+            for number in scan:
+                if number < size:
+                    placed = board.rows[number]
+                elif number < 2 * size:
+                    placed = board.cols[number - size]
+                else:
+                    placed = board.boxes[number - 2 * size]
+                once = twice = 0
+                for idx in units[number]:
+                    mask = cand[idx]
+                    twice |= once & mask
+                    once |= mask
+                if all_digits & ~(once | placed):
+                    return False
+                single = once & ~twice
+                while single:
+                    low = single & -single
+                    single ^= low
+                    for idx in units[number]:
+                        if cand[idx] & low:
+                            # An earlier single of the pass may have taken the place, the next pass finds that out
+                            if not self.assign(idx, low.bit_length()):
+                                return False
+                            break
+
+    def exclude(self, idx, num):
+        """
+        Removes a candidate from an empty cell and propagates, as if it was a branching placement.
+
+        Returns:
+            bool: False if the board has no solution without that number in that cell.
+        """
+
+        self.marks.append(len(self.changes))
+        old = self.cand[idx]
+        self.changes.append((idx, old, False))
+        self.cand[idx] = new = old & ~(1 << (num - 1))
+        self._move(idx, popcount(new))
+        geo = self.geometry
+        self.dirty.update((geo.row_of[idx], geo.size + geo.col_of[idx], 2 * geo.size + geo.box_of[idx]))
+        if not new or not self.propagate():
+            self.solved = False
+            return False
+        return True
+
+    def select(self):
+        for count, bucket in enumerate(self.buckets):
+            if bucket:
+                idx = min(bucket)
+                return [idx, self.cand[idx], 0]
+        return None
+
+    def place(self, idx, num):
+        # The board was at a fixpoint before this placement, units left over from a failed one are stale
+        self.dirty.clear()
+        self.marks.append(len(self.changes))
+        return self.assign(idx, num) and self.propagate()
+
+    def unplace(self, idx, num):
+        # Undoes the placement and everything propagated from it, newest first
+        geo, cand, changes = self.geometry, self.cand, self.changes
+        start = self.marks.pop()
+        while len(changes) > start:
+            cell, old, placed = changes.pop()
+            if placed:
+                self.board.remove(geo.row_of[cell], geo.col_of[cell])
+            cand[cell] = old
+            self._move(cell, popcount(old))
+
+
+def solve_grid(board, max_nodes=None, deadline=None, cancel=None):
+    """
+    Solves a board of any size in place.
+
+    Args:
+        board (list[list[int]]|GridBoard): An N x N board represented as a list of lists of integers or a GridBoard.
+        max_nodes (int|None): The number of branching placements the search may make, None for no limit.
+        deadline (float|None): A time.perf_counter() value after which the search gives up.
+        cancel (search.CancelToken|None): A token that stops the search once cancelled.
+
+    Returns:
+        search.SolveResult: The status, nodes and time of the search, true only if the board was solved.
+        A list based board is only changed when it is solved.
+    """
+
+    start = time.perf_counter()
+    search = GridSearch(board)
+    status = search.run_limited(max_nodes, deadline, cancel)
+    if status == SOLVED and not isinstance(board, GridBoard):
+        search.write_to(board)
+    return SolveResult(status, search.nodes, time.perf_counter() - start)
+
+
+def _shuffled(groups, rng):
+    # Shuffles the groups, then the items inside every group, and flattens them
+    groups = [group[:] for group in groups]
+    rng.shuffle(groups)
+    for group in groups:
+        rng.shuffle(group)
+    return [item for group in groups for item in group]
+
+
+def solved_grid(box=3, seed=None):
+    """
+    Returns a random solved board with boxes of box x box cells.
+
+    A pattern solution has its digits relabeled, its bands and stacks and the rows and
+    columns inside them shuffled, which keeps it valid, so no search is needed.
+
+    Args:
+        box (int): The width of a box.
+        seed (int|random.Random|None): Seed or random generator for reproducible boards, None for the random module.
+
+    Returns:
+        list[list[int]]: The solved N x N board.
+    """
+
+    rng = _rng(seed)
+    size = box * box
+    bands = [list(range(b * box, b * box + box)) for b in range(box)]
+    rows = _shuffled(bands, rng)
+    cols = _shuffled(bands, rng)
+    labels = list(range(1, size + 1))
+    rng.shuffle(labels)
+    return [[labels[(box * (r % box) + r // box + c) % size] for c in cols] for r in rows]
+
+
+def generate_grid(box=3, removed_cells=None, seed=None, unique=False, max_nodes=UNIQUE_CHECK_NODES, deadline=None):
+    """
+    Generates a random puzzle with boxes of box x box cells.
+
+    With unique=True a cell is only cleared if the puzzle keeps a single solution, which takes
+    a search per cleared cell, so it is off by default for the larger grids. A search that
+    needs more than max_nodes placements keeps its cell.
+
+    Args:
+        box (int): The width of a box, 4 for 16x16 and 5 for 25x25 puzzles.
+        removed_cells (int|None): The number of cells to clear, None for half of them.
+        seed (int|random.Random|None): Seed or random generator for reproducible boards, None for the random module.
+        unique (bool): Whether the puzzle must have exactly one solution.
+        max_nodes (int|None): The number of placements each uniqueness check may make, None for no limit.
+        deadline (float|None): A time.perf_counter() value after which generation gives up.
+
+    Returns:
+        list[list[int]]: An N x N board represented as a list of lists of integers.
+
+    Raises:
+        ValueError: If fewer than removed_cells cells could be cleared with a unique solution.
+        search.LimitReached: If the deadline passes before the puzzle is finished.
+    """
+
+    rng = _rng(seed)
+    board = solved_grid(box, rng)
+    size = box * box
+    if removed_cells is None:
+        removed_cells = size * size // 2
+
+    positions = [(row, col) for row in range(size) for col in range(size)]
+    rng.shuffle(positions)
+
+    if not unique:
+        for row, col in positions[:removed_cells]:
+            board[row][col] = 0
+        return board
+
+    gridboard = GridBoard(board)
+    removed = 0
+    for row, col in positions:
+        if removed == removed_cells:
+            break
+        num = board[row][col]
+        gridboard.remove(row, col)
+        search = GridSearch(gridboard.copy())
+        idx = row * size + col
+        if search.board.cells[idx] or not search.exclude(idx, num):
+            status = UNSOLVABLE
+        else:
+            status = search.run_limited(max_nodes, deadline)
+            if status not in (SOLVED, UNSOLVABLE, BUDGET_EXCEEDED):
+                raise LimitReached(status)
+        if status == UNSOLVABLE:
+            # Propagation forces num back into the cell, or no solution holds another number there.
+            # A check that runs out of nodes keeps the cell, so the puzzle stays unique
+            board[row][col] = 0
+            removed += 1
+        else:
+            gridboard.place(row, col, num)
+
+    if removed < removed_cells:
+        raise ValueError(f"Could only clear {removed} of {removed_cells} cells and keep a unique solution.")
+    return board
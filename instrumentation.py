@@ -0,0 +1,156 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Optional search instrumentation for solve and solve_A.
+
+The regular engines in search.py never check whether they are being measured. Passing a
+SearchStats to solve or solve_A runs the search with the instrumented engines below
+instead, so a solver without stats runs exactly the same code as before. Every engine
+counts into its own SearchStats, nothing is patched, so searches in other threads are
+never counted or slowed down.
+"""
+
+from bitboard import POPCOUNT
+from search import AStarSearch, BacktrackSearch, Search
+
+
+class SearchStats:
+    __slots__ = ("searches", "nodes", "backtracks", "max_depth", "branch_sizes", "updates")
+
+    def __init__(self):
+        """
+        Initializes empty counters. One SearchStats can collect several searches, the counts add up.
+
+        Attributes:
+            searches (int): The number of searches recorded.
+            nodes (int): The number of placements made by branching decisions.
+            backtracks (int): The number of placements taken back.
+            max_depth (int): The largest number of branching decisions on the stack at once.
+            branch_sizes (list[int]): For each candidate count 0-9, the number of branching decisions made on a
+                cell with that many candidates.
+            updates (int): The number of update_candidates calls of the A* engine, for its placements, removals
+                and the cells placed by propagation. The backtracking engine keeps no candidates and adds none.
+        """
+
+        self.searches = 0
+        self.nodes = 0
+        self.backtracks = 0
+        self.max_depth = 0
+        self.branch_sizes = [0] * 10
+        self.updates = 0
+
+    def branch(self, depth, size):
+        # Records a branching decision at depth on a cell with size candidates
+        self.branch_sizes[size] += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    @property
+    def branches(self):
+        return sum(self.branch_sizes)
+
+    @property
+    def mean_branching(self):
+        """
+        float|None: The average number of candidates of the cells branched on, None without branching decisions.
+        """
+
+        branches = self.branches
+        if not branches:
+            return None
+        return sum(size * count for size, count in enumerate(self.branch_sizes)) / branches
+
+    def merge(self, other):
+        """
+        Adds the counts of another SearchStats to this one.
+
+        Args:
+            other (SearchStats): The counters to add.
+        """
+
+        self.searches += other.searches
+        self.nodes += other.nodes
+        self.backtracks += other.backtracks
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.branch_sizes = [a + b for a, b in zip(self.branch_sizes, other.branch_sizes)]
+        self.updates += other.updates
+
+    def as_dict(self):
+        """
+        Returns the counters as a flat dict, ready to be stored next to timing results.
+
+        Returns:
+            dict[str, int|float|None]: The counters, with branch_sizes as a list and mean_branching added.
+        """
+
+        return {
+            "searches": self.searches,
+            "nodes": self.nodes,
+            "backtracks": self.backtracks,
+            "max_depth": self.max_depth,
+            "branch_sizes": self.branch_sizes[:],
+            "mean_branching": self.mean_branching,
+            "updates": self.updates,
+        }
+
+    def __repr__(self):
+        return (f"SearchStats(nodes={self.nodes}, backtracks={self.backtracks}, max_depth={self.max_depth}, "
+                f"mean_branching={self.mean_branching}, updates={self.updates})")
+
+
+class InstrumentedSearch:
+    """
+    Mixin counting the nodes, backtracks, depth and branching of an engine into a SearchStats.
+
+    The counting happens around select, place and unplace, so the search always goes
+    through the generic Search.run, even for engines that inline their own loop.
+    """
+
+    run = Search.run
+
+    def __init__(self, *args, stats=None, **kwargs):
+        self.stats = SearchStats() if stats is None else stats
+        self.stats.searches += 1
+        super().__init__(*args, **kwargs)
+
+    def select(self):
+        frame = super().select()
+        if frame is not None:
+            self.stats.branch(len(self.stack) + 1, POPCOUNT[frame[1]])
+        return frame
+
+    def place(self, idx, num):
+        self.stats.nodes += 1
+        return super().place(idx, num)
+
+    def unplace(self, idx, num):
+        self.stats.backtracks += 1
+        super().unplace(idx, num)
+
+
+class InstrumentedBacktrackSearch(InstrumentedSearch, BacktrackSearch):
+    pass
+
+
+class InstrumentedAStarSearch(InstrumentedSearch, AStarSearch):
+    """
+    Also counts the update_candidates calls of the engine: one per placement and removal,
+    and one per cell placed by propagation, before the search and after each placement.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.propagator is not None:
+            self.stats.updates += len(self.propagator.placed)
+
+    def place(self, idx, num):
+        ok = super().place(idx, num)
+        self.stats.updates += 1
+        if self.propagator is not None:
+            self.stats.updates += len(self.propagated[-1])
+        return ok
+
+    def unplace(self, idx, num):
+        self.stats.updates += 1
+        super().unplace(idx, num)
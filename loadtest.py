@@ -0,0 +1,148 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Load test for the solve server in server.py.
+
+Opens a number of keep-alive connections to the server, each sending requests one after
+the other from a seeded mix of endpoints, and reports the throughput, the latency
+percentiles per endpoint, the status codes and the /metrics of the server afterwards.
+
+    python loadtest.py --start --connections 32 --requests 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from server import HOST, PORT, _percentiles
+from sudokutools import generate_board
+
+## Load Test Parameters ##
+SEED = 481
+# Share of the requests sent to each endpoint
+MIX = {"solve": 0.6, "count": 0.2, "validate": 0.15, "generate": 0.05}
+# Number of distinct puzzles in rotation, with their numbers of removed cells
+NUM_PUZZLES = 50
+REMOVED_CELLS = (40, 50, 55)
+
+
+async def request(reader, writer, method, path, payload=None):
+    # Sends one request on a keep-alive connection, returns (status, JSON response)
+    body = b"" if payload is None else json.dumps(payload).encode()
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: {HOST}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+def make_payload(endpoint, rng, puzzles):
+    if endpoint == "generate":
+        return {"removed_cells": rng.choice(REMOVED_CELLS), "seed": rng.randrange(1 << 30)}
+    board = rng.choice(puzzles)
+    if endpoint == "solve":
+        return {"board": board, "algorithm": rng.choice(("astar", "dlx"))}
+    if endpoint == "count":
+        return {"board": board, "limit": 2}
+    return {"board": board}
+
+
+async def client(host, port, num_requests, rng, puzzles, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    endpoints, weights = list(MIX), list(MIX.values())
+    try:
+        for _ in range(num_requests):
+            endpoint = rng.choices(endpoints, weights)[0]
+            start = time.perf_counter()
+            status, response = await request(reader, writer, "POST", f"/{endpoint}", make_payload(endpoint, rng, puzzles))
+            latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+
+async def run(host, port, connections, num_requests, seed):
+    rng = random.Random(seed)
+    puzzles = [generate_board(rng.choice(REMOVED_CELLS), seed=rng) for _ in range(NUM_PUZZLES)]
+    latencies, statuses = {}, Counter()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(host, port, num_requests, random.Random(seed + n), puzzles, latencies, statuses)
+        for n in range(connections)
+    ))
+    seconds = time.perf_counter() - start
+
+    total = sum(statuses.values())
+    print(f"\n{total} requests over {connections} connections in {seconds:.2f}s ({total / seconds:.0f} requests/s)")
+    print("-" * 64)
+    print(f"{'Endpoint':<10} | {'Requests':>8} | {'p50':>10} | {'p95':>10} | {'p99':>10}")
+    print("-" * 64)
+    for endpoint, samples in sorted(latencies.items()):
+        p = _percentiles(samples)
+        print(f"{endpoint:<10} | {p['count']:>8} | {p['p50']:>8.2f}ms | {p['p95']:>8.2f}ms | {p['p99']:>8.2f}ms")
+    print(f"\nStatus codes: {', '.join(f'{status}: {count}' for status, count in sorted(statuses.items()))}")
+
+    reader, writer = await asyncio.open_connection(host, port)
+    status, metrics = await request(reader, writer, "GET", "/metrics")
+    writer.close()
+    print("\nServer metrics:")
+    print(json.dumps(metrics, indent=2))
+
+
+async def wait_until_up(host, port, timeout=30.0):
+    # Polls /health until a freshly started server answers
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            await request(reader, writer, "GET", "/health")
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the solve server.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=50, help="requests per connection")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--start", action="store_true", help="start a server for the test and stop it afterwards")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes of the started server")
+    args = parser.parse_args()
+
+    server = None
+    if args.start:
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+        command = [sys.executable, script, "--host", args.host, "--port", str(args.port)]
+        if args.workers is not None:
+            command += ["--workers", str(args.workers)]
+        server = subprocess.Popen(command)
+    try:
+        if server is not None:
+            asyncio.run(wait_until_up(args.host, args.port))
+        asyncio.run(run(args.host, args.port, args.connections, args.requests, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,258 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Constraint propagation run by the A* solver before and between branching decisions.
+
+A Propagator applies its rules in order until none of them changes anything. Every
+placement and candidate elimination goes through the search's Trail, so everything a
+propagation pass did is undone together with the branch that triggered it.
+"""
+
+from astar import update_candidates
+from bitboard import ALL_DIGITS, DIGITS, POPCOUNT
+
+
+def _units():
+    units = []
+    for k in range(9):
+        units.append((0, k, tuple((k, j) for j in range(9))))
+        units.append((1, k, tuple((i, k) for i in range(9))))
+        start_i, start_j = (k // 3) * 3, (k % 3) * 3
+        units.append((2, k, tuple((start_i + i, start_j + j) for i in range(3) for j in range(3))))
+    return tuple(units)
+
+
+def _segments():
+    # Every line is split in three segments of three cells, one per box it crosses
+    segments = []
+    for vertical in (False, True):
+        for k in range(9):
+            for s in range(3):
+                cells = tuple((s * 3 + n, k) if vertical else (k, s * 3 + n) for n in range(3))
+                line = tuple((n, k) if vertical else (k, n) for n in range(9))
+                start_i, start_j = cells[0][0] - cells[0][0] % 3, cells[0][1] - cells[0][1] % 3
+                box = tuple((start_i + i, start_j + j) for i in range(3) for j in range(3))
+                segments.append((cells, line, box))
+
+    def seg_id(vertical, k, s):
+        return (27 if vertical else 0) + k * 3 + s
+
+    table = []
+    for number, (cells, line, box) in enumerate(segments):
+        vertical, k, s = number >= 27, (number % 27) // 3, number % 3
+        band = k - k % 3
+        table.append((
+            cells,
+            tuple(cell for cell in line if cell not in cells),
+            tuple(cell for cell in box if cell not in cells),
+            # The other two segments of the same line, and the two parallel segments of the same box
+            tuple(seg_id(vertical, k, other) for other in range(3) if other != s),
+            tuple(seg_id(vertical, other, s) for other in range(band, band + 3) if other != k),
+        ))
+    return tuple(table)
+
+
+# The 27 rows, columns and boxes as (kind, unit number, cells), kind 0 for rows, 1 for columns and 2 for boxes
+UNITS = _units()
+
+# The 54 row and column segments as (cells, rest of the line, rest of the box,
+# other segments of the line, other segments of the box)
+SEGMENTS = _segments()
+
+
+def naked_singles(propagator, search):
+    """
+    Places every cell that has exactly one candidate left.
+
+    Returns:
+        int|None: The number of cells placed, or None if a cell without candidates was found.
+    """
+
+    cell_cand = search.cell_cand
+    if search.index.buckets[0]:
+        return None
+
+    placed = 0
+    for cell in list(search.index.buckets[1]):
+        mask = cell_cand.get(cell)
+        if mask is None:
+            continue
+        if not mask:
+            return None
+        propagator.assign(search, cell, DIGITS[mask][0])
+        placed += 1
+    return placed
+
+
+def hidden_singles(propagator, search):
+    """
+    Places a number in a cell when that cell is the only place left for it in a row, column or box.
+
+    Returns:
+        int|None: The number of cells placed, or None if a number has no place left in some unit.
+    """
+
+    occupancy = (search.board.rows, search.board.cols, search.board.boxes)
+    get = search.cell_cand.get
+    placed = 0
+
+    for kind, k, cells in UNITS:
+        # Numbers seen in at least one and in at least two cells of the unit
+        once = twice = 0
+        for cell in cells:
+            mask = get(cell, 0)
+            twice |= once & mask
+            once |= mask
+
+        if ALL_DIGITS & ~(once | occupancy[kind][k]):
+            return None
+
+        single = once & ~twice
+        if not single:
+            continue
+        for num in DIGITS[single]:
+            bit = 1 << (num - 1)
+            if occupancy[kind][k] & bit:
+                continue
+            for cell in cells:
+                if get(cell, 0) & bit:
+                    propagator.assign(search, cell, num)
+                    placed += 1
+                    break
+            else:
+                return None
+    return placed
+
+
+def box_line_reduction(propagator, search):
+    """
+    Pointing pairs and claiming: when a number in a box can only go in one row or column,
+    it is removed from the rest of that line, and when a number in a line can only go in
+    one box, it is removed from the rest of that box.
+
+    Stops after the first segment that eliminated something, so the cheaper rules run
+    again before the segment masks are rebuilt.
+
+    Returns:
+        int|None: The number of candidates eliminated, or None if a cell ran out of candidates.
+    """
+
+    cell_cand = search.cell_cand
+
+    # Candidates of each segment
+    masks = []
+    for cells, line_rest, box_rest, line_others, box_others in SEGMENTS:
+        mask = 0
+        for cell in cells:
+            mask |= cell_cand.get(cell, 0)
+        masks.append(mask)
+
+    for number, (cells, line_rest, box_rest, line_others, box_others) in enumerate(SEGMENTS):
+        mask = masks[number]
+        if not mask:
+            continue
+        line_mask = masks[line_others[0]] | masks[line_others[1]]
+        box_mask = masks[box_others[0]] | masks[box_others[1]]
+
+        # Claiming: only this segment of the line holds the number, so the rest of the box cannot
+        claimed = mask & ~line_mask & box_mask
+        # Pointing: only this segment of the box holds the number, so the rest of the line cannot
+        pointing = mask & ~box_mask & line_mask
+        if not (claimed or pointing):
+            continue
+
+        eliminated = 0
+        for rest, bits in ((box_rest, claimed), (line_rest, pointing)):
+            if not bits:
+                continue
+            for cell in rest:
+                found = cell_cand.get(cell, 0) & bits
+                if found:
+                    count = propagator.eliminate(search, cell, found)
+                    if count is None:
+                        return None
+                    eliminated += count
+        return eliminated
+    return 0
+
+
+# Rules available by name, in the order they are applied by default
+RULES = {
+    "naked_singles": naked_singles,
+    "hidden_singles": hidden_singles,
+    "box_line_reduction": box_line_reduction,
+}
+
+
+class Propagator:
+    def __init__(self, rules=tuple(RULES)):
+        """
+        Initializes a propagation pipeline.
+
+        Args:
+            rules (tuple[str|callable]): The rules to apply, in order, either by name from RULES or as
+                functions taking (propagator, search) and returning the number of changes or None on a
+                contradiction. An empty tuple turns propagation off.
+
+        Attributes:
+            rules (list[tuple[str, callable]]): The named rules of the pipeline.
+            cells (dict[str, int]): For each rule, the number of cells it placed.
+            eliminations (dict[str, int]): For each rule, the number of candidates it eliminated from cells
+                it did not place. Only box/line reduction eliminates, the singles place cells.
+            eliminated (int): The number of candidates eliminated by every rule so far.
+        """
+
+        self.rules = [(rule, RULES[rule]) if isinstance(rule, str) else (rule.__name__, rule) for rule in rules]
+        self.cells = {name: 0 for name, rule in self.rules}
+        self.eliminations = {name: 0 for name, rule in self.rules}
+        self.eliminated = 0
+        self.placed = None
+
+    def propagate(self, search):
+        """
+        Applies the rules to a search until a fixpoint is reached.
+
+        Args:
+            search (search.AStarSearch): The search whose board, candidates, MRV index and trail are updated.
+
+        Returns:
+            tuple[bool, list[tuple[int, int]]]: False if a contradiction was found, and the cells placed
+            by the rules, in the order they were placed.
+        """
+
+        self.placed = []
+        progress = True
+        while progress:
+            progress = False
+            for name, rule in self.rules:
+                placed, eliminated = len(self.placed), self.eliminated
+                changes = rule(self, search)
+                if changes is None:
+                    return False, self.placed
+                if changes:
+                    self.cells[name] += len(self.placed) - placed
+                    self.eliminations[name] += self.eliminated - eliminated
+                    # Start again from the cheapest rule
+                    progress = True
+                    break
+        return True, self.placed
+
+    def assign(self, search, cell, num):
+        # Places a number found by a rule and removes it from the peers through the trail
+        search.board.place(cell[0], cell[1], num)
+        update_candidates(search.cell_cand, search.board, cell, num, add=True, index=search.index, trail=search.trail)
+        self.placed.append(cell)
+
+    def eliminate(self, search, cell, bits):
+        # Removes candidate bits from a cell through the trail, None if the cell has none left
+        old = search.cell_cand[cell]
+        new = old & ~bits
+        search.trail.record(cell, old)
+        search.cell_cand[cell] = new
+        search.index.update(cell, POPCOUNT[new])
+        if not new:
+            return None
+        count = POPCOUNT[old & bits]
+        self.eliminated += count
+        return count
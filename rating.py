@@ -0,0 +1,252 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Difficulty ratings of sudoku puzzles from the effort it takes to solve them.
+
+The number of empty cells says little about how hard a puzzle is: a 25 clue puzzle can
+fall to naked singles alone or need deep guessing. A puzzle is rated by solving it with
+the instrumented A* search and its propagation pipeline, which always try the cheapest
+rule first, and scoring the hardest technique it needed, how much of the work needed more
+than naked singles, and how many guesses and backtracks the search made on top of it.
+
+Scores start at 1.0 for a puzzle solved by naked singles alone and have no upper bound:
+
+    score = hardest technique + (mean technique weight - 1)
+            + SEARCH_WEIGHT * log2(1 + nodes) + BACKTRACK_WEIGHT * log2(1 + backtracks)
+"""
+
+import math
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from bitboard import BitBoard
+from instrumentation import InstrumentedAStarSearch, SearchStats
+from propagation import Propagator
+from search import UNSOLVABLE
+
+# Weight of each propagation rule, in the order the propagator tries them
+TECHNIQUE_WEIGHTS = {
+    "naked_singles": 1.0,
+    "hidden_singles": 1.5,
+    "box_line_reduction": 2.5,
+}
+
+# Weight of the branching placements and of the placements taken back, on a log2 scale
+SEARCH_WEIGHT = 1.0
+BACKTRACK_WEIGHT = 0.5
+
+# Placements after which a rating gives up, its score is then a lower bound
+RATING_NODE_BUDGET = 100000
+
+# Named rating bands as [low, high) score ranges
+BANDS = {
+    "easy": (0.0, 1.5),
+    "medium": (1.5, 2.5),
+    "hard": (2.5, 4.5),
+    "expert": (4.5, float("inf")),
+}
+
+
+def band_of(score):
+    """
+    Returns the name of the rating band a score falls in, None for a puzzle without a score.
+    """
+
+    if score is None:
+        return None
+    for name, (low, high) in BANDS.items():
+        if low <= score < high:
+            return name
+    return None
+
+
+def band_range(band):
+    """
+    Returns the (low, high) score range of a band given by name or as a range.
+
+    Raises:
+        ValueError: If the band name is unknown.
+    """
+
+    if isinstance(band, str):
+        if band not in BANDS:
+            raise ValueError(f"Unknown rating band {band!r}, expected one of {', '.join(BANDS)}.")
+        return BANDS[band]
+    low, high = band
+    return low, high
+
+
+class Rating:
+    __slots__ = ("score", "status", "techniques", "nodes", "backtracks", "mean_branching")
+
+    def __init__(self, score, status, techniques, nodes=0, backtracks=0, mean_branching=None):
+        """
+        Difficulty rating of a puzzle.
+
+        Attributes:
+            score (float|None): The difficulty score, None for an unsolvable puzzle.
+            status (str): The status of the rating solve, a score with search.BUDGET_EXCEEDED is a lower bound.
+            techniques (dict[str, int]): For each propagation rule, the cells it placed or candidates it eliminated.
+            nodes (int): The number of placements made by branching decisions.
+            backtracks (int): The number of placements taken back.
+            mean_branching (float|None): The average number of candidates of the cells branched on.
+        """
+
+        self.score = score
+        self.status = status
+        self.techniques = techniques
+        self.nodes = nodes
+        self.backtracks = backtracks
+        self.mean_branching = mean_branching
+
+    @property
+    def band(self):
+        return band_of(self.score)
+
+    @property
+    def hardest(self):
+        """
+        str|None: The hardest propagation rule the puzzle needed, None if it needed none.
+        """
+
+        used = [name for name, count in self.techniques.items() if count]
+        if not used:
+            return None
+        return max(used, key=lambda name: TECHNIQUE_WEIGHTS.get(name, 0.0))
+
+    def as_dict(self):
+        """
+        Returns the rating as a flat dict, ready to be stored next to timing results.
+        """
+
+        return {
+            "score": self.score,
+            "band": self.band,
+            "status": self.status,
+            "hardest": self.hardest,
+            "techniques": dict(self.techniques),
+            "nodes": self.nodes,
+            "backtracks": self.backtracks,
+            "mean_branching": self.mean_branching,
+        }
+
+    def __repr__(self):
+        score = "None" if self.score is None else f"{self.score:.2f}"
+        return f"Rating({score}, band={self.band!r}, status={self.status!r}, nodes={self.nodes})"
+
+
+def score_effort(techniques, nodes, backtracks):
+    """
+    Scores the effort of a solve, see the module docstring for the formula.
+
+    Args:
+        techniques (dict[str, int]): For each propagation rule, the number of changes it made.
+        nodes (int): The number of placements made by branching decisions.
+        backtracks (int): The number of placements taken back.
+
+    Returns:
+        float: The difficulty score.
+    """
+
+    steps = sum(techniques.values())
+    if steps:
+        hardest = max(TECHNIQUE_WEIGHTS.get(name, 0.0) for name, count in techniques.items() if count)
+        mean = sum(TECHNIQUE_WEIGHTS.get(name, 0.0) * count for name, count in techniques.items()) / steps
+    else:
+        hardest = mean = 1.0
+    return (hardest + mean - 1.0
+            + SEARCH_WEIGHT * math.log2(1 + nodes) + BACKTRACK_WEIGHT * math.log2(1 + backtracks))
+
+
+def rate(board, max_nodes=RATING_NODE_BUDGET):
+    """
+    Rates the difficulty of a puzzle. The board is not modified.
+
+    Args:
+        board (list[list[int]]|BitBoard): A 9x9 sudoku board. A BitBoard is copied before the solve.
+        max_nodes (int|None): The number of placements the rating solve may make, None for no limit.
+
+    Returns:
+        Rating: The rating, without a score if the puzzle is unsolvable.
+    """
+
+    if isinstance(board, BitBoard):
+        board = board.copy()
+    propagator = Propagator(tuple(TECHNIQUE_WEIGHTS))
+    stats = SearchStats()
+    search = InstrumentedAStarSearch(board, None, propagator, stats=stats)
+    status = search.run_limited(max_nodes)
+
+    # The changes made by each rule, cells placed by the singles and candidates eliminated by box/line
+    # reduction, which is what the technique weights and the band edges were set against
+    techniques = {name: propagator.cells[name] + propagator.eliminations[name] for name in propagator.cells}
+    if status == UNSOLVABLE:
+        return Rating(None, status, techniques, stats.nodes, stats.backtracks, stats.mean_branching)
+    score = score_effort(techniques, stats.nodes, stats.backtracks)
+    return Rating(score, status, techniques, stats.nodes, stats.backtracks, stats.mean_branching)
+
+
+def _rate_chunk(boards, max_nodes):
+    # Worker entry point: rates every board of a chunk
+    return [rate(board, max_nodes) for board in boards]
+
+
+def rate_many(boards, workers=None, chunksize=256, max_nodes=RATING_NODE_BUDGET):
+    """
+    Rates many puzzles, spreading them across a pool of worker processes.
+
+    Args:
+        boards (Iterable[list[list[int]]]): The puzzles to rate, read lazily.
+        workers (int|None): The number of worker processes, None for one per core, 0 to rate in this process.
+        chunksize (int): The number of puzzles sent to a worker at once.
+        max_nodes (int|None): The number of placements each rating solve may make.
+
+    Yields:
+        Rating: The rating of each puzzle, in the order of the puzzles.
+    """
+
+    boards = iter(boards)
+    chunks = iter(lambda: list(islice(boards, chunksize)), [])
+
+    if workers == 0:
+        for chunk in chunks:
+            yield from _rate_chunk(chunk, max_nodes)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    # Only a few chunks per worker are in flight, so the boards can be a long lazy stream
+    window = workers * 4
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_rate_chunk, chunk, max_nodes))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from corpus import parse_line
+
+    parser = argparse.ArgumentParser(description="Rate the difficulty of puzzles in the 81 character format.")
+    parser.add_argument("text", help="text file with one puzzle per line")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.text) as text:
+        boards = [parse_line(line) for line in text if line.strip() and not line.startswith("#")]
+
+    start = time.perf_counter()
+    counts = {}
+    for board, rating in zip(boards, rate_many(boards, workers=args.workers)):
+        counts[rating.band] = counts.get(rating.band, 0) + 1
+        print(f"{''.join(str(num) for row in board for num in row)}  {rating.score if rating.score is None else round(rating.score, 2)}  {rating.band}")
+    seconds = time.perf_counter() - start
+    print(f"Rated {len(boards)} puzzles in {seconds:.2f}s ({len(boards) / seconds:.0f}/s): "
+          + ", ".join(f"{band}: {count}" for band, count in counts.items()))
@@ -0,0 +1,312 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Solver traces: a compact record of every step of a solve, so it can be played back,
+stepped through and seeked without solving the puzzle again.
+
+Each step is a single 16 bit event:
+
+    bits 11-12  the kind of step, PLACE, UNDO or PROPAGATE
+    bits  4-10  the cell index, 0 to 80 in row-major order
+    bits  0-3   the number placed or taken back
+
+so a million steps take 2 MB. Every KEYFRAME_INTERVAL steps the 81 cells of the board
+are kept as a keyframe, and the board after any step is rebuilt from the keyframe before
+it with at most KEYFRAME_INTERVAL - 1 steps.
+
+A trace file is a 16 byte header, the keyframes and the events, all little endian:
+
+    4 bytes  magic b"SDTR"
+    2 bytes  version
+    2 bytes  keyframe interval
+    4 bytes  number of events
+    4 bytes  number of keyframes
+    81 bytes per keyframe, keyframe 0 is the starting board
+     2 bytes per event
+"""
+
+import struct
+import sys
+from array import array
+from instrumentation import InstrumentedAStarSearch, InstrumentedBacktrackSearch
+from search import Search
+
+MAGIC = b"SDTR"
+VERSION = 1
+
+# Magic, version, keyframe interval, number of events and number of keyframes
+HEADER = struct.Struct("<4sHHII")
+
+# Steps between two keyframes of the board
+KEYFRAME_INTERVAL = 4096
+
+# Kinds of steps: a placement by a branching decision, a placement taken back and a cell placed by propagation
+PLACE = 0
+UNDO = 1
+PROPAGATE = 2
+
+KIND_SHIFT = 11
+CELL_SHIFT = 4
+
+
+def encode(kind, idx, num):
+    """
+    Packs a step into its 16 bit event.
+    """
+
+    return kind << KIND_SHIFT | idx << CELL_SHIFT | num
+
+
+def decode(event):
+    """
+    Unpacks a 16 bit event.
+
+    Returns:
+        tuple[int, int, int]: (PLACE, UNDO or PROPAGATE, cell index, number).
+    """
+
+    return event >> KIND_SHIFT, (event >> CELL_SHIFT) & 127, event & 15
+
+
+class Trace:
+    def __init__(self, cells=None, keyframe_interval=KEYFRAME_INTERVAL):
+        """
+        Initializes an empty trace.
+
+        Args:
+            cells (Sequence[int]|None): The 81 cell values of the starting board, None for an empty board.
+                A tracing search sets them when it starts.
+            keyframe_interval (int): The number of steps between two keyframes.
+
+        Attributes:
+            events (array.array): The 16 bit events, one per step.
+            keyframes (list[bytes]): The 81 cells of the board after every keyframe_interval steps, built on demand.
+            keyframe_interval (int): The number of steps between two keyframes.
+        """
+
+        self.events = array("H")
+        self.keyframe_interval = keyframe_interval
+        self.keyframes = [bytes(81) if cells is None else bytes(cells)]
+
+    def begin(self, cells):
+        """
+        Starts the trace over from a board.
+
+        Args:
+            cells (Sequence[int]): The 81 cell values of the starting board.
+        """
+
+        del self.events[:]
+        self.keyframes = [bytes(cells)]
+
+    def record(self, kind, idx, num):
+        self.events.append(encode(kind, idx, num))
+
+    def __len__(self):
+        return len(self.events)
+
+    def event(self, n):
+        """
+        Returns step n as (kind, cell index, number).
+        """
+
+        return decode(self.events[n])
+
+    def start(self):
+        """
+        Returns the 81 cell values of the starting board.
+        """
+
+        return list(self.keyframes[0])
+
+    def _index(self, step):
+        # Builds the keyframes up to the one at or before step, replaying from the last one built
+        interval = self.keyframe_interval
+        while len(self.keyframes) <= step // interval:
+            cells = bytearray(self.keyframes[-1])
+            first = (len(self.keyframes) - 1) * interval
+            self.apply(cells, first, first + interval)
+            self.keyframes.append(bytes(cells))
+
+    def apply(self, cells, start, stop):
+        """
+        Replays steps start to stop - 1 onto a board.
+
+        Args:
+            cells (list[int]|bytearray): The 81 cell values of the board after step start - 1, changed in place.
+            start (int): The first step to replay.
+            stop (int): The step to stop before.
+        """
+
+        for event in self.events[start:stop]:
+            cells[(event >> CELL_SHIFT) & 127] = 0 if event >> KIND_SHIFT == UNDO else event & 15
+
+    def board_at(self, step):
+        """
+        Returns the board after a number of steps, replayed from the nearest keyframe.
+
+        Args:
+            step (int): The number of steps taken, 0 for the starting board and len(trace) for the end.
+
+        Returns:
+            list[int]: The 81 cell values in row-major order.
+
+        Raises:
+            IndexError: If the trace has fewer steps.
+        """
+
+        if not 0 <= step <= len(self.events):
+            raise IndexError("trace step out of range")
+        self._index(step)
+        first = step - step % self.keyframe_interval
+        cells = bytearray(self.keyframes[first // self.keyframe_interval])
+        self.apply(cells, first, step)
+        return list(cells)
+
+    def save(self, path):
+        """
+        Writes the trace to a file, with every keyframe so it can be seeked right after loading.
+
+        Args:
+            path (str): The path of the trace file.
+        """
+
+        self._index(len(self.events))
+        events = self.events
+        if sys.byteorder != "little":
+            events = array("H", events)
+            events.byteswap()
+        with open(path, "wb") as trace:
+            trace.write(HEADER.pack(MAGIC, VERSION, self.keyframe_interval, len(events), len(self.keyframes)))
+            trace.write(b"".join(self.keyframes))
+            trace.write(events.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a trace file written by save.
+
+        Args:
+            path (str): The path of the trace file.
+
+        Returns:
+            Trace: The trace, with its keyframes.
+
+        Raises:
+            ValueError: If the file is not a trace file of this version, or is cut short.
+        """
+
+        with open(path, "rb") as trace:
+            magic, version, interval, count, keyframes = HEADER.unpack(trace.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} solver trace")
+            frames = trace.read(keyframes * 81)
+            data = trace.read(count * 2)
+        if len(frames) != keyframes * 81 or len(data) != count * 2 or not keyframes:
+            raise ValueError(f"{path} is cut short")
+
+        loaded = cls(frames[:81], interval)
+        loaded.keyframes = [frames[n * 81:n * 81 + 81] for n in range(keyframes)]
+        loaded.events.frombytes(data)
+        if sys.byteorder != "little":
+            loaded.events.byteswap()
+        return loaded
+
+    def __repr__(self):
+        return f"Trace({len(self.events)} steps, {len(self.keyframes)} keyframes)"
+
+
+class TracingSearch:
+    """
+    Mixin recording every step of an engine into a Trace. Like the instrumented engines it works
+    around select, place and unplace, so the search always goes through the generic Search.run.
+    """
+
+    run = Search.run
+
+    def __init__(self, board, *args, trace=None, **kwargs):
+        self.trace = Trace() if trace is None else trace
+        if isinstance(board, list):
+            cells = [num for row in board for num in row]
+        else:
+            cells = board.cells
+        self.trace.begin(cells)
+        super().__init__(board, *args, **kwargs)
+
+        # Cells placed by propagation before the search started
+        for idx, num in enumerate(self.board.cells):
+            if num and not self.trace.keyframes[0][idx]:
+                self.trace.record(PROPAGATE, idx, num)
+
+    def place(self, idx, num):
+        self.trace.events.append(PLACE << KIND_SHIFT | idx << CELL_SHIFT | num)
+        return super().place(idx, num)
+
+    def unplace(self, idx, num):
+        self.trace.events.append(UNDO << KIND_SHIFT | idx << CELL_SHIFT | num)
+        super().unplace(idx, num)
+
+
+class TracingBacktrackSearch(TracingSearch, InstrumentedBacktrackSearch):
+    pass
+
+
+class TracingAStarSearch(TracingSearch, InstrumentedAStarSearch):
+    """
+    Also records the cells placed by propagation after each placement, and takes them back
+    newest first before the placement itself, in the order the search undoes them.
+    """
+
+    def place(self, idx, num):
+        ok = super().place(idx, num)
+        if self.propagator is not None:
+            cells, events = self.board.cells, self.trace.events
+            for i, j in self.propagated[-1]:
+                events.append(PROPAGATE << KIND_SHIFT | (i * 9 + j) << CELL_SHIFT | cells[i * 9 + j])
+        return ok
+
+    def unplace(self, idx, num):
+        if self.propagator is not None:
+            cells, events = self.board.cells, self.trace.events
+            for i, j in reversed(self.propagated[-1]):
+                events.append(UNDO << KIND_SHIFT | (i * 9 + j) << CELL_SHIFT | cells[i * 9 + j])
+        super().unplace(idx, num)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from corpus import parse_line
+    from sudokutools import solve, solve_A
+
+    parser = argparse.ArgumentParser(description="Record the trace of a solve, or describe a trace file.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="solve a puzzle in the 81 character format and save its trace")
+    record.add_argument("puzzle")
+    record.add_argument("out", help="trace file to write")
+    record.add_argument("--engine", choices=("astar", "backtracking"), default="astar")
+    record.add_argument("--max-nodes", type=int, default=None)
+    info = commands.add_parser("info", help="describe a trace file")
+    info.add_argument("trace")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        trace = Trace()
+        solver = solve_A if args.engine == "astar" else solve
+        result = solver(parse_line(args.puzzle), max_nodes=args.max_nodes, trace=trace)
+        trace.save(args.out)
+        print(f"{result}, {len(trace)} steps written to {args.out}")
+    else:
+        start = time.perf_counter()
+        trace = Trace.load(args.trace)
+        loaded = time.perf_counter() - start
+        counts = [0, 0, 0]
+        for event in trace.events:
+            counts[event >> KIND_SHIFT] += 1
+        start = time.perf_counter()
+        cells = trace.board_at(len(trace))
+        seek = time.perf_counter() - start
+        print(f"{trace}: {counts[PLACE]} placements, {counts[UNDO]} undone, {counts[PROPAGATE]} propagated")
+        print(f"Loaded in {loaded * 1000:.1f}ms, seeked to the end in {seek * 1000:.2f}ms")
+        print("".join(str(num) for num in cells))
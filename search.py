@@ -0,0 +1,400 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Non-recursive solver engines used by solve and solve_A in sudokutools.
+
+Both engines keep their search state on an explicit stack of frames instead of
+Python call frames, so a search can be run for a limited number of nodes,
+suspended, and resumed later from exactly where it stopped.
+"""
+
+import threading
+import time
+from astar import empty_cells_cand, update_candidates, MRVIndex, Trail
+from bitboard import BitBoard, ALL_DIGITS, BOX_OF, COL_OF, DIGITS, ROW_OF
+
+# Outcome of a limited solve
+SOLVED = "solved"
+UNSOLVABLE = "unsolvable"
+TIMEOUT = "timeout"
+BUDGET_EXCEEDED = "budget_exceeded"
+CANCELLED = "cancelled"
+
+# Placements between two deadline and cancellation checks
+SLICE_NODES = 2048
+
+
+class CancelToken:
+    """
+    Cooperative cancellation flag shared between a solver and whoever may want to stop it,
+    from any thread. Solvers check it every SLICE_NODES placements.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+class LimitReached(Exception):
+    """
+    Raised by searches that cannot return a status (the solution generators) when a limit stops them.
+
+    Attributes:
+        status (str): TIMEOUT, BUDGET_EXCEEDED or CANCELLED.
+    """
+
+    def __init__(self, status):
+        super().__init__(f"Search stopped: {status}")
+        self.status = status
+
+
+class SolveResult:
+    __slots__ = ("status", "nodes", "seconds", "stats")
+
+    def __init__(self, status, nodes=0, seconds=0.0, stats=None):
+        """
+        Outcome of a solve. Its truth value is whether the board was solved, so it can stand in
+        for the bool the solvers used to return.
+
+        Attributes:
+            status (str): SOLVED, UNSOLVABLE, TIMEOUT, BUDGET_EXCEEDED or CANCELLED.
+            nodes (int): The number of placements made by branching decisions.
+            seconds (float): The time spent searching.
+            stats (instrumentation.SearchStats|None): The search counters, if the solve was instrumented.
+        """
+
+        self.status = status
+        self.nodes = nodes
+        self.seconds = seconds
+        self.stats = stats
+
+    @property
+    def solved(self):
+        return self.status == SOLVED
+
+    def __bool__(self):
+        return self.status == SOLVED
+
+    def __repr__(self):
+        return f"SolveResult({self.status!r}, nodes={self.nodes}, seconds={self.seconds:.6f})"
+
+
+def check_limits(deadline=None, cancel=None):
+    """
+    Returns the status of the first time limit or cancellation that applies, None if the search may go on.
+
+    Args:
+        deadline (float|None): A time.perf_counter() value after which the search gives up.
+        cancel (CancelToken|None): A token that stops the search once cancelled.
+    """
+
+    if cancel is not None and cancel.cancelled:
+        return CANCELLED
+    if deadline is not None and time.perf_counter() > deadline:
+        return TIMEOUT
+    return None
+
+
+class Search:
+    def __init__(self, board):
+        """
+        Initializes a search over a board.
+
+        Args:
+            board (list[list[int]]|BitBoard|grid.GridBoard): The board to solve. A board object is solved in
+                place, a list based board is copied into a new BitBoard and only written back by write_to.
+
+        Attributes:
+            board (BitBoard): The board being searched.
+            stack (list[list[int]]): One frame per branching decision as [cell index, untried candidate mask, placed number].
+            nodes (int): The number of placements made so far.
+            solved (bool|None): True once a solution is found, False once the board is known to be unsolvable, None while searching.
+
+        place must return False when the placement leads straight to a contradiction, so the
+        next candidate of the same cell is tried without branching any further.
+        """
+
+        self.board = BitBoard(board) if isinstance(board, list) else board
+        self.stack = []
+        self.nodes = 0
+        self.solved = None
+        self.selecting = True
+
+    def run(self, max_nodes=None):
+        """
+        Runs the search until it finishes or max_nodes more placements have been made.
+
+        Args:
+            max_nodes (int|None): The number of placements after which the search is suspended, None for no limit.
+
+        Returns:
+            bool|None: True if the board was solved, False if it is unsolvable, None if the search was suspended.
+        """
+
+        if self.solved is not None:
+            return self.solved
+
+        stack = self.stack
+        limit = None if max_nodes is None else self.nodes + max_nodes
+
+        while True:
+            if self.selecting:
+                # Pick the next cell to branch on, or stop if there is none left
+                self.selecting = False
+                frame = self.select()
+                if frame is None:
+                    self.solved = True
+                    return True
+                stack.append(frame)
+
+            frame = stack[-1]
+            if frame[2]:
+                # The last number tried here failed further down, take it back
+                self.unplace(frame[0], frame[2])
+                frame[2] = 0
+
+            mask = frame[1]
+            if not mask:
+                # Every candidate failed, backtrack to the previous decision
+                stack.pop()
+                if not stack:
+                    self.solved = False
+                    return False
+                continue
+
+            # Try the lowest remaining candidate, masks can be wider than 9 bits on larger grids
+            num = (mask & -mask).bit_length()
+            frame[1] = mask & (mask - 1)
+            frame[2] = num
+            self.nodes += 1
+            if self.place(frame[0], num):
+                self.selecting = True
+
+            if limit is not None and self.nodes >= limit:
+                return None
+
+    def run_limited(self, max_nodes=None, deadline=None, cancel=None):
+        """
+        Runs the search until it finishes or a limit stops it. Without a deadline or a token it is a single run call,
+        otherwise the search runs in slices of SLICE_NODES placements between the checks.
+
+        Args:
+            max_nodes (int|None): The number of placements allowed from now on, None for no limit.
+            deadline (float|None): A time.perf_counter() value after which the search gives up.
+            cancel (CancelToken|None): A token that stops the search once cancelled.
+
+        Returns:
+            str: SOLVED, UNSOLVABLE, TIMEOUT, BUDGET_EXCEEDED or CANCELLED. A stopped search can be resumed.
+        """
+
+        if deadline is None and cancel is None:
+            result = self.run(max_nodes)
+        else:
+            limit = None if max_nodes is None else self.nodes + max_nodes
+            while True:
+                status = check_limits(deadline, cancel)
+                if status is not None:
+                    return status
+                step = SLICE_NODES if limit is None else min(SLICE_NODES, limit - self.nodes)
+                result = self.run(step)
+                if result is not None or (limit is not None and self.nodes >= limit):
+                    break
+
+        if result is None:
+            return BUDGET_EXCEEDED
+        return SOLVED if result else UNSOLVABLE
+
+    def solutions(self, max_nodes=None, deadline=None, cancel=None):
+        """
+        Yields every solution of the board, continuing the search after each one.
+
+        Args:
+            max_nodes (int|None): The number of placements allowed for all the solutions together, None for no limit.
+            deadline (float|None): A time.perf_counter() value after which the search gives up.
+            cancel (CancelToken|None): A token that stops the search once cancelled.
+
+        Yields:
+            list[int]: The cell values of a solution in row-major order.
+
+        Raises:
+            LimitReached: If a limit stops the search before every solution is found.
+        """
+
+        limit = None if max_nodes is None else self.nodes + max_nodes
+        while True:
+            if limit is not None and self.nodes >= limit:
+                raise LimitReached(BUDGET_EXCEEDED)
+            status = self.run_limited(None if limit is None else limit - self.nodes, deadline, cancel)
+            if status == UNSOLVABLE:
+                return
+            if status != SOLVED:
+                raise LimitReached(status)
+            yield self.board.cells[:]
+            if not self.stack:
+                # Solved without any branching decision, there is nothing else to try
+                return
+            # Treat the solution as a dead end so the search backtracks from the last decision
+            self.solved = None
+            self.selecting = False
+
+    def write_to(self, board):
+        """
+        Copies the current state of the search into a list based board.
+
+        Args:
+            board (list[list[int]]): A 9x9 sudoku board represented as a list of lists of integers.
+        """
+
+        self.board.write_to(board)
+
+    def select(self):
+        raise NotImplementedError
+
+    def place(self, idx, num):
+        raise NotImplementedError  # returns bool
+
+    def unplace(self, idx, num):
+        raise NotImplementedError
+
+
+class BacktrackSearch(Search):
+    """
+    Backtracking in the same order as the recursive solver: the first empty cell in
+    row-major order is filled with its valid numbers in increasing order.
+
+    run is the generic loop of Search with select, place and unplace inlined, since the
+    per-node work here is only a few mask operations and method calls would dominate it.
+    """
+
+    def run(self, max_nodes=None):
+        if self.solved is not None:
+            return self.solved
+
+        cells, rows, cols, boxes = self.board.cells, self.board.rows, self.board.cols, self.board.boxes
+        stack = self.stack
+        nodes = self.nodes
+        limit = None if max_nodes is None else nodes + max_nodes
+
+        while True:
+            if self.selecting:
+                # Every cell before the last decision is filled, so the scan can start there
+                self.selecting = False
+                try:
+                    idx = cells.index(0, stack[-1][0] if stack else 0)
+                except ValueError:
+                    self.nodes = nodes
+                    self.solved = True
+                    return True
+                stack.append([idx, ALL_DIGITS & ~(rows[ROW_OF[idx]] | cols[COL_OF[idx]] | boxes[BOX_OF[idx]]), 0])
+
+            frame = stack[-1]
+            idx = frame[0]
+            row, col, box = ROW_OF[idx], COL_OF[idx], BOX_OF[idx]
+            if frame[2]:
+                # The last number tried here failed further down, take it back
+                free = ~(1 << (frame[2] - 1))
+                cells[idx] = 0
+                rows[row] &= free
+                cols[col] &= free
+                boxes[box] &= free
+                frame[2] = 0
+
+            mask = frame[1]
+            if not mask:
+                # Every candidate failed, backtrack to the previous decision
+                stack.pop()
+                if not stack:
+                    self.nodes = nodes
+                    self.solved = False
+                    return False
+                continue
+
+            # Try the lowest remaining candidate
+            low = mask & -mask
+            frame[1] = mask ^ low
+            frame[2] = cells[idx] = DIGITS[low][0]
+            rows[row] |= low
+            cols[col] |= low
+            boxes[box] |= low
+            nodes += 1
+            self.selecting = True
+
+            if limit is not None and nodes >= limit:
+                self.nodes = nodes
+                return None
+
+    # The same steps as the inlined loop, for subclasses that go through the generic Search.run
+    def select(self):
+        cells = self.board.cells
+        try:
+            idx = cells.index(0, self.stack[-1][0] if self.stack else 0)
+        except ValueError:
+            return None
+        return [idx, self.board.candidates(ROW_OF[idx], COL_OF[idx]), 0]
+
+    def place(self, idx, num):
+        self.board.place(ROW_OF[idx], COL_OF[idx], num)
+        return True
+
+    def unplace(self, idx, num):
+        self.board.remove(ROW_OF[idx], COL_OF[idx])
+
+
+class AStarSearch(Search):
+    """
+    The A* solver: always branches on the cell with the fewest candidates, taken from a
+    persistent MRVIndex, and undoes candidate updates with a Trail.
+
+    With a Propagator the rules run to a fixpoint before the search starts and after every
+    placement. The cells they place are remembered per placement and taken back with it.
+    """
+
+    def __init__(self, board, cell_cand=None, propagator=None):
+        super().__init__(board)
+        # Candidate masks of the empty cells, built from the board unless given
+        self.cell_cand = empty_cells_cand(self.board) if cell_cand is None else cell_cand
+        self.index = MRVIndex(self.cell_cand)
+        self.trail = Trail()
+        # A pipeline without rules is the same as no propagation at all
+        self.propagator = propagator if propagator is not None and propagator.rules else None
+        # Cells placed by propagation after each placement that is still on the board
+        self.propagated = []
+
+        if self.propagator is not None and not self.propagator.propagate(self)[0]:
+            self.solved = False
+
+    def select(self):
+        best = self.index.best()
+        if best is None:
+            return None
+        dont_use, (i, j) = best
+        return [i * 9 + j, self.cell_cand[(i, j)], 0]
+
+    def place(self, idx, num):
+        cell = (idx // 9, idx % 9)
+        self.board.place(cell[0], cell[1], num)
+        update_candidates(self.cell_cand, self.board, cell, num, add=True, index=self.index, trail=self.trail)
+
+        if self.propagator is None:
+            return True
+        ok, placed = self.propagator.propagate(self)
+        self.propagated.append(placed)
+        return ok
+
+    def unplace(self, idx, num):
+        if self.propagator is not None:
+            # Propagated cells are undone newest first, each with its own trail mark
+            for i, j in reversed(self.propagated.pop()):
+                self.board.remove(i, j)
+                self.trail.undo(self.cell_cand, self.index)
+
+        cell = (idx // 9, idx % 9)
+        self.board.remove(cell[0], cell[1])
+        update_candidates(self.cell_cand, self.board, cell, num, add=False, index=self.index, trail=self.trail)
@@ -0,0 +1,671 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Local solve service: an asyncio HTTP/JSON server in front of a pool of solver processes.
+
+Applications talk to one long running process instead of importing the solvers
+themselves, so the import and warm-up cost is paid once and the solution cache of each
+worker is shared by every client. The endpoints are
+
+    POST /solve      {"board": ..., "algorithm": "dlx", "timeout": 10.0, "max_nodes": null}
+    POST /generate   {"removed_cells": 45, "rating": null, "seed": null, "size": 9, "timeout": 10.0}
+    POST /validate   {"board": ...}
+    POST /count      {"board": ..., "limit": 2, "timeout": 10.0, "max_nodes": null}
+    GET  /metrics    queue depth, batch sizes and latency percentiles
+    GET  /health
+
+where a board is a list of rows or an 81 character line. Requests are queued, and the
+requests that arrive within BATCH_WINDOW seconds of each other are sent to a worker as
+one batch. A full queue answers 503 right away instead of letting latency grow without
+bound, and at most two batches per worker are in flight, so a busy pool fills the queue.
+"""
+
+import asyncio
+import json
+import os
+import signal
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+## Server Parameters ##
+HOST = "127.0.0.1"
+PORT = 8471
+# Seconds the batcher waits after the first queued request for more to arrive
+BATCH_WINDOW = 0.005
+# Largest number of requests sent to a worker at once
+MAX_BATCH = 64
+# Queued requests past which new ones are rejected with 503
+MAX_QUEUE = 1024
+# Largest request body accepted, in bytes
+MAX_BODY = 64 * 1024
+# Solutions kept by the cache of every worker process
+CACHE_SIZE = 4096
+# Latencies kept per endpoint for the percentiles of /metrics
+LATENCY_SAMPLES = 4096
+# Seconds a solve, count or generation may take, the default and the largest timeout a request can set,
+# so no request holds a worker forever
+SOLVE_TIMEOUT = 10.0
+# Largest number of solutions /count counts
+COUNT_LIMIT = 10000
+# Largest board /generate makes, 25x25
+MAX_SIZE = 25
+
+# Solving functions available to /solve by name
+ALGORITHMS = ("backtracking", "astar", "dlx")
+
+
+class RequestError(ValueError):
+    """
+    A request the server cannot handle, answered with its HTTP status and message.
+
+    Attributes:
+        status (int): The HTTP status code.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_board(value):
+    """
+    Checks and converts the board of a request.
+
+    Args:
+        value (list[list[int]]|str): An N x N board as a list of rows (N = 4, 9, 16, 25, ...), or a 9x9 board as
+            an 81 character line.
+
+    Returns:
+        list[list[int]]: The board.
+
+    Raises:
+        RequestError: If the board is malformed.
+    """
+
+    from corpus import parse_line
+    from grid import box_size
+
+    if isinstance(value, str):
+        try:
+            return parse_line(value)
+        except ValueError as error:
+            raise RequestError(str(error))
+
+    if not isinstance(value, list) or not value:
+        raise RequestError("board must be a list of rows or an 81 character line")
+    size = len(value)
+    try:
+        box_size(size)
+    except ValueError as error:
+        raise RequestError(str(error))
+    for row in value:
+        if not isinstance(row, list) or len(row) != size:
+            raise RequestError(f"every row of the board needs {size} cells")
+        for num in row:
+            if type(num) is not int or not 0 <= num <= size:
+                raise RequestError(f"cells must be integers from 0 to {size}")
+    return value
+
+
+def _number(params, name, default=None, kind=(int, float)):
+    value = params.get(name, default)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, kind) or value < 0):
+        raise RequestError(f"{name} must be a non-negative number")
+    return value
+
+
+def _limits(params):
+    # The timeout, at most SOLVE_TIMEOUT, and the node budget of a solve, count or generation
+    timeout = _number(params, "timeout", SOLVE_TIMEOUT)
+    if timeout is None:
+        raise RequestError(f"timeout must be a number of seconds, at most {SOLVE_TIMEOUT}")
+    return {"timeout": min(timeout, SOLVE_TIMEOUT), "max_nodes": _number(params, "max_nodes", None, int)}
+
+
+def _rating(rating):
+    # A band name from rating.BANDS or a [low, high] score range, None for no rating
+    if rating is None:
+        return None
+    from rating import BANDS
+    if isinstance(rating, str):
+        if rating not in BANDS:
+            raise RequestError(f"rating must be one of {', '.join(BANDS)} or a [low, high] range")
+        return rating
+    if (not isinstance(rating, list) or len(rating) != 2
+            or any(isinstance(value, bool) or not isinstance(value, (int, float)) for value in rating)
+            or rating[0] > rating[1]):
+        raise RequestError("rating must be a band name or a [low, high] range of two numbers with low <= high")
+    return rating
+
+
+def check_params(endpoint, params):
+    """
+    Checks the JSON body of a request before it is queued, so bad requests never reach a worker.
+
+    Returns:
+        dict: The parameters with their defaults filled in.
+
+    Raises:
+        RequestError: If a parameter is missing or malformed.
+    """
+
+    if not isinstance(params, dict):
+        raise RequestError("the request body must be a JSON object")
+
+    if endpoint == "generate":
+        size = _number(params, "size", 9, int)
+        if size is None or size > MAX_SIZE:
+            raise RequestError(f"size must be at most {MAX_SIZE}")
+        try:
+            from grid import box_size
+            box_size(size)
+        except ValueError as error:
+            raise RequestError(str(error))
+        rating = _rating(params.get("rating"))
+        removed_cells = _number(params, "removed_cells", size * size * 5 // 9, int)
+        if removed_cells is None:
+            raise RequestError("removed_cells must be a non-negative number")
+        removed_cells = min(removed_cells, size * size)
+        unique = params.get("unique")
+        if unique is not None and not isinstance(unique, bool):
+            raise RequestError("unique must be true or false")
+        if size != 9:
+            unique = bool(unique)
+        elif unique and rating is None:
+            # Rejected here rather than after generate_board has spent its attempts in a worker
+            from sudokutools import MAX_UNIQUE_REMOVED
+            if removed_cells > MAX_UNIQUE_REMOVED:
+                raise RequestError(f"unique puzzles can have at most {MAX_UNIQUE_REMOVED} removed cells")
+        return {
+            "size": size,
+            "removed_cells": removed_cells,
+            "unique": unique,
+            "seed": _number(params, "seed", None, int),
+            "rating": rating,
+            **_limits(params),
+        }
+
+    if "board" not in params:
+        raise RequestError("board is required")
+    checked = {"board": parse_board(params["board"])}
+    if endpoint == "solve":
+        algorithm = params.get("algorithm", "dlx")
+        if algorithm not in ALGORITHMS:
+            raise RequestError(f"algorithm must be one of {', '.join(ALGORITHMS)}")
+        checked["algorithm"] = algorithm
+        checked.update(_limits(params))
+    elif endpoint == "count":
+        limit = _number(params, "limit", 2, int)
+        if limit is None or limit > COUNT_LIMIT:
+            raise RequestError(f"limit must be at most {COUNT_LIMIT}")
+        checked["limit"] = limit
+        checked.update(_limits(params))
+    return checked
+
+
+## Worker side ##
+
+_cache = None
+
+
+def _solution_cache():
+    # One cache per worker process, shared by every request it handles
+    global _cache
+    if _cache is None:
+        from canonical import SolutionCache
+        _cache = SolutionCache(CACHE_SIZE)
+    return _cache
+
+
+def _solve(params):
+    from sudokutools import solve, solve_A, solve_DLX
+
+    board = params["board"]
+    limits = {"max_nodes": params["max_nodes"], "deadline": time.perf_counter() + params["timeout"]}
+
+    if len(board) != 9:
+        from grid import solve_grid
+        result = solve_grid(board, **limits)
+    else:
+        solving_function = {"backtracking": solve, "astar": solve_A, "dlx": solve_DLX}[params["algorithm"]]
+        result = _solution_cache().solve(board, lambda copy: solving_function(copy, **limits))
+    return {"status": result.status, "board": board, "nodes": result.nodes, "seconds": result.seconds}
+
+
+def _generate(params):
+    # A generation stopped by its timeout is answered like generate_board giving up, with a 422
+    from search import LimitReached
+
+    deadline = time.perf_counter() + params["timeout"]
+    try:
+        if params["size"] != 9:
+            from grid import UNIQUE_CHECK_NODES, box_size, generate_grid
+            max_nodes = UNIQUE_CHECK_NODES if params["max_nodes"] is None else params["max_nodes"]
+            board = generate_grid(box_size(params["size"]), params["removed_cells"], params["seed"], params["unique"],
+                                  max_nodes, deadline)
+            return {"board": board}
+
+        from sudokutools import generate_board
+        rating = params["rating"]
+        board = generate_board(params["removed_cells"], params["unique"], params["seed"],
+                               rating=tuple(rating) if isinstance(rating, list) else rating,
+                               max_nodes=params["max_nodes"], deadline=deadline)
+    except LimitReached as stopped:
+        raise ValueError(f"generation stopped: {stopped.status}")
+    return {"board": board}
+
+
+def _validate(params):
+    # Clashing givens, and whether the board is complete
+    from grid import box_size
+
+    board = params["board"]
+    size = len(board)
+    box = box_size(size)
+    seen = {}
+    conflicts = set()
+    for i in range(size):
+        for j in range(size):
+            num = board[i][j]
+            if not num:
+                continue
+            for unit in (("row", i), ("col", j), ("box", (i // box) * box + j // box)):
+                other = seen.setdefault((unit, num), (i, j))
+                if other != (i, j):
+                    conflicts.update((other, (i, j)))
+    complete = all(num for row in board for num in row)
+    return {
+        "valid": not conflicts,
+        "complete": complete,
+        "solved": complete and not conflicts,
+        "conflicts": sorted(list(cell) for cell in conflicts),
+    }
+
+
+def _count(params):
+    # Counts up to limit solutions; a count stopped by the timeout or the node budget reports
+    # the solutions found so far with the status that stopped it
+    from search import LimitReached
+
+    board, limit = params["board"], params["limit"]
+    limits = {"max_nodes": params["max_nodes"], "deadline": time.perf_counter() + params["timeout"]}
+    if len(board) == 9:
+        from sudokutools import iter_solutions
+        solutions = iter_solutions(board, **limits)
+    else:
+        from grid import GridSearch
+        solutions = GridSearch(board).solutions(**limits)
+
+    count, status = 0, "complete"
+    try:
+        while count < limit:
+            next(solutions)
+            count += 1
+    except StopIteration:
+        pass
+    except LimitReached as stopped:
+        status = stopped.status
+    finally:
+        solutions.close()
+    return {"count": count, "limit": limit, "status": status}
+
+
+def _warm_up():
+    # Worker initializer: imports the solvers and builds the Dancing Links matrix before the first request
+    from sudokutools import generate_board, solve_DLX
+    _solution_cache()
+    solve_DLX(generate_board(30, seed=0))
+
+
+# Request handlers by endpoint, taking the checked parameters and returning the JSON response
+HANDLERS = {
+    "solve": _solve,
+    "generate": _generate,
+    "validate": _validate,
+    "count": _count,
+}
+
+
+def run_batch(jobs):
+    """
+    Worker entry point: runs every job of a batch.
+
+    Args:
+        jobs (list[tuple[str, dict]]): The endpoint and checked parameters of each request.
+
+    Returns:
+        list[tuple[int, dict]]: The HTTP status and JSON response of each request.
+    """
+
+    results = []
+    for endpoint, params in jobs:
+        try:
+            results.append((200, HANDLERS[endpoint](params)))
+        except ValueError as error:
+            # Mostly generate_board giving up on a unique puzzle
+            results.append((422, {"error": str(error)}))
+        except Exception as error:
+            results.append((500, {"error": f"{type(error).__name__}: {error}"}))
+    return results
+
+
+## Server side ##
+
+def _percentiles(samples):
+    # p50, p95 and p99 of a list of seconds, in milliseconds
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+    return {"count": len(ordered), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Counters and latency samples of a running server.
+
+        Attributes:
+            requests (Counter): Requests per endpoint, including rejected ones.
+            responses (Counter): Responses per HTTP status.
+            rejected (int): Requests turned away because the queue was full.
+            batches (int): Batches sent to the workers.
+            batched (int): Requests sent in those batches.
+            max_queue_depth (int): The deepest the queue has been.
+            latency (dict[str, deque[float]]): The latest request latencies per endpoint, in seconds.
+            queue_wait (deque[float]): The latest times requests spent queued before their batch left, in seconds.
+        """
+
+        self.started = time.time()
+        self.requests = Counter()
+        self.responses = Counter()
+        self.rejected = 0
+        self.batches = 0
+        self.batched = 0
+        self.max_queue_depth = 0
+        self.latency = {}
+        self.queue_wait = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, endpoint, status, seconds):
+        self.responses[status] += 1
+        self.latency.setdefault(endpoint, deque(maxlen=LATENCY_SAMPLES)).append(seconds)
+
+    def snapshot(self, queue_depth, in_flight):
+        """
+        Returns the metrics as a JSON ready dict.
+        """
+
+        return {
+            "uptime": round(time.time() - self.started, 3),
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "batches_in_flight": in_flight,
+            "requests": dict(self.requests),
+            "responses": {str(status): count for status, count in self.responses.items()},
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched / self.batches, 3) if self.batches else None,
+            "queue_wait_ms": _percentiles(list(self.queue_wait)),
+            "latency_ms": {endpoint: _percentiles(list(samples)) for endpoint, samples in self.latency.items()},
+        }
+
+
+class SolveServer:
+    def __init__(self, host=HOST, port=PORT, workers=None, window=BATCH_WINDOW, max_batch=MAX_BATCH,
+                 max_queue=MAX_QUEUE):
+        """
+        Initializes a solve server, start() opens the socket and the worker pool.
+
+        Args:
+            host (str): The interface to listen on, localhost by default.
+            port (int): The port to listen on, 0 for any free port.
+            workers (int|None): The number of worker processes, None for one per core, 0 for a single thread in
+                this process.
+            window (float): Seconds the batcher waits after the first queued request for more to arrive.
+            max_batch (int): The largest number of requests sent to a worker at once.
+            max_queue (int): The number of queued requests past which new ones are rejected.
+
+        Attributes:
+            metrics (Metrics): The counters and latencies of the server.
+        """
+
+        self.host = host
+        self.port = port
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.window = window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.metrics = Metrics()
+        self.in_flight = 0
+        self._queue = None
+        self._slots = None
+        self._pool = None
+        self._server = None
+        self._batcher = None
+
+    async def start(self):
+        """
+        Starts the worker pool, the batcher and the listening socket.
+        """
+
+        self._queue = asyncio.Queue(self.max_queue)
+        # Two batches per worker keep every worker busy while the next batch is being collected
+        self._slots = asyncio.Semaphore(max(1, self.workers) * 2)
+        if self.workers:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=1, initializer=_warm_up)
+        self._batcher = asyncio.ensure_future(self._batch_loop())
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        """
+        Stops listening, cancels the batcher and shuts the worker pool down.
+        """
+
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    async def submit(self, endpoint, params):
+        """
+        Queues a checked request and waits for its batch to come back.
+
+        Returns:
+            tuple[int, dict]: The HTTP status and JSON response.
+
+        Raises:
+            RequestError: With status 503 if the queue is full.
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((endpoint, params, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.metrics.rejected += 1
+            raise RequestError("the server is overloaded, retry later", 503)
+        self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _batch_loop(self):
+        # Collects the requests that arrive within the window of the first one into a batch
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            if self.window:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            # Waits for a free slot, the queue keeps filling up meanwhile
+            await self._slots.acquire()
+            asyncio.ensure_future(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        now = time.perf_counter()
+        for endpoint, params, future, queued in batch:
+            self.metrics.queue_wait.append(now - queued)
+        self.metrics.batches += 1
+        self.metrics.batched += len(batch)
+        self.in_flight += 1
+
+        jobs = [(endpoint, params) for endpoint, params, future, queued in batch]
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self._pool, run_batch, jobs)
+        except Exception as error:
+            results = [(500, {"error": f"{type(error).__name__}: {error}"})] * len(batch)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+        for (endpoint, params, future, queued), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _route(self, method, path, body):
+        # Answers one request, returns (status, JSON response)
+        endpoint = path.split("?", 1)[0].strip("/")
+        if method == "GET" and endpoint == "metrics":
+            return 200, self.metrics.snapshot(self._queue.qsize(), self.in_flight)
+        if method == "GET" and endpoint == "health":
+            return 200, {"status": "ok"}
+        if endpoint not in HANDLERS:
+            raise RequestError(f"unknown endpoint /{endpoint}", 404)
+        if method != "POST":
+            raise RequestError(f"/{endpoint} only accepts POST", 405)
+
+        self.metrics.requests[endpoint] += 1
+        try:
+            params = json.loads(body or b"{}")
+        except ValueError:
+            raise RequestError("the request body is not valid JSON")
+        return await self.submit(endpoint, check_params(endpoint, params))
+
+    async def _handle(self, reader, writer):
+        # Serves the requests of one connection, keeping it open between them unless asked not to
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except RequestError as error:
+                    _write_response(writer, error.status, {"error": str(error)}, False)
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                start = time.perf_counter()
+                try:
+                    status, payload = await self._route(method, path, body)
+                except RequestError as error:
+                    status, payload = error.status, {"error": str(error)}
+                endpoint = path.split("?", 1)[0].strip("/")
+                self.metrics.record(endpoint if endpoint in HANDLERS else "other", status, time.perf_counter() - start)
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _read_request(reader):
+    # Reads one HTTP/1.1 request, None once the client closed the connection
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, version = line.decode("latin-1").split()
+    except ValueError:
+        raise RequestError("malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = headers.get("content-length", "") or "0"
+    if not length.isdigit() or not length.isascii():
+        raise RequestError("Content-Length must be a non-negative integer")
+    length = int(length)
+    if length > MAX_BODY:
+        raise RequestError(f"the request body is larger than {MAX_BODY} bytes", 413)
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, headers, body
+
+
+# Reason phrases of the statuses the server answers with
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           422: "Unprocessable Entity", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+def _write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = [
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if status == 503:
+        head.append("Retry-After: 1")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+
+async def serve(**kwargs):
+    """
+    Runs a SolveServer until it is cancelled.
+
+    Args:
+        **kwargs: Passed on to SolveServer.
+    """
+
+    server = SolveServer(**kwargs)
+    await server.start()
+    print(f"Solve server listening on http://{server.host}:{server.port} with {server.workers} worker(s)", flush=True)
+
+    # SIGTERM shuts the server down like Ctrl+C, so the worker processes do not outlive it
+    task = asyncio.current_task()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    except (NotImplementedError, AttributeError):  # Windows
+        pass
+    try:
+        await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON solve server.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, 0 for a thread in this process")
+    parser.add_argument("--window", type=float, default=BATCH_WINDOW * 1000, help="batching window in milliseconds")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(host=args.host, port=args.port, workers=args.workers, window=args.window / 1000,
+                          max_batch=args.max_batch, max_queue=args.max_queue))
+    except KeyboardInterrupt:
+        pass
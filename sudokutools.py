@@ -1,21 +1,33 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-from random import randint, shuffle
+import math
+import random
+import time
+from bitboard import BitBoard
+
+# Largest number of removed cells generate_board makes unique puzzles for. Clearing cells in a random
+# order rarely keeps a single solution past this, at 59 a few of the 20 grids still work, from 60 none do
+MAX_UNIQUE_REMOVED = 58
 
 def find_empty(board):
     """
     Finds an empty cell in the sudoku board.
 
     Args:
-        board (list[list[int]]): A 9x9 sudoku board represented as a list of lists of integers.
+        board (list[list[int]]|BitBoard|grid.GridBoard): A 9x9 sudoku board represented as a list of lists of integers
+            or a BitBoard. List based and grid.GridBoard boards of other sizes (16x16, 25x25, ...) work too.
 
     Returns:
         tuple[int, int]|None: The position of the first empty cell found as a tuple of row and column indices, or None if no empty cell is found.
     """
 
-    for i in range(9):
-        for j in range(9):
+    if not isinstance(board, list):
+        return board.find_empty()
+
+    size = len(board)
+    for i in range(size):
+        for j in range(size):
             if board[i][j] == 0:
                 return (i, j)
     return None
@@ -26,7 +38,8 @@ def valid(board, pos, num):
     Checks whether a number is valid in a cell of the sudoku board.
 
     Args:
-        board (list[list[int]]): A 9x9 sudoku board represented as a list of lists of integers.
+        board (list[list[int]]|BitBoard|grid.GridBoard): A 9x9 sudoku board represented as a list of lists of integers
+            or a BitBoard. List based and grid.GridBoard boards of other sizes (16x16, 25x25, ...) work too.
         pos (tuple[int, int]): The position of the cell to check as a tuple of row and column indices.
         num (int): The number to check.
 
@@ -34,152 +47,459 @@ def valid(board, pos, num):
         bool: True if the number is valid in the cell, False otherwise.
     """
 
-    for i in range(9):
+    if not isinstance(board, list):
+        # O(1) check against the row, column and box occupancy masks of a BitBoard or GridBoard
+        return board.valid(pos, num)
+
+    size = len(board)
+    for i in range(size):
         if board[i][pos[1]] == num:
             return False
 
-    for j in range(9):
+    for j in range(size):
         if board[pos[0]][j] == num:
             return False
 
-    start_i = pos[0] - pos[0] % 3
-    start_j = pos[1] - pos[1] % 3
-    for i in range(3):
-        for j in range(3):
+    # Boxes are 3x3 on a 9x9 board, 4x4 on a 16x16 board, ...
+    box = math.isqrt(size)
+    start_i = pos[0] - pos[0] % box
+    start_j = pos[1] - pos[1] % box
+    for i in range(box):
+        for j in range(box):
             if board[start_i + i][start_j + j] == num:
                 return False
     return True
 
 
-def solve_A(board, cell_cand=None):
+def solve_A(board, cell_cand=None, propagator=None, stats=None, cache=None, max_nodes=None, deadline=None, cancel=None,
+            trace=None):
 
     """ Function created to solve sudoku using our A* algorithm 
     
-    Recycled some components from the backtracking algorithm that was provided """
+    Recycled some components from the backtracking algorithm that was provided 
+
+    Runs on a BitBoard, where cell_cand holds candidate masks. A list based board is
+    converted to a BitBoard and the solution is written back into it in place 
+
+    The cell with the fewest candidates comes from a persistent MRVIndex that
+    update_candidates keeps up to date, and backtracking pops a Trail of the removed
+    candidates. The search itself runs on an explicit stack (search.AStarSearch) 
+
+    Naked singles, hidden singles and box/line reductions are propagated before and between
+    branching decisions. Pass a propagation.Propagator to pick the rules or read its stats,
+    Propagator(rules=()) turns propagation off 
+
+    Pass an instrumentation.SearchStats as stats to count nodes, backtracks, depth, branching
+    and candidate updates. Without it the search runs uninstrumented 
+
+    Pass a canonical.SolutionCache as cache to reuse the solution of an equivalent puzzle
+    (relabeled, rows or columns permuted inside their band, transposed) solved before.
+    The cache is not used when cell_cand is given, since those candidates belong to this board only 
+
+    max_nodes, deadline (a time.perf_counter() value) and cancel (a search.CancelToken) stop
+    the search early. Returns a search.SolveResult, which is true only if the board was solved 
+
+    Pass a replay.Trace as trace to record every placement, undo and propagated cell of the
+    search, for playback without solving again. A traced solve never uses the cache """
     
     # Imports needed for this specific function
-    from astar import empty_cells_cand, update_candidates
-    import heapq
+    from search import AStarSearch
+    from propagation import Propagator
+
+    if cache is not None and cell_cand is None and trace is None:
+        return cache.solve(board, lambda copy: solve_A(copy, propagator=propagator, stats=stats, max_nodes=max_nodes,
+                                                       deadline=deadline, cancel=cancel))
+
+    if propagator is None:
+        propagator = Propagator()
+
+    start = time.perf_counter()
+    if trace is not None:
+        from replay import TracingAStarSearch
+        search = TracingAStarSearch(board, cell_cand, propagator, stats=stats, trace=trace)
+    elif stats is None:
+        search = AStarSearch(board, cell_cand, propagator)
+    else:
+        from instrumentation import InstrumentedAStarSearch
+        search = InstrumentedAStarSearch(board, cell_cand, propagator, stats=stats)
+    status = search.run_limited(max_nodes, deadline, cancel)
+    return _search_result(search, board, status, start, stats)
+
+
+def solve(board, stats=None, cache=None, max_nodes=None, deadline=None, cancel=None, trace=None):
+    """
+    Solves the sudoku board using the backtracking algorithm.
 
-    if cell_cand is None:
-        # Initialize the dictionary of empty cells with candidates
-        cell_cand = empty_cells_cand(board)
+    The search runs on an explicit stack (search.BacktrackSearch) and tries the cells and
+    numbers in the same order as the original recursive version.
 
-    if not cell_cand:
-        return True  # Board has been solved
+    Args:
+        board (list[list[int]]|BitBoard): A 9x9 sudoku board represented as a list of lists of integers or a BitBoard.
+        stats (instrumentation.SearchStats|None): Counters to add the nodes, backtracks, depth and branching of
+            the search to, None to run the search uninstrumented.
+        cache (canonical.SolutionCache|None): A cache of solutions keyed on the canonical form of their puzzle,
+            so an equivalent puzzle that was solved before is not searched again.
+        max_nodes (int|None): The number of placements the search may make, None for no limit.
+        deadline (float|None): A time.perf_counter() value after which the search gives up.
+        cancel (search.CancelToken|None): A token that stops the search once cancelled.
+        trace (replay.Trace|None): A trace to record every placement and undo of the search into, for playback
+            without solving again. The cache is not used for a traced solve.
 
-    # Use a priority queue to get the cell with the fewest candidates
-    priority_queue = [(len(candidates), (i, j), candidates) for (i, j), candidates in cell_cand.items()]
-    heapq.heapify(priority_queue)
+    Returns:
+        search.SolveResult: The status (solved, unsolvable, timeout, budget exceeded or cancelled), nodes, time
+        and stats of the search. It is true only if the board was solved, like the bool returned before.
+        A list based board is only changed when it is solved.
+    """
 
-    while priority_queue:
-        dont_use, (i, j), candidates = heapq.heappop(priority_queue)
+    if cache is not None and trace is None:
+        return cache.solve(board, lambda copy: solve(copy, stats, max_nodes=max_nodes, deadline=deadline, cancel=cancel))
 
-        for num in candidates:
-            if valid(board, (i, j), num):
-                # Place the number on the board
-                board[i][j] = num
-                # Update the candidates dictionary
-                update_candidates(cell_cand, board, (i, j), num, add=True)
+    from search import BacktrackSearch
 
-                
-                if solve_A(board, cell_cand): # Recursive step
-                    return True
+    start = time.perf_counter()
+    if trace is not None:
+        from replay import TracingBacktrackSearch
+        search = TracingBacktrackSearch(board, stats=stats, trace=trace)
+    elif stats is None:
+        search = BacktrackSearch(board)
+    else:
+        from instrumentation import InstrumentedBacktrackSearch
+        search = InstrumentedBacktrackSearch(board, stats=stats)
+    status = search.run_limited(max_nodes, deadline, cancel)
+    return _search_result(search, board, status, start, stats)
 
-                board[i][j] = 0
-                update_candidates(cell_cand, board, (i, j), num, add=False)
 
-        return False
+def _search_result(search, board, status, start, stats):
+    # Copies a solution back into a list based board and wraps up the outcome of the search
+    from search import SOLVED, SolveResult
 
-    return False
+    if status == SOLVED and not isinstance(board, BitBoard):
+        search.write_to(board)
+    return SolveResult(status, search.nodes, time.perf_counter() - start, stats)
 
 
-def solve(board):
+def solve_DLX(board, max_nodes=None, deadline=None, cancel=None):
     """
-    Solves the sudoku board using the backtracking algorithm.
+    Solves the sudoku board as an exact cover problem using Dancing Links (Algorithm X).
+
+    The cover matrix is built once per process (dlx.matrix) and reused for every board.
 
     Args:
-        board (list[list[int]]): A 9x9 sudoku board represented as a list of lists of integers.
+        board (list[list[int]]|BitBoard): A 9x9 sudoku board represented as a list of lists of integers or a BitBoard.
+        max_nodes (int|None): The number of rows the search may select, None for no limit.
+        deadline (float|None): A time.perf_counter() value after which the search gives up.
+        cancel (search.CancelToken|None): A token that stops the search once cancelled.
 
     Returns:
-        bool: True if the sudoku board is solvable, False otherwise.
+        search.SolveResult: The status of the search, true only if the board was solved. The nodes are the
+        rows selected by branching on a column, the Dancing Links counterpart of a placement.
     """
 
-    empty = find_empty(board)
-    if not empty:
-        return True
+    from dlx import solutions
+    from instrumentation import SearchStats
+    from search import SOLVED, UNSOLVABLE, LimitReached, SolveResult
+
+    start = time.perf_counter()
+    counters = SearchStats()
+    search = solutions(board, deadline, max_nodes, cancel, counters)
+    try:
+        solution = next(search, None)
+    except LimitReached as stopped:
+        return SolveResult(stopped.status, counters.nodes, time.perf_counter() - start)
+    finally:
+        search.close()
+    if solution is None:
+        return SolveResult(UNSOLVABLE, counters.nodes, time.perf_counter() - start)
+
+    # Fill the board in place
+    for idx, num in enumerate(solution):
+        if isinstance(board, BitBoard):
+            if not board.cells[idx]:
+                board.place(idx // 9, idx % 9, num)
+        else:
+            board[idx // 9][idx % 9] = num
+    return SolveResult(SOLVED, counters.nodes, time.perf_counter() - start)
+
+
+def iter_solutions(board, engine="dlx", max_nodes=None, deadline=None, cancel=None):
+    """
+    Yields every solution of the sudoku board, one at a time, without modifying the board.
 
-    for nums in range(1, 10):
-        if valid(board, empty, nums):
-            board[empty[0]][empty[1]] = nums
+    The search only runs as far as the solutions that are asked for, so stopping early
+    costs no more than the solutions seen so far.
 
-            if solve(board):  # recursive step
-                return True
-            board[empty[0]][empty[1]] = 0  # this number is wrong so we set it back to 0
-    return False
+    Args:
+        board (list[list[int]]|BitBoard): A 9x9 sudoku board represented as a list of lists of integers or a BitBoard.
+        engine (str): "dlx" for Dancing Links, the fastest for enumeration, or "astar" for the A* search with propagation.
+        max_nodes (int|None): The number of nodes the search may take for all the solutions together, None for no limit.
+        deadline (float|None): A time.perf_counter() value after which the search gives up.
+        cancel (search.CancelToken|None): A token that stops the search once cancelled.
 
+    Yields:
+        list[list[int]]: A solved copy of the board.
 
-def generate_board(removed_cells=45):
+    Raises:
+        search.LimitReached: If a limit stops the search before every solution is found.
     """
-    Generates a random sudoku board with fewer initial numbers.
+
+    if engine == "dlx":
+        from dlx import solutions
+        search = solutions(board, deadline, max_nodes, cancel)
+    elif engine == "astar":
+        from propagation import Propagator
+        from search import AStarSearch
+        bitboard = board.copy() if isinstance(board, BitBoard) else BitBoard(board)
+        search = AStarSearch(bitboard, propagator=Propagator()).solutions(max_nodes, deadline, cancel)
+    else:
+        raise ValueError(f"Unknown solution engine: {engine}")
+
+    try:
+        for cells in search:
+            yield [cells[i * 9:i * 9 + 9] for i in range(9)]
+    finally:
+        # Releases the shared Dancing Links matrix when the caller stops early
+        search.close()
+
+
+def count_solutions(board, limit=None, engine="dlx", max_nodes=None, deadline=None, cancel=None):
+    """
+    Counts the solutions of the sudoku board, stopping once limit solutions are found.
+
+    count_solutions(board, limit=2) == 1 checks that a puzzle is unique for about the cost of two solves.
+
+    Args:
+        board (list[list[int]]|BitBoard): A 9x9 sudoku board represented as a list of lists of integers or a BitBoard.
+        limit (int|None): The number of solutions after which counting stops, None to count all of them.
+        engine (str): The engine used by iter_solutions.
+        max_nodes (int|None): The number of nodes the search may take, None for no limit.
+        deadline (float|None): A time.perf_counter() value after which the search gives up.
+        cancel (search.CancelToken|None): A token that stops the search once cancelled.
 
     Returns:
-        list[list[int]]: A 9x9 sudoku board represented as a list of lists of integers.
+        int: The number of solutions, at most limit.
 
     Raises:
-        ValueError: If removed_cells is greater than or equal to 65, resulting in 16 or fewer filled cells.
+        search.LimitReached: If a limit stops the count before it is finished.
     """
 
-    # Check if removed_cells would result in 16 or fewer filled cells (unsolvable)
-    if removed_cells >= 65:
-        raise ValueError("Cannot create a board with 16 or fewer filled cells. The minimum number of clues for a solvable Sudoku is 17.")
+    count = 0
+    if limit is not None and limit <= 0:
+        return count
+
+    solutions = iter_solutions(board, engine, max_nodes, deadline, cancel)
+    try:
+        for solution in solutions:
+            count += 1
+            if count == limit:
+                break
+    finally:
+        solutions.close()
+    return count
+
+
+def has_other_solution(board, pos, num, max_nodes=None, deadline=None):
+    """
+    Checks whether a board has a solution where a cell holds a number other than num.
+
+    Used to keep a puzzle unique while cells are removed: if the puzzle was uniquely solved
+    with num at pos before pos was cleared, it stays unique exactly when this returns False.
+    Only one search is needed, and it usually ends right away in a contradiction.
 
+    Args:
+        board (list[list[int]]): A 9x9 sudoku board represented as a list of lists of integers, with pos empty.
+        pos (tuple[int, int]): The position of the cleared cell as a tuple of row and column indices.
+        num (int): The number that was removed from the cell.
+        max_nodes (int|None): The number of placements the search may make, None for no limit. A search that runs
+            out of nodes counts as finding another solution, so the cell is kept and the puzzle stays unique.
+        deadline (float|None): A time.perf_counter() value after which the search gives up.
+
+    Returns:
+        bool: True if another solution exists (or may exist), False otherwise.
+
+    Raises:
+        search.LimitReached: If the deadline passes before the search is finished.
+    """
+
+    from astar import empty_cells_cand
+    from propagation import Propagator
+    from search import BUDGET_EXCEEDED, SOLVED, UNSOLVABLE, AStarSearch, LimitReached
+
+    # Search with num ruled out of the cell, any solution found is a second one
+    bitboard = BitBoard(board)
+    cell_cand = empty_cells_cand(bitboard)
+    cell_cand[pos] &= ~(1 << (num - 1))
+    status = AStarSearch(bitboard, cell_cand, Propagator()).run_limited(max_nodes, deadline)
+    if status not in (SOLVED, UNSOLVABLE, BUDGET_EXCEEDED):
+        raise LimitReached(status)
+    return status != UNSOLVABLE
+
+
+def _forced(bitboard, pos, num):
+    # Cheap uniqueness check before searching: the cleared cell can only hold num (naked single),
+    # or no other empty cell of its row, column or box can hold num (hidden single)
+    i, j = pos
+    if bitboard.candidates(i, j) == 1 << (num - 1):
+        return True
+
+    start_i, start_j = i - i % 3, j - j % 3
+    units = (
+        [(i, col) for col in range(9)],
+        [(row, j) for row in range(9)],
+        [(start_i + row, start_j + col) for row in range(3) for col in range(3)],
+    )
+    for unit in units:
+        if not any(
+            cell != pos and bitboard.get(*cell) == 0 and bitboard.valid(cell, num) for cell in unit
+        ):
+            return True
+    return False
+
+
+def _rng(seed):
+    # A seed, a random.Random, or None or the random module itself for the random module
+    if seed is None or seed is random:
+        return random
+    if isinstance(seed, random.Random):
+        return seed
+    return random.Random(seed)
+
+
+def _solved_grid(rng):
     board = [[0 for i in range(9)] for j in range(9)]
 
     # Fill the diagonal boxes
     for i in range(0, 9, 3):
         nums = list(range(1, 10))
-        shuffle(nums)
+        rng.shuffle(nums)
         for row in range(3):
             for col in range(3):
                 board[i + row][i + col] = nums.pop()
 
-    # Fill the remaining cells with backtracking
-    def fill_cells(board, row, col):
-        """
-        Fills the remaining cells of the sudoku board with backtracking.
+    # Fill the remaining cells with backtracking, the iterative solver only visits the empty cells
+    solve(board)
+    return board
 
-        Args:
-            board (list[list[int]]): A 9x9 sudoku board represented as a list of lists of integers.
-            row (int): The current row index to fill.
-            col (int): The current column index to fill.
 
-        Returns:
-            bool: True if the remaining cells are successfully filled, False otherwise.
-        """
+def _check_deadline(deadline):
+    # Stops a generator whose deadline has passed
+    if deadline is not None and time.perf_counter() > deadline:
+        from search import TIMEOUT, LimitReached
+        raise LimitReached(TIMEOUT)
 
-        if row == 9:
-            return True
-        if col == 9:
-            return fill_cells(board, row + 1, 0)
 
-        if board[row][col] != 0:
-            return fill_cells(board, row, col + 1)
+def _generate_rated(band, seed, attempts, max_nodes=None, deadline=None):
+    # Clears cells of a solved grid while the puzzle stays unique and rated below the band,
+    # keeping the result if it ends up inside the band
+    from rating import band_range, rate
 
-        for num in range(1, 10):
-            if valid(board, (row, col), num):
-                board[row][col] = num
+    low, high = band_range(band)
+    rng = _rng(seed)
+
+    for attempt in range(attempts):
+        board = _solved_grid(rng)
+        positions = [(row, col) for row in range(9) for col in range(9)]
+        rng.shuffle(positions)
+
+        bitboard = BitBoard(board)
+        score = rate(bitboard).score
+        for row, col in positions:
+            _check_deadline(deadline)
+            num = board[row][col]
+            board[row][col] = 0
+            bitboard.remove(row, col)
+            if _forced(bitboard, (row, col), num) or not has_other_solution(board, (row, col), num, max_nodes, deadline):
+                cleared = rate(bitboard).score
+                if cleared < high:
+                    score = cleared
+                    continue
+            # A second solution, or too hard for the band, keep the cell
+            board[row][col] = num
+            bitboard.place(row, col, num)
 
-                if fill_cells(board, row, col + 1):
-                    return True
+        if low <= score < high:
+            return board
 
-        board[row][col] = 0
-        return False
+    raise ValueError(f"Could not generate a unique puzzle rated in [{low}, {high}) in {attempts} attempts.")
 
-    fill_cells(board, 0, 0)
 
-    for _ in range(removed_cells):
-        row, col = randint(0, 8), randint(0, 8)
-        board[row][col] = 0
+def generate_board(removed_cells=45, unique=None, seed=None, attempts=20, rating=None, max_nodes=None, deadline=None):
+    """
+    Generates a random sudoku board with fewer initial numbers.
+
+    Exactly removed_cells distinct cells are cleared. With unique=True a cell is only cleared
+    if the puzzle keeps a single solution, trying the cells in a random order, and a new
+    solved grid is used when a grid runs out of cells that can be cleared. This only works
+    up to MAX_UNIQUE_REMOVED (58) cleared cells, so by default puzzles are unique up to that
+    and sparser ones may have several solutions.
+
+    With a rating band the number of cleared cells is not fixed: every cell is tried once and
+    stays cleared if the puzzle keeps a single solution and its rating stays below the top of
+    the band, so the puzzle is as bare as the band allows.
+
+    Args:
+        removed_cells (int): The number of cells to clear, ignored when a rating band is given.
+        unique (bool|None): Whether the puzzle must have exactly one solution. None, the default, for a unique
+            puzzle when removed_cells is at most MAX_UNIQUE_REMOVED and any solvable one above that.
+        seed (int|random.Random|None): Seed or random generator for reproducible boards, None for the random module.
+        attempts (int): The number of solved grids to try before giving up on a unique puzzle.
+        rating (str|tuple[float, float]|None): A band name from rating.BANDS ("easy", "medium", "hard", "expert")
+            or a [low, high) score range the rating.rate score of the puzzle must fall in.
+        max_nodes (int|None): The number of placements each uniqueness check may make, None for no limit.
+            A cell whose check runs out of nodes is kept.
+        deadline (float|None): A time.perf_counter() value after which generation gives up.
+
+    Returns:
+        list[list[int]]: A 9x9 sudoku board represented as a list of lists of integers.
+
+    Raises:
+        ValueError: If removed_cells is greater than or equal to 65, resulting in 16 or fewer filled cells,
+            if unique is True and removed_cells is greater than MAX_UNIQUE_REMOVED, or if no unique puzzle
+            with that many cleared cells (or in the rating band) was found within the attempts.
+        search.LimitReached: If the deadline passes before a puzzle is found.
+    """
+
+    if rating is not None:
+        return _generate_rated(rating, seed, attempts, max_nodes, deadline)
+
+    # Check if removed_cells would result in 16 or fewer filled cells (unsolvable)
+    if removed_cells >= 65:
+        raise ValueError("Cannot create a board with 16 or fewer filled cells. The minimum number of clues for a solvable Sudoku is 17.")
+    if unique is None:
+        unique = removed_cells <= MAX_UNIQUE_REMOVED
+    elif unique and removed_cells > MAX_UNIQUE_REMOVED:
+        raise ValueError(f"Unique puzzles can have at most {MAX_UNIQUE_REMOVED} removed cells, not {removed_cells}.")
+
+    rng = _rng(seed)
+
+    for attempt in range(attempts):
+        _check_deadline(deadline)
+        board = _solved_grid(rng)
+
+        # Clear distinct cells in a random order
+        positions = [(row, col) for row in range(9) for col in range(9)]
+        rng.shuffle(positions)
+
+        if not unique:
+            for row, col in positions[:removed_cells]:
+                board[row][col] = 0
+            return board
+
+        bitboard = BitBoard(board)
+        removed = 0
+        for row, col in positions:
+            if removed == removed_cells:
+                break
+            num = board[row][col]
+            board[row][col] = 0
+            bitboard.remove(row, col)
+            if not _forced(bitboard, (row, col), num) and has_other_solution(board, (row, col), num, max_nodes, deadline):
+                # Clearing this cell would allow a second solution, keep it
+                board[row][col] = num
+                bitboard.place(row, col, num)
+            else:
+                removed += 1
+
+        if removed == removed_cells:
+            return board
 
-    return board
\ No newline at end of file
+    raise ValueError(f"Could not clear {removed_cells} cells and keep a unique solution in {attempts} attempts.")
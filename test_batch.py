@@ -0,0 +1,23 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from batch import BACKENDS, solve_many
+from corpus import parse_line
+
+# Valid givens, but the empty first cell has no number left: the row holds 1-8 and the column holds 9
+UNSOLVABLE_BOARD = parse_line("012345678" + "900000000" + "0" * 63)
+HARD_BOARD = parse_line("800000000003600000070090200050007000000045700000100030001000068008500010090000400")
+
+
+def test_backends_agree_on_an_unsolvable_board():
+    for algorithm in BACKENDS:
+        [(index, status, board)] = solve_many([UNSOLVABLE_BOARD], algorithm, workers=0)
+        assert status == "unsolvable", algorithm
+        assert board == UNSOLVABLE_BOARD, algorithm
+
+
+def test_backends_return_the_original_board_when_stopped():
+    for algorithm in BACKENDS:
+        [(index, status, board)] = solve_many([HARD_BOARD], algorithm, workers=0, max_nodes=5)
+        assert status == "budget_exceeded", algorithm
+        assert board == HARD_BOARD, algorithm
@@ -0,0 +1,27 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from corpus import MAGIC, RECORD, PuzzleCorpus, parse_line
+
+BOARD = parse_line("800000000003600000070090200050007000000045700000100030001000068008500010090000400")
+
+
+def test_rejects_a_file_shorter_than_the_header(tmp_path):
+    path = tmp_path / "short.corpus"
+    # The magic number alone, cut off before the version and record size
+    path.write_bytes(MAGIC)
+    with pytest.raises(ValueError, match="shorter than a corpus header"):
+        PuzzleCorpus(str(path))
+
+
+def test_cuts_a_partial_record_off_the_end(tmp_path):
+    path = str(tmp_path / "partial.corpus")
+    with PuzzleCorpus(path) as corpus:
+        corpus.append_many([BOARD], solve=False)
+    with open(path, "ab") as corpus:
+        corpus.write(b"\0" * (RECORD.size // 2))
+    with PuzzleCorpus(path) as corpus:
+        assert len(corpus) == 1
+        assert corpus.board(0) == BOARD
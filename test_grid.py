@@ -0,0 +1,22 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from grid import generate_grid, solve_grid, solved_grid
+
+
+def test_generate_grid_without_seed():
+    for box in (2, 3, 4):
+        board = generate_grid(box)
+        size = box * box
+        assert len(board) == size and all(len(row) == size for row in board)
+        assert sum(row.count(0) for row in board) == size * size // 2
+        assert solve_grid(board)
+
+
+def test_solved_grid_without_seed():
+    board = solved_grid(3)
+    assert all(sorted(row) == list(range(1, 10)) for row in board)
+
+
+def test_generate_grid_seeded_is_reproducible():
+    assert generate_grid(4, seed=7) == generate_grid(4, seed=7)
@@ -0,0 +1,44 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import pytest
+from server import MAX_SIZE, RequestError, check_params, run_batch
+
+
+def generate(**params):
+    return run_batch([("generate", check_params("generate", params))])[0]
+
+
+def test_generate_unseeded_larger_sizes():
+    for size in (4, 16):
+        status, response = generate(size=size)
+        assert status == 200
+        assert len(response["board"]) == size
+
+
+def test_generate_size_is_capped():
+    with pytest.raises(RequestError):
+        check_params("generate", {"size": 10000})
+    with pytest.raises(RequestError):
+        check_params("generate", {"size": MAX_SIZE + 11})
+
+
+def test_generate_removed_cells_are_clamped():
+    assert check_params("generate", {"size": 4, "removed_cells": 1000})["removed_cells"] == 16
+
+
+def test_generate_stops_at_its_timeout():
+    status, response = generate(size=25, removed_cells=600, unique=True, timeout=0.01)
+    assert status == 422
+    assert "timeout" in response["error"]
+
+
+@pytest.mark.parametrize("rating", [["a", "b"], [1], [3.0, 2.0], [True, 2], "impossible", 5])
+def test_generate_rejects_malformed_ratings(rating):
+    with pytest.raises(RequestError):
+        check_params("generate", {"rating": rating})
+
+
+def test_generate_accepts_ratings():
+    assert check_params("generate", {"rating": "easy"})["rating"] == "easy"
+    assert check_params("generate", {"rating": [1, 2.5]})["rating"] == [1, 2.5]